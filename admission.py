@@ -0,0 +1,166 @@
+"""
+Admission control for classification work in the API.
+
+Each classification request (a new comment, `/api/classify` or a revision
+on the `/api/classify/live` WebSocket) first takes a token from its caller's
+bucket (per connection for the WebSocket); an empty bucket is answered with
+429, or an error message on the WebSocket. It then
+picks a pipeline tier from how long the classification queue currently makes
+requests wait:
+
+    full     local model + keywords + Groq when the gate asks for it
+    local    local model + keywords, Groq skipped
+             (queue delay above ADMISSION_LOCAL_AFTER_MS)
+    keyword  keyword classifier only, answered without queueing
+             (delay above ADMISSION_KEYWORD_AFTER_MS, or ADMISSION_MAX_QUEUE waiting)
+
+At most ADMISSION_MAX_CONCURRENCY full or local classifications run at once;
+the rest wait in FIFO order. Queue delay is the age of the oldest waiting
+request, so tiers recover as soon as the backlog clears. A request that
+waited longer than a threshold itself is downgraded before it runs.
+
+Buckets and the queue are per worker process. The kernel spreads a client's
+connections over the workers, so with SERVER_WORKERS (set by serve.py) or
+WEB_CONCURRENCY above 1 each worker enforces 1/N of the comment and classify
+rates and bursts, which keeps a client's total near the configured limit.
+Live buckets belong to one WebSocket, which stays on one worker.
+"""
+
+import asyncio
+import itertools
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from metrics import ADMISSION_DECISIONS, QUEUE_DEPTH, STAGE_LATENCY
+
+ADMISSION_MAX_CONCURRENCY = int(os.getenv("ADMISSION_MAX_CONCURRENCY", "8"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "64"))
+ADMISSION_LOCAL_AFTER_MS = float(os.getenv("ADMISSION_LOCAL_AFTER_MS", "250"))
+ADMISSION_KEYWORD_AFTER_MS = float(os.getenv("ADMISSION_KEYWORD_AFTER_MS", "1000"))
+
+# Per-user token buckets: sustained rate per minute and burst size
+COMMENT_RATE_PER_MINUTE = float(os.getenv("COMMENT_RATE_PER_MINUTE", "30"))
+COMMENT_BURST = int(os.getenv("COMMENT_BURST", "10"))
+CLASSIFY_RATE_PER_MINUTE = float(os.getenv("CLASSIFY_RATE_PER_MINUTE", "60"))
+CLASSIFY_BURST = int(os.getenv("CLASSIFY_BURST", "20"))
+LIVE_RATE_PER_MINUTE = float(os.getenv("LIVE_RATE_PER_MINUTE", "60"))
+LIVE_BURST = int(os.getenv("LIVE_BURST", "10"))
+
+TIERS = ("full", "local", "keyword")
+
+SERVER_WORKERS = max(1, int(os.getenv("SERVER_WORKERS") or os.getenv("WEB_CONCURRENCY") or "1"))
+
+
+class TokenBuckets:
+    """One token bucket per key, forgetting the least recently used keys past max_keys."""
+
+    def __init__(self, rate_per_minute: float, burst: int, max_keys: int = 10000):
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()  # key -> [tokens, updated at]
+        self._lock = threading.Lock()
+
+    def take(self, key: str) -> float:
+        """Take a token; returns 0 when allowed, otherwise seconds until one is available."""
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.pop(key, None) or [float(self.burst), now]
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            self._buckets[key] = bucket
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return 0.0
+            return (1 - bucket[0]) / self.rate
+
+
+class AdmissionController:
+    def __init__(self, max_concurrency: int = ADMISSION_MAX_CONCURRENCY, max_queue: int = ADMISSION_MAX_QUEUE):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self._semaphore = None
+        self._waiting: "OrderedDict[int, float]" = OrderedDict()  # ticket -> arrival time
+        self._tickets = itertools.count()
+        self.running = 0
+
+    def queue_delay(self) -> float:
+        """Seconds the oldest waiting request has been queued (0 when none wait)."""
+        if not self._waiting:
+            return 0.0
+        return time.monotonic() - next(iter(self._waiting.values()))
+
+    def _tier_for(self, delay: float) -> str:
+        if delay * 1000 >= ADMISSION_KEYWORD_AFTER_MS:
+            return "keyword"
+        if delay * 1000 >= ADMISSION_LOCAL_AFTER_MS:
+            return "local"
+        return "full"
+
+    def choose_tier(self) -> str:
+        if len(self._waiting) >= self.max_queue:
+            return "keyword"
+        return self._tier_for(self.queue_delay())
+
+    @asynccontextmanager
+    async def admit(self, route: str) -> AsyncIterator[str]:
+        """Wait for a classification slot when the tier needs one; yields the tier to run."""
+        tier = self.choose_tier()
+        if tier == "keyword":
+            ADMISSION_DECISIONS.inc(route, tier)
+            yield tier
+            return
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        ticket = next(self._tickets)
+        arrived = time.monotonic()
+        self._waiting[ticket] = arrived
+        QUEUE_DEPTH.inc("classification")
+        try:
+            await self._semaphore.acquire()
+        finally:
+            del self._waiting[ticket]
+            QUEUE_DEPTH.dec("classification")
+        waited = time.monotonic() - arrived
+        STAGE_LATENCY.observe(waited, "admission_queue")
+
+        # Downgrade when this request itself waited too long
+        tier = max(tier, self._tier_for(waited), key=TIERS.index)
+        ADMISSION_DECISIONS.inc(route, tier)
+        self.running += 1
+        try:
+            yield tier
+        finally:
+            self.running -= 1
+            self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "waiting": len(self._waiting),
+            "queue_delay_ms": self.queue_delay() * 1000,
+            "tier": self.choose_tier(),
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+        }
+
+
+admission = AdmissionController()
+comment_buckets = TokenBuckets(COMMENT_RATE_PER_MINUTE / SERVER_WORKERS,
+                               math.ceil(COMMENT_BURST / SERVER_WORKERS))
+classify_buckets = TokenBuckets(CLASSIFY_RATE_PER_MINUTE / SERVER_WORKERS,
+                                math.ceil(CLASSIFY_BURST / SERVER_WORKERS))
+
+
+def retry_after_header(seconds: float) -> dict:
+    return {"Retry-After": str(max(1, math.ceil(seconds)))}
@@ -3,14 +3,21 @@ CyberGuard API - FastAPI Backend
 Provides REST endpoints for the React/Next.js frontend
 """
 
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Header, status, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import PlainTextResponse, FileResponse, StreamingResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel, EmailStr
 from typing import Optional, List
 import os
 import sys
+import asyncio
+import gzip
+import json
+import threading
+from collections import OrderedDict
 from datetime import datetime, timedelta
+import time
 import jwt
 from dotenv import load_dotenv
 
@@ -19,8 +26,31 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 load_dotenv()
 
-from detector import detect_cyberbullying, _predict_local_label, CLASS_LABELS
-from api_client import classify_with_groq, get_detailed_classification
+from detector import detect_cyberbullying, _predict_local_with_confidence, CLASS_LABELS
+import detector
+from api_client import (
+    classify_with_groq, get_detailed_classification, get_shadow_stats, get_groq_usage, get_routing_stats,
+    keyword_fallback_classifier, needs_remote_check, combine_labels
+)
+from normalize import normalize
+from metrics import (
+    HTTP_LATENCY, CACHE_REQUESTS, ADMISSION_DECISIONS, FINAL_LABELS,
+    CONTENT_TYPE as METRICS_CONTENT_TYPE, render as render_metrics
+)
+from profiling import ProfilingMiddleware, profile_path, token_matches
+from flood import flood_index
+from events import broadcaster
+from versions import feed_etag, comments_etag, etag_matches
+from admission import (
+    admission, comment_buckets, classify_buckets, retry_after_header, SERVER_WORKERS,
+    TokenBuckets, LIVE_RATE_PER_MINUTE, LIVE_BURST
+)
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
 
 # Initialize FastAPI
 app = FastAPI(
@@ -40,6 +70,32 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Admin token for operational endpoints and per-request profiling (X-Profile header)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+app.add_middleware(ProfilingMiddleware, admin_token=ADMIN_TOKEN)
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    """Record request latency per route template (not per concrete path)"""
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        route_path = getattr(route, "path", None) or "unmatched"
+        HTTP_LATENCY.observe(time.perf_counter() - start, request.method, route_path, str(status_code))
+
+# Serve uploaded images when they are stored on local disk (STORAGE_BACKEND=sqlite)
+from storage import storage_backend_name
+if storage_backend_name() == "sqlite":
+    from fastapi.staticfiles import StaticFiles
+    _media_root = os.getenv("MEDIA_ROOT", "media")
+    os.makedirs(_media_root, exist_ok=True)
+    app.mount(os.getenv("MEDIA_URL", "/media"), StaticFiles(directory=_media_root), name="media")
+
 # Security
 security = HTTPBearer()
 JWT_SECRET = os.getenv("JWT_SECRET", "your-secret-key-change-in-production")
@@ -61,6 +117,12 @@ class ClassificationResult(BaseModel):
     is_bullying: bool
     bullying_type: Optional[str]
     confidence: Optional[float] = None
+    model_version: Optional[str] = None
+    tier: Optional[str] = None
+
+class ModelSwapRequest(BaseModel):
+    model_path: str  # snapshot directory inside MODEL_SNAPSHOT_ROOT
+    min_accuracy: Optional[float] = None
 
 class LoginRequest(BaseModel):
     email: EmailStr
@@ -113,6 +175,67 @@ class CommentResponse(BaseModel):
 # Helper Functions
 # ============================================
 
+# Bodies smaller than this are sent uncompressed
+COMPRESS_MIN_BYTES = 1024
+RESPONSE_CACHE_SIZE = 256
+
+# path -> (etag, {encoding: body}); only the latest version of each path is kept
+_response_cache = OrderedDict()
+_response_cache_lock = threading.Lock()
+
+def _pick_encoding(accept_encoding: str) -> str:
+    accepted = {part.split(";")[0].strip() for part in accept_encoding.lower().split(",")}
+    if BROTLI_AVAILABLE and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return "identity"
+
+def conditional_json(request: Request, etag: str, build) -> Response:
+    """
+    JSON response for a versioned resource.
+    
+    Answers 304 when the client already has this ETag, reuses the body built
+    for the same ETag when there is one, and otherwise calls build(). Large
+    bodies are gzip (or brotli) compressed once per version. A new version of
+    a path replaces the cached one.
+    """
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        CACHE_REQUESTS.inc("http_response", "not_modified")
+        return Response(status_code=304, headers=headers)
+
+    path = request.url.path
+    variants = None
+    with _response_cache_lock:
+        cached = _response_cache.get(path)
+        if cached is not None and cached[0] == etag:
+            variants = cached[1]
+            _response_cache.move_to_end(path)
+    if variants is None:
+        CACHE_REQUESTS.inc("http_response", "miss")
+        body = json.dumps(build(), separators=(",", ":"), default=str).encode("utf-8")
+        variants = {"identity": body}
+        with _response_cache_lock:
+            _response_cache[path] = (etag, variants)
+            _response_cache.move_to_end(path)
+            while len(_response_cache) > RESPONSE_CACHE_SIZE:
+                _response_cache.popitem(last=False)
+    else:
+        CACHE_REQUESTS.inc("http_response", "hit")
+
+    encoding = "identity"
+    if len(variants["identity"]) >= COMPRESS_MIN_BYTES:
+        encoding = _pick_encoding(request.headers.get("accept-encoding", ""))
+    if encoding not in variants:
+        if encoding == "br":
+            variants[encoding] = brotli.compress(variants["identity"], quality=5)
+        else:
+            variants[encoding] = gzip.compress(variants["identity"], compresslevel=6)
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(variants[encoding], media_type="application/json", headers=headers)
+
 def create_token(user_id: str, email: str) -> str:
     """Create JWT token for user"""
     payload = {
@@ -132,6 +255,13 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security))
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Allow the request only with the X-Admin-Token header set to ADMIN_TOKEN"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin access is not configured")
+    if not token_matches(ADMIN_TOKEN, x_admin_token):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
 # ============================================
 # API Endpoints
 # ============================================
@@ -155,28 +285,135 @@ async def health_check():
     """Detailed health check"""
     groq_configured = bool(os.getenv("GROQ_API_KEY"))
     firebase_configured = bool(os.getenv("FIREBASE_API_KEY"))
+    storage_backend = storage_backend_name()
     
     return {
         "status": "healthy",
         "timestamp": datetime.utcnow().isoformat(),
+        "model_version": detector.model_version(),
         "services": {
-            "local_model": "available",
+            "local_model": "available" if detector.model_version() else "unavailable",
             "groq_api": "configured" if groq_configured else "not_configured",
-            "firebase": "configured" if firebase_configured else "not_configured"
-        }
+            "firebase": "configured" if firebase_configured else "not_configured",
+            "storage": storage_backend
+        },
+        "groq_shadow": get_shadow_stats(),
+        "groq_usage": get_groq_usage(),
+        "routing": get_routing_stats(),
+        "admission": admission.stats()
     }
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics for this worker process"""
+    return PlainTextResponse(render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
 # ============================================
 # Classification Endpoints
 # ============================================
 
+@app.get("/api/admin/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+async def get_profile(profile_id: str, format: str = "json"):
+    """Download a stored request profile (json summary or folded stacks)"""
+    if format not in ("json", "folded"):
+        raise HTTPException(status_code=400, detail="format must be json or folded")
+    try:
+        path = profile_path(profile_id, format)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    media_type = "application/json" if format == "json" else "text/plain"
+    return FileResponse(path, media_type=media_type)
+
+@app.get("/api/admin/floods", dependencies=[Depends(require_admin)])
+async def get_floods(post_id: Optional[str] = None, min_size: int = 3):
+    """Recent near-duplicate comment floods, optionally for one post"""
+    return {"clusters": flood_index.clusters(post_id=post_id, min_size=min_size)}
+
+# Last model swap started through the admin API (per worker process)
+_model_swap = {"state": "idle"}
+_model_swap_lock = threading.Lock()
+
+def _require_single_worker():
+    """Model swaps change only the process that handles them, so refuse them when several workers serve"""
+    workers = SERVER_WORKERS
+    if workers > 1:
+        raise HTTPException(status_code=409, detail=(
+            f"{workers} worker processes are serving; a swap would change only one of them. "
+            "Point MODEL_SNAPSHOT_DIR at the new snapshot and restart instead"))
+
+def _run_model_swap(request: ModelSwapRequest):
+    report = detector.swap_model(request.model_path, request.min_accuracy)
+    if report.get("error"):
+        state = "failed"
+    else:
+        state = "activated" if report["passed"] else "rejected"
+    with _model_swap_lock:
+        _model_swap.update(state=state, finished=datetime.utcnow().isoformat(), report=report)
+
+@app.get("/api/admin/model", dependencies=[Depends(require_admin)])
+async def get_model_status():
+    """Active and previous model versions, and the state of the last swap"""
+    with _model_swap_lock:
+        swap = dict(_model_swap)
+    return {**detector.model_status(), "swap": swap}
+
+@app.post("/api/admin/model", status_code=202, dependencies=[Depends(require_admin)])
+async def start_model_swap(request: ModelSwapRequest):
+    """Load another model version in the background and activate it if it passes the canary set"""
+    _require_single_worker()
+    with _model_swap_lock:
+        if _model_swap["state"] == "loading":
+            raise HTTPException(status_code=409, detail="Another model version is still loading")
+        _model_swap.clear()
+        _model_swap.update(state="loading", model_path=request.model_path,
+                           started=datetime.utcnow().isoformat())
+        swap = dict(_model_swap)
+    threading.Thread(target=_run_model_swap, args=(request,), name="model-swap", daemon=True).start()
+    return swap
+
+@app.post("/api/admin/model/rollback", dependencies=[Depends(require_admin)])
+async def rollback_model():
+    """Switch back to the model version that was active before the last swap"""
+    _require_single_worker()
+    if detector.rollback_model() is None:
+        raise HTTPException(status_code=409, detail="No previous model version to roll back to")
+    return detector.model_status()
+
+def _take_token(buckets, key: str, route: str):
+    """Raise 429 with Retry-After when the caller's token bucket is empty"""
+    wait = buckets.take(key)
+    if wait:
+        ADMISSION_DECISIONS.inc(route, "rate_limited")
+        raise HTTPException(status_code=429, detail="Too many requests, please slow down",
+                            headers=retry_after_header(wait))
+
+def _keyword_classification(text: str) -> dict:
+    """get_detailed_classification's result from the keyword classifier alone"""
+    label, explanation = keyword_fallback_classifier(text)
+    is_bullying = label != "Not Cyberbullying"
+    FINAL_LABELS.inc(label)
+    return {
+        "local_label": None,
+        "confidence": None,
+        "api_label": None,
+        "api_explanation": explanation,
+        "final_label": label,
+        "is_bullying": is_bullying,
+        "bullying_type": label.lower() if is_bullying else None
+    }
+
 @app.post("/api/classify", response_model=ClassificationResult)
-async def classify_text(input_data: TextInput):
+async def classify_text(input_data: TextInput, request: Request):
     """
     Classify text for cyberbullying content.
     
     Uses both local HuggingFace model and Groq API for dual classification.
-    The Groq result is used as the final authoritative label.
+    Groq is only called when the local model is not confident enough; when it
+    is called, the Groq result is used as the final authoritative label.
+    Under load the pipeline is degraded (see admission.py); `tier` in the
+    response says which one answered.
     """
     text = input_data.text.strip()
     
@@ -186,8 +423,16 @@ async def classify_text(input_data: TextInput):
     if len(text) > 5000:
         raise HTTPException(status_code=400, detail="Text too long (max 5000 characters)")
     
+    _take_token(classify_buckets, request.client.host if request.client else "unknown", "classify")
+    
     # Get detailed classification
-    result = get_detailed_classification(text)
+    async with admission.admit("classify") as tier:
+        if tier == "keyword":
+            result = _keyword_classification(text)
+        else:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(
+                None, lambda: get_detailed_classification(text, use_remote=tier == "full"))
     
     return ClassificationResult(
         text=text,
@@ -196,7 +441,10 @@ async def classify_text(input_data: TextInput):
         groq_explanation=result.get("api_explanation"),
         final_label=result.get("final_label", "Not Cyberbullying"),
         is_bullying=result.get("is_bullying", False),
-        bullying_type=result.get("bullying_type")
+        bullying_type=result.get("bullying_type"),
+        confidence=result.get("confidence"),
+        model_version=detector.model_version(),
+        tier=tier
     )
 
 @app.post("/api/classify/local")
@@ -208,15 +456,16 @@ async def classify_local_only(input_data: TextInput):
         raise HTTPException(status_code=400, detail="Text cannot be empty")
     
     try:
-        label = _predict_local_label(text)
+        label, confidence = _predict_local_with_confidence(text)
         is_bullying = label != "Not Cyberbullying"
         
         return {
             "text": text,
             "label": label,
+            "confidence": confidence,
             "is_bullying": is_bullying,
             "bullying_type": label.lower() if is_bullying else None,
-            "model": "boss2805/cyberbully"
+            "model": detector.model_version() or detector.MODEL_PATH
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Model error: {str(e)}")
@@ -248,6 +497,136 @@ async def classify_groq_only(input_data: TextInput):
         "model": "llama-3.3-70b-versatile"
     }
 
+# Quiet period after the last keystroke before a revision is classified
+LIVE_CLASSIFY_DEBOUNCE_MS = float(os.getenv("LIVE_CLASSIFY_DEBOUNCE_MS", "250"))
+
+async def _in_executor(loop, func, *args):
+    """
+    run_in_executor that outlives cancellation: a cancelled caller still waits
+    for the thread to finish before CancelledError propagates, so an admission
+    slot held around the call is not released while the work is still running.
+    Once cancelled, the caller's next stage never starts.
+    """
+    future = loop.run_in_executor(None, func, *args)
+    cancelled = False
+    while True:
+        try:
+            result = await asyncio.shield(future)
+            break
+        except asyncio.CancelledError:
+            if future.done():
+                raise
+            cancelled = True
+    if cancelled:
+        raise asyncio.CancelledError()
+    return result
+
+async def _classify_revision(websocket: WebSocket, send_lock: asyncio.Lock, buckets: TokenBuckets,
+                             rev, text: str):
+    """Classify one text revision, sending keyword, local and final verdicts as they are ready"""
+    await asyncio.sleep(LIVE_CLASSIFY_DEBOUNCE_MS / 1000.0)
+    loop = asyncio.get_running_loop()
+
+    async def send(stage: str, payload: dict):
+        async with send_lock:
+            try:
+                await websocket.send_json({"rev": rev, "stage": stage, **payload})
+            except (WebSocketDisconnect, RuntimeError):
+                # The client went away; nothing left to do for this revision
+                raise asyncio.CancelledError()
+
+    # Only debounced revisions count against the connection's rate limit
+    wait = buckets.take("live")
+    if wait:
+        ADMISSION_DECISIONS.inc("live", "rate_limited")
+        await send("error", {"detail": "Too many classification requests", "retry_after": wait})
+        return
+
+    norm = normalize(text)
+    keyword_label, keyword_explanation = keyword_fallback_classifier(text, norm)
+    await send("keyword", {
+        "label": keyword_label,
+        "is_bullying": keyword_label != "Not Cyberbullying",
+    })
+
+    local_label, confidence, api_label, api_explanation = None, None, None, None
+    call_groq = False
+    async with admission.admit("live") as tier:
+        if tier != "keyword":
+            # A newer revision cancels this task; the stage already running finishes
+            # (holding its admission slot) and the later stages are skipped
+            local_label, confidence = await _in_executor(loop, _predict_local_with_confidence, text, norm)
+            await send("local", {
+                "label": local_label,
+                "confidence": confidence,
+                "is_bullying": local_label != "Not Cyberbullying",
+            })
+            call_groq = needs_remote_check(local_label, confidence, keyword_label)[0] and tier == "full"
+            if call_groq:
+                api_label, api_explanation = await _in_executor(loop, classify_with_groq, text)
+
+    if local_label is None:
+        final_label, explanation = keyword_label, keyword_explanation
+    else:
+        final_label, explanation = combine_labels(
+            local_label, keyword_label, keyword_explanation,
+            api_label, api_explanation, groq_called=call_groq
+        )
+    is_bullying = final_label != "Not Cyberbullying"
+    await send("final", ClassificationResult(
+        text=text,
+        local_model_label=local_label,
+        groq_label=api_label,
+        groq_explanation=explanation,
+        final_label=final_label,
+        is_bullying=is_bullying,
+        bullying_type=final_label.lower() if is_bullying else None,
+        confidence=confidence,
+        model_version=detector.model_version(),
+        tier=tier
+    ).model_dump())
+
+@app.websocket("/api/classify/live")
+async def classify_live(websocket: WebSocket):
+    """
+    Type-ahead classification.
+    
+    The client sends {"rev": n, "text": "..."} on every edit. Each revision
+    replaces the one before it: pending or in-flight work for older revisions
+    is cancelled. For the latest revision the server sends
+    {"rev", "stage": "keyword" | "local" | "final", ...} messages in that order;
+    under load (see admission.py) the local stage may be skipped, and over the
+    connection's rate limit a revision gets a single "error" message.
+    """
+    await websocket.accept()
+    send_lock = asyncio.Lock()
+    buckets = TokenBuckets(LIVE_RATE_PER_MINUTE, LIVE_BURST, max_keys=1)
+    current = None
+    try:
+        while True:
+            message = await websocket.receive_json()
+            if not isinstance(message, dict):
+                continue
+            if current is not None and not current.done():
+                current.cancel()
+            current = None
+            rev = message.get("rev")
+            text = str(message.get("text", "")).strip()
+            if not text:
+                continue
+            if len(text) > 5000:
+                async with send_lock:
+                    await websocket.send_json({"rev": rev, "stage": "error",
+                                               "detail": "Text too long (max 5000 characters)"})
+                continue
+            current = asyncio.create_task(_classify_revision(websocket, send_lock, buckets, rev, text))
+    except (WebSocketDisconnect, ValueError):
+        # ValueError: the client sent something that is not JSON
+        pass
+    finally:
+        if current is not None:
+            current.cancel()
+
 @app.get("/api/categories")
 async def get_categories():
     """Get all available classification categories"""
@@ -372,37 +751,55 @@ async def get_current_user(token_data: dict = Depends(verify_token)):
 # Posts Endpoints
 # ============================================
 
+@app.get("/api/events")
+async def feed_events(request: Request, last_event_id: Optional[str] = None):
+    """
+    Server-sent events for the feed: post_created, comment_added,
+    comment_reclassified, comment_deleted, likes_changed, and reset (refetch
+    everything). Browsers resume from the Last-Event-ID header on reconnect.
+    """
+    last_event_id = request.headers.get("last-event-id") or last_event_id
+    return StreamingResponse(
+        broadcaster.stream(last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/api/posts")
-async def get_posts():
-    """Get all posts"""
+async def get_posts(request: Request):
+    """Get all posts (answers 304 when the feed is unchanged)"""
     try:
-        from database import get_all_posts, get_post_comments
+        from database import get_all_posts, count_post_comments, post_image_url
         from auth import get_user_data
         
-        posts = get_all_posts()
-        result = []
-        
-        for post in sorted(posts, key=lambda x: x.get('timestamp', ''), reverse=True):
-            user_data = get_user_data(post.get('user_id', ''))
-            comments = get_post_comments(post.get('id', ''))
-            likes_list = post.get('likes', [])
-            if isinstance(likes_list, int):
-                likes_list = []
+        def build():
+            posts = get_all_posts()
+            result = []
             
-            result.append({
-                "id": post.get('id', ''),
-                "userId": post.get('user_id', ''),
-                "userName": user_data.get('username', 'Unknown') if user_data else 'Unknown',
-                "content": post.get('content', ''),
-                "imageUrl": post.get('image_url'),
-                "timestamp": post.get('timestamp', ''),
-                "likes": likes_list,
-                "commentCount": len(comments),
-                "isBullying": post.get('is_bullying', False),
-                "bullyingType": post.get('bullying_type')
-            })
+            for post in sorted(posts, key=lambda x: x.get('timestamp', ''), reverse=True):
+                user_data = get_user_data(post.get('user_id', ''))
+                comments_count = count_post_comments(post.get('id', ''))
+                likes_list = post.get('likes', [])
+                if isinstance(likes_list, int):
+                    likes_list = []
+                
+                result.append({
+                    "id": post.get('id', ''),
+                    "userId": post.get('user_id', ''),
+                    "userName": user_data.get('username', 'Unknown') if user_data else 'Unknown',
+                    "content": post.get('content', ''),
+                    "imageUrl": post_image_url(post),
+                    "imageVariants": post.get('image_variants'),
+                    "timestamp": post.get('timestamp', ''),
+                    "likes": likes_list,
+                    "commentCount": comments_count,
+                    "isBullying": post.get('is_bullying', False),
+                    "bullyingType": post.get('bullying_type')
+                })
+            
+            return {"posts": result}
         
-        return {"posts": result}
+        return conditional_json(request, feed_etag(), build)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -418,7 +815,8 @@ async def create_new_post(post: PostCreate, token_data: dict = Depends(verify_to
         if user_data and user_data.get('is_banned', False):
             raise HTTPException(status_code=403, detail="Your account has been banned due to repeated violations")
         
-        post_id = create_post(token_data['sub'], post.content, None)
+        post_id = create_post(token_data['sub'], post.content, None,
+                              username=user_data.get('username') if user_data else None)
         
         return {
             "id": post_id,
@@ -436,34 +834,38 @@ async def create_new_post(post: PostCreate, token_data: dict = Depends(verify_to
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/posts/{post_id}/comments")
-async def get_comments(post_id: str):
-    """Get comments for a post"""
+async def get_comments(post_id: str, request: Request):
+    """Get comments for a post (answers 304 when the thread is unchanged)"""
     try:
         from database import get_post_comments
         from auth import get_user_data
         
-        comments = get_post_comments(post_id)
-        result = []
-        
-        for comment in comments:
-            user_data = get_user_data(comment.get('user_id', ''))
-            result.append({
-                "id": comment.get('id', ''),
-                "userId": comment.get('user_id', ''),
-                "userName": user_data.get('username', 'Unknown') if user_data else 'Unknown',
-                "content": comment.get('content', ''),
-                "timestamp": comment.get('timestamp', ''),
-                "isBullying": comment.get('is_bullying', False),
-                "bullyingType": comment.get('bullying_type')
-            })
+        def build():
+            comments = get_post_comments(post_id)
+            result = []
+            
+            for comment in comments:
+                user_data = get_user_data(comment.get('user_id', ''))
+                result.append({
+                    "id": comment.get('id', ''),
+                    "userId": comment.get('user_id', ''),
+                    "userName": user_data.get('username', 'Unknown') if user_data else 'Unknown',
+                    "content": comment.get('content', ''),
+                    "timestamp": comment.get('timestamp', ''),
+                    "isBullying": comment.get('is_bullying', False),
+                    "bullyingType": comment.get('bullying_type')
+                })
+            
+            return {"comments": result}
         
-        return {"comments": result}
+        return conditional_json(request, comments_etag(post_id), build)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/posts/{post_id}/comments")
 async def add_comment(post_id: str, comment: CommentCreate, token_data: dict = Depends(verify_token)):
     """Add a comment to a post (with cyberbullying detection)"""
+    _take_token(comment_buckets, token_data['sub'], "comment")
     try:
         from database import create_comment
         from auth import get_user_data
@@ -473,8 +875,18 @@ async def add_comment(post_id: str, comment: CommentCreate, token_data: dict = D
         if user_data and user_data.get('is_banned', False):
             raise HTTPException(status_code=403, detail="Your account has been banned due to repeated violations")
         
-        # Detect cyberbullying in comment
-        is_bullying, bullying_type = detect_cyberbullying(comment.content)
+        # Detect cyberbullying in comment, degraded under load (see admission.py)
+        async with admission.admit("comment") as tier:
+            if tier == "keyword":
+                label, _ = keyword_fallback_classifier(comment.content)
+                FINAL_LABELS.inc(label)
+                is_bullying = label != "Not Cyberbullying"
+                bullying_type = label.lower() if is_bullying else None
+            else:
+                loop = asyncio.get_running_loop()
+                is_bullying, bullying_type = await loop.run_in_executor(
+                    None, lambda: detect_cyberbullying(comment.content, post_id=post_id,
+                                                       use_remote=tier == "full"))
         
         # Create comment
         comment_id = create_comment(
@@ -482,7 +894,9 @@ async def add_comment(post_id: str, comment: CommentCreate, token_data: dict = D
             post_id,
             comment.content,
             is_bullying,
-            bullying_type
+            bullying_type,
+            moderation_tier=tier,
+            username=user_data.get('username') if user_data else None
         )
         
         # If bullying detected, decrease reputation
@@ -502,8 +916,11 @@ async def add_comment(post_id: str, comment: CommentCreate, token_data: dict = D
             "content": comment.content,
             "timestamp": datetime.utcnow().isoformat(),
             "isBullying": is_bullying,
-            "bullyingType": bullying_type
+            "bullyingType": bullying_type,
+            "moderationTier": tier
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -2,9 +2,25 @@ import os
 import requests
 import json
 import time
+import random
+import re
+import threading
 import urllib3
-from typing import Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
 from dotenv import load_dotenv
+from metrics import STAGE_LATENCY, GROQ_FALLBACKS, GROQ_GATE, GROQ_TOKENS, FINAL_LABELS, QUEUE_DEPTH
+from logging_config import get_logger, text_fields, classification_sampler
+from normalize import NormalizedText, fold, normalize, skeleton
+from routing import router
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+logger = get_logger(__name__)
 
 # Disable SSL warnings for self-signed certificates
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -21,6 +37,31 @@ VALID_CATEGORIES = [
     "Other"
 ]
 
+# Groq's OpenAI-compatible endpoint; override to point at a proxy or a local
+# stand-in such as fake_groq.py
+GROQ_DEFAULT_URL = "https://api.groq.com/openai/v1/chat/completions"
+GROQ_MODEL = os.getenv("GROQ_MODEL", "llama-3.3-70b-versatile")
+
+# "compact" (default) sends a short system prompt and the bare text; "verbose"
+# is the original long instruction prompt, kept for comparing the two
+GROQ_PROMPT = os.getenv("GROQ_PROMPT", "compact")
+# A verdict is about 20 tokens; the cap keeps a rambling reply from costing more
+GROQ_MAX_TOKENS = int(os.getenv("GROQ_MAX_TOKENS", "64"))
+
+# Streamed completions: callers that only need the category (the comment path)
+# get it as soon as it has been generated. The rest of the reply is then read
+# on a background thread so its tokens are still counted ("background"), or
+# the connection is closed ("drop"). "off" waits for the whole reply. With
+# "background", a reply that finds all GROQ_STREAM_WORKERS busy is dropped
+# instead of holding its connection open in a queue.
+GROQ_STREAM = os.getenv("GROQ_STREAM", "off")
+
+GROQ_COMPACT_SYSTEM_PROMPT = (
+    'Classify the user\'s text for cyberbullying. Reply in JSON: {"category": C, "explanation": E}. '
+    'C is one of "Not Cyberbullying", "Ethnicity/Race", "Gender/Sexual", "Religion", '
+    '"Other" (general insults such as stupid, idiot, ugly, loser). E is at most 12 words.'
+)
+
 # Simple keyword-based fallback classifier
 BULLYING_KEYWORDS = {
     "Ethnicity/Race": [
@@ -49,38 +90,190 @@ BULLYING_KEYWORDS = {
 }
 
 
-def keyword_fallback_classifier(text: str) -> Tuple[Optional[str], Optional[str]]:
+# (category, keyword, folded keyword) in match priority order
+_FOLDED_KEYWORDS = [
+    (category, keyword, skeleton(fold(keyword)))
+    for category, keywords in BULLYING_KEYWORDS.items()
+    for keyword in keywords
+]
+
+
+def keyword_fallback_classifier(text: str, normalized: Optional[NormalizedText] = None) -> Tuple[Optional[str], Optional[str]]:
     """
     Simple keyword-based classifier as fallback when API/model fails.
-    """
-    text_lower = text.lower().strip()
-    
-    # Remove common obfuscation characters
-    text_cleaned = text_lower.replace('*', '').replace('$', 's').replace('@', 'a').replace('0', 'o')
     
-    for category, keywords in BULLYING_KEYWORDS.items():
-        for keyword in keywords:
-            keyword_lower = keyword.lower()
-            if keyword_lower in text_lower or keyword_lower in text_cleaned:
+    Matches against both the skeleton and the de-obfuscated text (see
+    normalize.py); pass `normalized` when the caller already has it.
+    """
+    with STAGE_LATENCY.time("keyword"):
+        norm = normalized or normalize(text)
+        matched, deobfuscated = norm.skeleton, norm.deobfuscated
+        
+        for category, keyword, keyword_folded in _FOLDED_KEYWORDS:
+            if keyword_folded in matched or keyword_folded in deobfuscated:
                 return category, f"Contains potentially harmful content: '{keyword}'"
-    
-    return "Not Cyberbullying", "No harmful content detected"
+        
+        return "Not Cyberbullying", "No harmful content detected"
+
+
+def _parse_thresholds(value: str) -> Dict[str, float]:
+    """Parse "Label=0.9,Other Label=0.8" into a {label: threshold} dict."""
+    thresholds = {}
+    for item in value.split(","):
+        if "=" not in item:
+            continue
+        label, threshold = item.rsplit("=", 1)
+        try:
+            thresholds[label.strip()] = float(threshold)
+        except ValueError:
+            logger.warning("Ignoring invalid confidence threshold", extra={"fields": {"value": item}})
+    return thresholds
+
+
+# Confidence gating: Groq is only consulted when the local model's calibrated
+# confidence in its label is below the threshold for that label.
+GROQ_CONFIDENCE_THRESHOLD = float(os.getenv("GROQ_CONFIDENCE_THRESHOLD", "0.9"))
+GROQ_CONFIDENCE_THRESHOLDS = _parse_thresholds(os.getenv("GROQ_CONFIDENCE_THRESHOLDS", ""))
+
+# Fraction of confident cases still sent to Groq in the background, only to
+# measure how often Groq agrees with the local model. Off by default: every
+# shadow check is a paid Groq call.
+GROQ_SHADOW_SAMPLE_RATE = float(os.getenv("GROQ_SHADOW_SAMPLE_RATE", "0"))
+# Shadow checks queued or running at once; further samples are dropped
+GROQ_SHADOW_MAX_PENDING = int(os.getenv("GROQ_SHADOW_MAX_PENDING", "8"))
+
+_shadow_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="groq-shadow")
+_shadow_slots = threading.BoundedSemaphore(GROQ_SHADOW_MAX_PENDING)
+_shadow_lock = threading.Lock()
+_shadow_stats = {"checks": 0, "agree_label": 0, "agree_bullying": 0, "errors": 0, "dropped": 0, "by_label": {}}
+
+_usage_lock = threading.Lock()
+_usage_stats = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+
+GROQ_STREAM_WORKERS = int(os.getenv("GROQ_STREAM_WORKERS", "4"))
+_stream_executor = ThreadPoolExecutor(max_workers=GROQ_STREAM_WORKERS, thread_name_prefix="groq-stream")
+_stream_slots = threading.BoundedSemaphore(GROQ_STREAM_WORKERS)
+
+# Groq and the classifier API are called through one pooled session per
+# process, so calls reuse connections instead of a TLS handshake each
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "16"))
+_http_session = None
+_http_lock = threading.Lock()
+
 
+def http_session() -> requests.Session:
+    """The process-wide session for remote classifier calls, created on first use."""
+    global _http_session
+    if _http_session is None:
+        with _http_lock:
+            if _http_session is None:
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _http_session = session
+    return _http_session
 
-def classify_with_groq(text: str, timeout: int = 30) -> Tuple[Optional[str], Optional[str]]:
+
+def gate_reason(local_label: Optional[str], confidence: Optional[float],
+                keyword_label: Optional[str] = None, threshold: Optional[float] = None) -> Optional[str]:
     """
-    Classify text using Groq API with Llama model.
-    
-    Returns:
-        Tuple of (category, explanation) or (None, None) if API fails
+    Why a text needs Groq after the local stages, or None when it does not.
+
+    `threshold` overrides the configured per-label confidence thresholds
+    (evaluate.py sweeps it).
     """
-    api_key = os.getenv("GROQ_API_KEY")
-    if not api_key:
-        print("GROQ_API_KEY not set, using fallback classifier")
-        return keyword_fallback_classifier(text)
-    
-    url = "https://api.groq.com/openai/v1/chat/completions"
-    
+    if local_label is None or confidence is None:
+        return "called_no_model"
+    if threshold is None:
+        threshold = GROQ_CONFIDENCE_THRESHOLDS.get(local_label, GROQ_CONFIDENCE_THRESHOLD)
+    if confidence < threshold:
+        return "called_low_confidence"
+    if keyword_label is not None:
+        keyword_bullying = keyword_label != "Not Cyberbullying"
+        local_bullying = local_label != "Not Cyberbullying"
+        if keyword_bullying != local_bullying:
+            return "called_disagreement"
+    return None
+
+
+def needs_remote_check(local_label: Optional[str], confidence: Optional[float],
+                       keyword_label: Optional[str] = None) -> Tuple[bool, bool]:
+    """
+    Decide whether a text needs Groq after the local stages.
+
+    Returns (call_groq, shadow): call_groq is True when the local model is
+    missing, below the confidence threshold for its label, or disagrees with
+    the keyword classifier about whether the text is bullying (see
+    gate_reason). shadow is True for a sampled share of the remaining
+    confident cases.
+    """
+    reason = gate_reason(local_label, confidence, keyword_label)
+    if reason is not None:
+        GROQ_GATE.inc(reason)
+        return True, False
+
+    shadow = random.random() < GROQ_SHADOW_SAMPLE_RATE
+    GROQ_GATE.inc("skipped_shadow" if shadow else "skipped")
+    return False, shadow
+
+
+def _run_shadow_check(text: str, local_label: str):
+    QUEUE_DEPTH.dec("groq_shadow")
+    keyword_result = keyword_fallback_classifier(text)
+    try:
+        groq_result = classify_with_groq(text)
+    except Exception as e:
+        groq_result = None
+        logger.warning("Shadow Groq check failed", extra={"fields": {"error": str(e)}})
+    finally:
+        _shadow_slots.release()
+
+    with _shadow_lock:
+        # classify_with_groq answers with the keyword result when Groq fails
+        if groq_result is None or groq_result == keyword_result:
+            _shadow_stats["errors"] += 1
+            return
+        groq_label = groq_result[0]
+        _shadow_stats["checks"] += 1
+        per_label = _shadow_stats["by_label"].setdefault(local_label, {"checks": 0, "agree_label": 0})
+        per_label["checks"] += 1
+        if groq_label == local_label:
+            _shadow_stats["agree_label"] += 1
+            per_label["agree_label"] += 1
+        if (groq_label != "Not Cyberbullying") == (local_label != "Not Cyberbullying"):
+            _shadow_stats["agree_bullying"] += 1
+
+
+def submit_shadow_check(text: str, local_label: str):
+    """Send a confident case to Groq in the background to measure agreement; dropped when the queue is full."""
+    if not _shadow_slots.acquire(blocking=False):
+        with _shadow_lock:
+            _shadow_stats["dropped"] += 1
+        return
+    QUEUE_DEPTH.inc("groq_shadow")
+    _shadow_executor.submit(_run_shadow_check, text, local_label)
+
+
+def get_shadow_stats() -> dict:
+    """Return a snapshot of the Groq shadow agreement counters."""
+    with _shadow_lock:
+        stats = json.loads(json.dumps(_shadow_stats))
+    checks = stats["checks"]
+    stats["label_agreement"] = stats["agree_label"] / checks if checks else None
+    stats["bullying_agreement"] = stats["agree_bullying"] / checks if checks else None
+    return stats
+
+
+def _compact_messages(text: str) -> list:
+    # The text goes in its own message, so it needs no quoting or escaping
+    return [
+        {"role": "system", "content": GROQ_COMPACT_SYSTEM_PROMPT},
+        {"role": "user", "content": text},
+    ]
+
+
+def _verbose_messages(text: str) -> list:
     prompt = f"""You are a cyberbullying detection expert. Analyze the following text and determine if it contains cyberbullying content.
 
 IMPORTANT: Even mild insults like "stupid", "idiot", "dumb", "loser", "ugly", etc. should be flagged as problematic content.
@@ -96,104 +289,298 @@ Classify this text into EXACTLY ONE of these categories:
 
 Respond with ONLY a JSON object in this exact format (no markdown, no code blocks):
 {{"category": "category_name", "explanation": "brief reason"}}"""
+    return [
+        {"role": "system", "content": "You are a cyberbullying detection expert. Respond only with valid JSON."},
+        {"role": "user", "content": prompt},
+    ]
+
+
+_PROMPTS = {"compact": _compact_messages, "verbose": _verbose_messages}
+
+
+def _map_category(category: str) -> str:
+    """Map a near-miss category name onto the closest valid one."""
+    if category in VALID_CATEGORIES:
+        return category
+    category_lower = category.lower()
+    if "race" in category_lower or "ethnic" in category_lower:
+        return "Ethnicity/Race"
+    if "gender" in category_lower or "sexual" in category_lower:
+        return "Gender/Sexual"
+    if "religion" in category_lower:
+        return "Religion"
+    if "not" in category_lower or "safe" in category_lower:
+        return "Not Cyberbullying"
+    return "Other"
+
+
+def parse_verdict(content) -> Optional[Tuple[str, str]]:
+    """
+    Validate a model reply against {"category": str, "explanation": str}.
+    
+    Returns (category, explanation), or None when the reply is not a JSON
+    object with a string category.
+    """
+    try:
+        data = _json_loads(content)
+    except ValueError:
+        return None
+    if not isinstance(data, dict) or not isinstance(data.get("category"), str):
+        return None
+    explanation = data.get("explanation", "")
+    if not isinstance(explanation, str):
+        explanation = ""
+    return _map_category(data["category"].strip()), explanation
+
 
+# A complete "category" string in a partial JSON reply
+_CATEGORY_PATTERN = re.compile(r'"category"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+
+class _CompletionStream:
+    """Accumulates a streamed chat completion (server-sent events) chunk by chunk."""
+
+    def __init__(self, response):
+        self.response = response
+        self.content = ""
+        self.usage = None
+        self.finish_reason = None
+        self._chunks = self._iter_chunks()
+
+    def _iter_chunks(self):
+        for line in self.response.iter_lines():
+            if not line.startswith(b"data:"):
+                continue
+            data = line[5:].strip()
+            if data == b"[DONE]":
+                return
+            yield _json_loads(data)
+
+    def _add(self, chunk: dict):
+        # Groq sends usage in x_groq on the last chunk; OpenAI-style servers in usage
+        usage = chunk.get("usage") or (chunk.get("x_groq") or {}).get("usage")
+        if usage:
+            self.usage = usage
+        for choice in chunk.get("choices") or []:
+            self.content += (choice.get("delta") or {}).get("content") or ""
+            self.finish_reason = choice.get("finish_reason") or self.finish_reason
+
+    def read_category(self) -> Optional[str]:
+        """Read until the category is complete; None when the reply ends without one."""
+        for chunk in self._chunks:
+            self._add(chunk)
+            match = _CATEGORY_PATTERN.search(self.content)
+            if match:
+                return _map_category(json.loads(f'"{match.group(1)}"').strip())
+        return None
+
+    def read_rest(self):
+        try:
+            for chunk in self._chunks:
+                self._add(chunk)
+        finally:
+            self.response.close()
+
+
+def _finish_stream(stream: _CompletionStream):
+    QUEUE_DEPTH.dec("groq_stream")
+    try:
+        stream.read_rest()
+    except Exception as e:
+        logger.debug("Could not finish streamed Groq reply", extra={"fields": {"error": str(e)}})
+        return
+    finally:
+        _stream_slots.release()
+    if stream.usage:
+        _record_usage(stream.usage)
+
+
+def _classify_streamed(url: str, headers: dict, payload: dict, timeout: int,
+                       explanation: bool) -> Tuple[Optional[Tuple[str, str]], Optional[str]]:
+    """
+    Request a streamed completion and return (verdict, finish_reason).
+
+    Without `explanation` the verdict is (category, "") as soon as the
+    category has been streamed. verdict is None when the reply does not parse.
+    """
+    start = time.perf_counter()
+    response = http_session().post(url, headers=headers, json={**payload, "stream": True},
+                                   timeout=timeout, verify=False, stream=True)
+    router.note_limits("groq", response.headers, response.status_code)
+    try:
+        response.raise_for_status()
+        stream = _CompletionStream(response)
+        category = stream.read_category()
+        if category is not None and not explanation:
+            STAGE_LATENCY.observe(time.perf_counter() - start, "groq")
+            # Dropping closes the connection (finally below)
+            if GROQ_STREAM == "drop" or not _stream_slots.acquire(blocking=False):
+                return (category, ""), None
+            QUEUE_DEPTH.inc("groq_stream")
+            _stream_executor.submit(_finish_stream, stream)
+            response = None  # closed by _finish_stream
+            return (category, ""), None
+
+        stream.read_rest()
+        STAGE_LATENCY.observe(time.perf_counter() - start, "groq")
+        if stream.usage:
+            _record_usage(stream.usage)
+        # A reply cut off after the category still counts
+        verdict = parse_verdict(stream.content) or (category and (category, ""))
+        return verdict or None, stream.finish_reason
+    finally:
+        if response is not None:
+            response.close()
+
+
+def _record_usage(usage: dict):
+    prompt_tokens = usage.get("prompt_tokens") or 0
+    completion_tokens = usage.get("completion_tokens") or 0
+    GROQ_TOKENS.observe(prompt_tokens, "prompt")
+    GROQ_TOKENS.observe(completion_tokens, "completion")
+    with _usage_lock:
+        _usage_stats["calls"] += 1
+        _usage_stats["prompt_tokens"] += prompt_tokens
+        _usage_stats["completion_tokens"] += completion_tokens
+
+
+def get_groq_usage() -> dict:
+    """Token totals and per-call averages of the Groq calls made by this process."""
+    with _usage_lock:
+        stats = dict(_usage_stats)
+    calls = stats["calls"]
+    stats["prompt_variant"] = GROQ_PROMPT
+    stats["avg_prompt_tokens"] = stats["prompt_tokens"] / calls if calls else None
+    stats["avg_completion_tokens"] = stats["completion_tokens"] / calls if calls else None
+    return stats
+
+
+def _groq_failed(text: str, reason: str, fallback: bool) -> Tuple[Optional[str], Optional[str]]:
+    GROQ_FALLBACKS.inc(reason)
+    return keyword_fallback_classifier(text) if fallback else (None, None)
+
+
+def classify_with_groq(text: str, timeout: int = 30, explanation: bool = True,
+                       fallback: bool = True) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Classify text using Groq API with Llama model.
+    
+    Uses JSON mode with the prompt chosen by GROQ_PROMPT and counts the
+    prompt and completion tokens of every call. With GROQ_STREAM enabled
+    and explanation=False, returns as soon as the category is known and the
+    explanation is an empty string.
+    
+    Returns:
+        Tuple of (category, explanation). When the API fails this is the
+        keyword classifier's answer, or (None, None) with fallback=False.
+    """
+    api_key = os.getenv("GROQ_API_KEY")
+    if not api_key:
+        logger.debug("GROQ_API_KEY not set, using fallback classifier")
+        return _groq_failed(text, "not_configured", fallback)
+    
+    url = os.getenv("GROQ_API_URL", GROQ_DEFAULT_URL)
+    
     headers = {
         "Authorization": f"Bearer {api_key}",
         "Content-Type": "application/json"
     }
     
     payload = {
-        "model": "llama-3.3-70b-versatile",
-        "messages": [
-            {
-                "role": "system",
-                "content": "You are a cyberbullying detection expert. Respond only with valid JSON."
-            },
-            {
-                "role": "user",
-                "content": prompt
-            }
-        ],
-        "temperature": 0.2,
-        "max_tokens": 256
+        "model": GROQ_MODEL,
+        "messages": _PROMPTS.get(GROQ_PROMPT, _compact_messages)(text),
+        "temperature": 0,
+        "max_tokens": GROQ_MAX_TOKENS,
+        "response_format": {"type": "json_object"}
     }
     
     try:
+        if GROQ_STREAM in ("background", "drop"):
+            verdict, finish_reason = _classify_streamed(url, headers, payload, timeout, explanation)
+            if verdict is not None:
+                return verdict
+            logger.warning("Failed to parse streamed Groq response",
+                           extra={"fields": {"finish_reason": finish_reason}})
+            return _groq_failed(text, "parse_failure", fallback)
+        
         # Disable SSL verification to fix certificate errors
-        response = requests.post(url, headers=headers, json=payload, timeout=timeout, verify=False)
+        with STAGE_LATENCY.time("groq"):
+            response = http_session().post(url, headers=headers, json=payload, timeout=timeout, verify=False)
+        router.note_limits("groq", response.headers, response.status_code)
         response.raise_for_status()
         
-        result = response.json()
+        result = _json_loads(response.content)
+        _record_usage(result.get("usage") or {})
         
         # Extract the response from Groq
-        if "choices" in result and len(result["choices"]) > 0:
+        if result.get("choices"):
             message = result["choices"][0].get("message", {})
-            response_text = message.get("content", "").strip()
-            
-            # Clean up response - remove markdown code blocks if present
-            response_text = response_text.replace("```json", "").replace("```", "").strip()
+            verdict = parse_verdict(message.get("content") or "")
+            if verdict is not None:
+                return verdict
             
-            # Parse JSON response
-            try:
-                data = json.loads(response_text)
-                category = data.get("category", "Not Cyberbullying")
-                explanation = data.get("explanation", "")
-                
-                # Validate category
-                if category not in VALID_CATEGORIES:
-                    # Try to map to closest valid category
-                    category_lower = category.lower()
-                    if "race" in category_lower or "ethnic" in category_lower:
-                        category = "Ethnicity/Race"
-                    elif "gender" in category_lower or "sexual" in category_lower:
-                        category = "Gender/Sexual"
-                    elif "religion" in category_lower:
-                        category = "Religion"
-                    elif "not" in category_lower or "safe" in category_lower:
-                        category = "Not Cyberbullying"
-                    else:
-                        category = "Other"
-                
-                return category, explanation
-                
-            except json.JSONDecodeError:
-                print(f"Failed to parse Groq response: {response_text}")
-                # Try to extract category from plain text
-                for cat in VALID_CATEGORIES:
-                    if cat.lower() in response_text.lower():
-                        return cat, response_text
-                return keyword_fallback_classifier(text)
+            logger.warning("Failed to parse Groq response", extra={"fields": {
+                "response_len": len(message.get("content") or ""),
+                "finish_reason": result["choices"][0].get("finish_reason")}})
+            return _groq_failed(text, "parse_failure", fallback)
         
-        return keyword_fallback_classifier(text)
+        return _groq_failed(text, "no_choices", fallback)
         
     except requests.exceptions.HTTPError as e:
         if e.response.status_code == 429:
-            print("Groq API rate limited, using fallback classifier")
-            return keyword_fallback_classifier(text)
-        print(f"Error calling Groq API: {e}")
-        return keyword_fallback_classifier(text)
+            logger.warning("Groq API rate limited, using fallback classifier")
+            return _groq_failed(text, "rate_limited", fallback)
+        logger.warning("Error calling Groq API",
+                       extra={"fields": {"status": e.response.status_code, "error": str(e)}})
+        return _groq_failed(text, "http_error", fallback)
+    except requests.Timeout as e:
+        logger.warning("Groq API timed out", extra={"fields": {"error": str(e)}})
+        return _groq_failed(text, "timeout", fallback)
     except requests.RequestException as e:
-        print(f"Error calling Groq API: {e}")
-        return keyword_fallback_classifier(text)
+        logger.warning("Error calling Groq API", extra={"fields": {"error": str(e)}})
+        return _groq_failed(text, "request_error", fallback)
     except Exception as e:
-        print(f"Unexpected error in Groq classification: {e}")
-        return keyword_fallback_classifier(text)
+        logger.exception("Unexpected error in Groq classification")
+        return _groq_failed(text, "unexpected", fallback)
+
+
+def _remote_providers(timeout: int) -> dict:
+    """The configured remote classifiers as {name: callable returning a label or None}."""
+    providers = {}
+    if os.getenv("GROQ_API_KEY"):
+        # Only the category is needed, so a streamed reply can stop early
+        providers["groq"] = lambda text: classify_with_groq(
+            text, timeout=timeout, explanation=False, fallback=False)[0]
+    if os.getenv("CLASSIFIER_API_URL"):
+        providers["classifier_api"] = lambda text: _classify_with_classifier_api(text, timeout)
+    return providers
 
 
 def classify_with_api(text: str, timeout: int = 10) -> Optional[str]:
     """
     Classify text by calling an external classification API.
-    Uses Groq API for classification.
+    
+    Groq and the custom classifier API (CLASSIFIER_API_URL) are tried in
+    the order chosen by the latency-aware router (see routing.py), which
+    also hedges slow calls to the other provider.
     
     Returns:
-        Category string or None if all APIs fail
+        Category string; the keyword classifier's category when no provider
+        is configured or usable, or all of them failed
     """
-    # Try Groq
-    category, explanation = classify_with_groq(text, timeout=timeout)
+    category, _ = router.route(text, _remote_providers(timeout))
     if category:
         return category
-    
-    # Fallback to custom API if configured
+    return keyword_fallback_classifier(text)[0]
+
+
+def get_routing_stats() -> dict:
+    """Rolling latency, error rate and quota headroom per remote provider."""
+    return router.stats()
+
+
+def _classify_with_classifier_api(text: str, timeout: int) -> Optional[str]:
+    """Call the custom classifier API; returns its category or None."""
     api_url = os.getenv("CLASSIFIER_API_URL")
     if not api_url:
         return None
@@ -208,7 +595,9 @@ def classify_with_api(text: str, timeout: int = 10) -> Optional[str]:
     payload = {"text": text}
 
     try:
-        resp = requests.post(api_url, json=payload, headers=headers, timeout=timeout)
+        with STAGE_LATENCY.time("classifier_api"):
+            resp = http_session().post(api_url, json=payload, headers=headers, timeout=timeout)
+        router.note_limits("classifier_api", resp.headers, resp.status_code)
         resp.raise_for_status()
 
         try:
@@ -226,74 +615,103 @@ def classify_with_api(text: str, timeout: int = 10) -> Optional[str]:
             return text_body
 
     except requests.RequestException as e:
-        print(f"Error calling classifier API: {e}")
+        logger.warning("Error calling classifier API", extra={"fields": {"error": str(e)}})
 
     return None
 
 
-def get_detailed_classification(text: str) -> dict:
+def combine_labels(local_label: Optional[str], keyword_label: Optional[str],
+                   keyword_explanation: Optional[str], api_label: Optional[str],
+                   api_explanation: Optional[str], groq_called: bool = True) -> Tuple[str, str]:
+    """
+    Combine the per-stage labels into the final (label, explanation).
+    
+    Decision logic for final label:
+    1. If Groq succeeds and doesn't return keyword fallback result, use it (most accurate)
+    2. If keyword classifier detected something, use it (reliable for obvious cases)
+    3. If local model detected something, use it
+    4. Otherwise, use "Not Cyberbullying"
+    """
+    # Check if Groq actually responded (not just fallback)
+    groq_actually_responded = groq_called and (api_label != keyword_label or 
+                                               api_explanation != keyword_explanation)
+    
+    if api_label and api_label != "Not Cyberbullying" and groq_actually_responded:
+        # Groq detected bullying
+        return api_label, api_explanation
+    if keyword_label and keyword_label != "Not Cyberbullying":
+        # Keyword classifier detected bullying
+        return keyword_label, keyword_explanation
+    if local_label and local_label != "Not Cyberbullying":
+        # Local model detected bullying
+        return local_label, api_explanation or "Detected by local model"
+    # Nothing detected
+    return "Not Cyberbullying", api_explanation or "No harmful content detected"
+
+
+def get_detailed_classification(text: str, use_remote: bool = True) -> dict:
     """
     Get detailed classification with both local and API results.
     
+    Groq is only called when `needs_remote_check` says the local stages are
+    not confident enough; a sampled share of confident cases is checked
+    against Groq in the background instead. use_remote=False never calls
+    Groq (the API's degraded "local" tier).
+    
     Returns a dict with:
         - local_label: Label from local model (if available)
-        - api_label: Label from Groq API
+        - confidence: Calibrated local model probability of local_label
+        - api_label: Label from Groq API (None when Groq was skipped)
         - api_explanation: Explanation from Groq
         - final_label: The authoritative final label
         - is_bullying: Boolean indicating if content is problematic
     """
     local_label = None
+    confidence = None
     keyword_label = None
     keyword_explanation = None
+    norm = normalize(text)
     
     # Try to get local prediction
     try:
-        from detector import _predict_local_label
-        local_label = _predict_local_label(text)
+        from detector import _predict_local_with_confidence
+        local_label, confidence = _predict_local_with_confidence(text, norm)
     except Exception as e:
-        print(f"Local prediction failed: {e}")
+        logger.warning("Local prediction failed", extra={"fields": {"error": str(e)}})
         local_label = None
     
     # ALWAYS get keyword fallback prediction (it's fast and reliable)
-    keyword_label, keyword_explanation = keyword_fallback_classifier(text)
-    
-    # Get Groq prediction (will also fallback to keywords if API fails)
-    api_label, api_explanation = classify_with_groq(text)
+    keyword_label, keyword_explanation = keyword_fallback_classifier(text, norm)
     
-    # Decision logic for final label:
-    # 1. If Groq succeeds and doesn't return keyword fallback result, use it (most accurate)
-    # 2. If keyword classifier detected something, use it (reliable for obvious cases)  
-    # 3. If local model detected something, use it
-    # 4. Otherwise, use "Not Cyberbullying"
+    call_groq, shadow = needs_remote_check(local_label, confidence, keyword_label)
+    call_groq = call_groq and use_remote
+    if shadow and use_remote:
+        submit_shadow_check(text, local_label)
     
-    # Check if Groq actually responded (not just fallback)
-    groq_actually_responded = (api_label != keyword_label or 
-                                api_explanation != keyword_explanation)
-    
-    if api_label and api_label != "Not Cyberbullying" and groq_actually_responded:
-        # Groq detected bullying
-        final_label = api_label
-        final_explanation = api_explanation
-    elif keyword_label and keyword_label != "Not Cyberbullying":
-        # Keyword classifier detected bullying
-        final_label = keyword_label
-        final_explanation = keyword_explanation
-    elif local_label and local_label != "Not Cyberbullying":
-        # Local model detected bullying
-        final_label = local_label
-        final_explanation = api_explanation or "Detected by local model"
+    # Get Groq prediction (will also fallback to keywords if API fails)
+    if call_groq:
+        api_label, api_explanation = classify_with_groq(text)
     else:
-        # Nothing detected
-        final_label = "Not Cyberbullying"
-        final_explanation = api_explanation or "No harmful content detected"
+        api_label, api_explanation = None, None
+    
+    final_label, final_explanation = combine_labels(
+        local_label, keyword_label, keyword_explanation,
+        api_label, api_explanation, groq_called=call_groq
+    )
     
     is_bullying = final_label != "Not Cyberbullying"
+    FINAL_LABELS.inc(final_label)
     
-    print(f"[CLASSIFICATION] Text: '{text[:50]}...'")
-    print(f"[CLASSIFICATION] Local: {local_label}, Keyword: {keyword_label}, Groq: {api_label}, Final: {final_label}")
+    if classification_sampler():
+        fields = text_fields(text)
+        fields.update(local=local_label, confidence=confidence, keyword=keyword_label,
+                      groq=api_label, final=final_label)
+        logger.info("classification", extra={"fields": fields})
     
     return {
         "local_label": local_label,
+        "confidence": confidence,
+        "groq_called": call_groq,
         "api_label": api_label,
         "api_explanation": api_explanation or final_explanation,
         "final_label": final_label,
@@ -12,10 +12,12 @@ from dotenv import load_dotenv
 load_dotenv()
 
 # Import custom modules
-from auth import login, signup, get_user_data, update_profile
-from database import create_post, get_all_posts, create_comment, get_post_comments
-from detector import detect_cyberbullying
-from api_client import get_detailed_classification, classify_with_gemini
+from auth import login, signup, get_user_data, update_profile, set_user_data, update_user_data
+from database import create_post, get_all_posts, create_comment, get_post_comments, post_image_url
+from logging_config import get_logger
+from versions import feed_etag, comments_etag
+
+logger = get_logger(__name__)
 
 # Page configuration
 st.set_page_config(
@@ -38,6 +40,54 @@ if 'user' not in st.session_state:
     st.session_state.user = None
 if 'page' not in st.session_state:
     st.session_state.page = 'login'
+if 'feed_limit' not in st.session_state:
+    st.session_state.feed_limit = 20
+
+# ============================================
+# Cached resources and data
+# ============================================
+# Streamlit reruns this whole script on every interaction (even typing in a
+# text box), so storage reads are cached across reruns and sessions. Posts and
+# comments are keyed by the change counters in versions.py: any write made
+# through database.py in this process invalidates them at once, and the TTL
+# bounds how stale changes from other processes can get.
+
+CACHE_TTL_SECONDS = int(os.getenv("STREAMLIT_CACHE_TTL", "30"))
+FEED_PAGE_SIZE = 20
+
+@st.cache_resource(show_spinner=False)
+def get_api_client():
+    """api_client with its pooled HTTP session for Groq, shared by all sessions."""
+    import api_client
+    api_client.http_session()
+    return api_client
+
+@st.cache_resource(show_spinner="Loading the classifier...")
+def get_detector():
+    """The detector module with its model loaded, shared by all sessions."""
+    get_api_client()
+    import detector
+    return detector
+
+def detect_cyberbullying(text, post_id=None):
+    return get_detector().detect_cyberbullying(text, post_id=post_id)
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, max_entries=4, show_spinner=False)
+def cached_feed(version):
+    """All posts, newest first."""
+    return sorted(get_all_posts(), key=lambda x: x.get('timestamp', ''), reverse=True)
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, max_entries=1000, show_spinner=False)
+def cached_comments(post_id, version):
+    return get_post_comments(post_id)
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, max_entries=10000, show_spinner=False)
+def cached_user(user_id):
+    return get_user_data(user_id) or {}
+
+def invalidate_user_cache():
+    """Call after changing any user's data (profile, reputation, ban)."""
+    cached_user.clear()
 
 # This function should be in app.py
 def decrease_reputation(user_id):
@@ -50,16 +100,15 @@ def decrease_reputation(user_id):
     current_score = user_data.get('reputation_score', 10)
     bad_comments_count = user_data.get('bad_comments_count', 0) + 1
     
-    # For debugging
-    print(f"User {user_id}: current score={current_score}, bad comments={bad_comments_count}")
+    logger.debug("Bad comment recorded", extra={"fields": {
+        "user_id": user_id, "score": current_score, "bad_comments": bad_comments_count}})
     
     # For every 2 bad comments, decrease score by 1
     if bad_comments_count % 2 == 0:  # Only decrease on even counts (2, 4, 6...)
         new_score = max(0, current_score - 1)
         
-        # Update user data in Firebase
-        from auth import db
-        db.child("users").child(user_id).update({
+        # Update user data in storage
+        update_user_data(user_id, {
             "reputation_score": new_score,
             "bad_comments_count": bad_comments_count
         })
@@ -68,12 +117,12 @@ def decrease_reputation(user_id):
         
         # Check if user needs to be banned
         if new_score < 5:
-            db.child("users").child(user_id).update({"is_banned": True})
+            update_user_data(user_id, {"is_banned": True})
             st.error("Your account has been banned due to low reputation score.")
     else:
         # Just update the bad comments count
-        from auth import db
-        db.child("users").child(user_id).update({"bad_comments_count": bad_comments_count})
+        update_user_data(user_id, {"bad_comments_count": bad_comments_count})
+    invalidate_user_cache()
 
 # Login page
 def show_login_page():
@@ -94,7 +143,6 @@ def show_login_page():
                 # Add this check and initialization
                 if user_data is None:
                     # User exists in auth but not in database - create basic profile
-                    from auth import db
                     user_data = {
                         "username": email.split('@')[0],  # Simple username from email
                         "email": email,
@@ -102,7 +150,8 @@ def show_login_page():
                         "profile_complete": False,
                         "is_banned": False
                     }
-                    db.child("users").child(user['localId']).set(user_data)
+                    set_user_data(user['localId'], user_data)
+                    invalidate_user_cache()
                     # Get the user data again
                     user_data = get_user_data(user['localId'])
                 
@@ -154,6 +203,7 @@ def show_complete_profile():
                 "bio": bio,
             }
             update_profile(st.session_state.user['localId'], profile_data)
+            invalidate_user_cache()
             st.success("Profile updated!")
             st.session_state.page = 'home'
             st.experimental_rerun()
@@ -163,7 +213,7 @@ def show_home():
     st.title("Home Feed")
     
     # Sidebar with user profile
-    user_data = get_user_data(st.session_state.user['localId'])
+    user_data = cached_user(st.session_state.user['localId'])
     with st.sidebar:
         st.write(f"Welcome, {user_data.get('username', 'User')}")
         st.write(f"Reputation Score: {user_data.get('reputation_score', 10)}/10")
@@ -199,15 +249,15 @@ def show_home():
                 st.success("This text does not contain bullying content")
     
     # Display posts
-    posts = get_all_posts()
+    posts = cached_feed(feed_etag())
     
     if not posts:
         st.info("No posts yet! Be the first to post something.")
         return
     
-    for post in sorted(posts, key=lambda x: x.get('timestamp', ''), reverse=True):
+    for post in posts[:st.session_state.feed_limit]:
         with st.container():
-            post_author = get_user_data(post.get('user_id', ''))
+            post_author = cached_user(post.get('user_id', ''))
             
             # Display post header
             col1, col2 = st.columns([1, 4])
@@ -221,15 +271,18 @@ def show_home():
             st.write(post.get('content', ''))
             
             # Display post image if available
-            if post.get('image_url'):
-                st.image(post.get('image_url'), use_column_width=True)
+            if post_image_url(post):
+                st.image(post_image_url(post), use_column_width=True)
+            elif post.get('image_status') == 'processing':
+                st.caption("Image is still processing...")
             
-            # Comment section
-            with st.expander(f"💬 Comments"):
-                comments = get_post_comments(post.get('id', ''))
+            # Comment section, only loaded once the reader opens it
+            # (an expander's body always runs, so a toggle decides instead)
+            if st.toggle("💬 Comments", key=f"show_comments_{post.get('id')}"):
+                comments = cached_comments(post.get('id', ''), comments_etag(post.get('id', '')))
                 
                 for comment in comments:
-                    comment_author = get_user_data(comment.get('user_id', ''))
+                    comment_author = cached_user(comment.get('user_id', ''))
                     st.write(f"**{comment_author.get('username', 'Unknown')}**: {comment.get('content', '')}")
                     if comment.get('is_bullying'):
                         st.warning(f"⚠️ This comment has been flagged as {comment.get('bullying_type')} content")
@@ -239,15 +292,16 @@ def show_home():
                 if st.button("Post Comment", key=f"post_comment_{post.get('id')}"):
                     if new_comment.strip():
                         # Check for cyberbullying
-                        is_bullying, bullying_type = detect_cyberbullying(new_comment)
-                        print(f"Detection result for '{new_comment}': is_bullying={is_bullying}, type={bullying_type}")
+                        is_bullying, bullying_type = detect_cyberbullying(new_comment, post_id=post.get('id'))
+                        logger.debug("Comment checked", extra={"fields": {"is_bullying": is_bullying, "type": bullying_type}})
                         
                         # Create the comment
                         comment_id = create_comment(st.session_state.user['localId'], 
                                                  post.get('id'), 
                                                  new_comment, 
                                                  is_bullying, 
-                                                 bullying_type)
+                                                 bullying_type,
+                                                 username=cached_user(st.session_state.user['localId']).get('username'))
                         
                         if is_bullying:
                             # Show a warning
@@ -259,6 +313,11 @@ def show_home():
                         st.experimental_rerun()
         
         st.markdown("---")
+    
+    if len(posts) > st.session_state.feed_limit:
+        if st.button("Show more posts"):
+            st.session_state.feed_limit += FEED_PAGE_SIZE
+            st.experimental_rerun()
 
 # Create post page
 def show_create_post():
@@ -269,7 +328,8 @@ def show_create_post():
     
     if st.button("Post"):
         if content.strip() or uploaded_file:
-            create_post(st.session_state.user['localId'], content, uploaded_file)
+            create_post(st.session_state.user['localId'], content, uploaded_file,
+                        username=cached_user(st.session_state.user['localId']).get('username'))
             st.success("Post created successfully!")
             st.session_state.page = 'home'
             st.experimental_rerun()
@@ -282,7 +342,7 @@ def show_create_post():
 
 # Profile page
 def show_profile():
-    user_data = get_user_data(st.session_state.user['localId'])
+    user_data = cached_user(st.session_state.user['localId'])
     st.title(f"{user_data.get('username', 'User')}'s Profile")
     
     # Display reputation score prominently
@@ -1,40 +1,24 @@
-import pyrebase
 from firebase_admin import credentials, auth, initialize_app
 import os
-import ssl
 from dotenv import load_dotenv
-
-# SSL workaround for Firebase connections
-try:
-    _create_unverified_https_context = ssl._create_unverified_context
-except AttributeError:
-    pass
-else:
-    ssl._create_default_https_context = _create_unverified_https_context
+from storage import get_storage, firebase_config
+from logging_config import get_logger
+from versions import bump_feed
 
 # Load environment variables
 load_dotenv()
 
+logger = get_logger(__name__)
+
 # Firebase Configuration from environment variables
-config = {
-    "apiKey": os.getenv("FIREBASE_API_KEY"),
-    "authDomain": os.getenv("FIREBASE_AUTH_DOMAIN"),
-    "databaseURL": os.getenv("FIREBASE_DATABASE_URL"),
-    "projectId": os.getenv("FIREBASE_PROJECT_ID"),
-    "storageBucket": os.getenv("FIREBASE_STORAGE_BUCKET"),
-    "messagingSenderId": os.getenv("FIREBASE_MESSAGING_SENDER_ID"),
-    "appId": os.getenv("FIREBASE_APP_ID")
-}
+config = firebase_config()
 
-# Initialize Firebase
-firebase = pyrebase.initialize_app(config)
-auth_firebase = firebase.auth()
-db = firebase.database()
-storage = firebase.storage()
+# Storage backend (Firebase, SQLite or in-memory; see storage.py)
+storage = get_storage()
 
 def login(email, password):
     try:
-        user = auth_firebase.sign_in_with_email_and_password(email, password)
+        user = storage.sign_in(email, password)
         return user
     except:
         return None
@@ -42,7 +26,7 @@ def login(email, password):
 def signup(email, password, username):
     try:
         # Create user
-        user = auth_firebase.create_user_with_email_and_password(email, password)
+        user = storage.sign_up(email, password)
         # Initialize user data
         user_data = {
             "username": username,
@@ -51,25 +35,35 @@ def signup(email, password, username):
             "profile_complete": False,
             "is_banned": False
         }
-        db.child("users").child(user['localId']).set(user_data)
+        storage.set_user(user['localId'], user_data)
         return user
     except Exception as e:
-        print(f"Signup Error: {e}")
+        logger.warning("Signup failed", extra={"fields": {"error": str(e)}})
         return None  # Make sure we return None on error
 
 def get_user_data(user_id):
-    return db.child("users").child(user_id).get().val()
+    return storage.get_user(user_id)
+
+def set_user_data(user_id, user_data):
+    """Create or replace a user's profile record."""
+    storage.set_user(user_id, user_data)
+
+def update_user_data(user_id, fields):
+    """Update selected fields of a user's profile record."""
+    storage.update_user(user_id, fields)
 
 def update_profile(user_id, profile_data):
     current_data = get_user_data(user_id)
     updated_data = {**current_data, **profile_data, "profile_complete": True}
-    db.child("users").child(user_id).update(updated_data)
+    storage.update_user(user_id, updated_data)
+    # The feed shows usernames
+    bump_feed()
 
 def update_reputation_score(user_id, new_score):
     """Update user's reputation score in the database."""
     try:
-        db.child("users").child(user_id).update({"reputation_score": new_score})
+        storage.update_user(user_id, {"reputation_score": new_score})
         return True
     except Exception as e:
-        print(f"Error updating reputation score: {e}")
-        return False
\ No newline at end of file
+        logger.error("Error updating reputation score", extra={"fields": {"user_id": user_id, "error": str(e)}})
+        return False
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the classification stages.
+
+Measures p50/p95/p99 latency and throughput for:
+    - keyword_fallback_classifier
+    - _predict_local_label at several batch sizes (via _predict_local_probs_batch)
+    - detect_cyberbullying and get_detailed_classification (flood index off)
+    - detect_cyberbullying answered from the flood index (flood.py)
+
+Groq calls go to a local fake server (fake_groq.py) with configurable latency
+and error rate, so runs are reproducible and need no API key. Results are
+written as JSON so runs can be compared across commits.
+
+Usage:
+    python benchmark.py -o bench.json
+    python benchmark.py --groq-latency-ms 300 --groq-error-rate 0.05 -o bench.json
+    python benchmark.py --compare baseline.json -o bench.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+CORPUS = [
+    "you are stupid",
+    "you idiot",
+    "you are ugly",
+    "I hate you",
+    "you loser",
+    "shut up",
+    "you're a moron",
+    "dumbass",
+    "hello friend",
+    "have a nice day",
+    "Hello, how are you today?",
+    "I hate people from your country, go back where you came from",
+    "You're stupid because you're a woman",
+    "Your religion is evil and you should be ashamed",
+    "Great work on the project, really impressed!",
+    "Women shouldn't be allowed to vote",
+    "Congrats on the new job, you deserve it",
+    "nobody likes you, just go away",
+    "See you at practice tomorrow",
+    "what a beautiful picture of the mountains",
+]
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100.0 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(latencies_s: list, items_per_call: int = 1) -> dict:
+    """Turn per-call latencies (seconds) into the reported statistics."""
+    values = sorted(latencies_s)
+    total = sum(values)
+    calls = len(values)
+    return {
+        "calls": calls,
+        "p50_ms": percentile(values, 50) * 1000,
+        "p95_ms": percentile(values, 95) * 1000,
+        "p99_ms": percentile(values, 99) * 1000,
+        "mean_ms": (total / calls) * 1000 if calls else 0.0,
+        "calls_per_s": calls / total if total else 0.0,
+        "items_per_s": calls * items_per_call / total if total else 0.0,
+    }
+
+
+def run_stage(fn, inputs: list, iterations: int, warmup: int) -> list:
+    """Call fn over the inputs round-robin and return per-call latencies."""
+    for i in range(warmup):
+        fn(inputs[i % len(inputs)])
+    latencies = []
+    for i in range(iterations):
+        arg = inputs[i % len(inputs)]
+        start = time.perf_counter()
+        fn(arg)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _environment() -> dict:
+    env = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+    try:
+        import torch
+        env["torch"] = torch.__version__
+        env["torch_threads"] = torch.get_num_threads()
+    except ImportError:
+        env["torch"] = None
+    return env
+
+
+def compare(current: dict, baseline: dict):
+    """Print p50/p95 and throughput changes against a previous run."""
+    print(f"\nComparison against {baseline.get('commit', '?')}:", file=sys.stderr)
+    print(f"{'stage':<36}{'p50 ms':>16}{'p95 ms':>16}{'items/s':>18}", file=sys.stderr)
+    for name, stats in current["stages"].items():
+        base = baseline.get("stages", {}).get(name)
+        if not base:
+            continue
+
+        def fmt(key):
+            old, new = base[key], stats[key]
+            change = (new - old) / old * 100 if old else 0.0
+            return f"{new:.2f} ({change:+.0f}%)"
+
+        print(f"{name:<36}{fmt('p50_ms'):>16}{fmt('p95_ms'):>16}{fmt('items_per_s'):>18}",
+              file=sys.stderr)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the classification stages")
+    parser.add_argument("-o", "--output", help="Write JSON results here (default: stdout)")
+    parser.add_argument("--iterations", type=int, default=200, help="Timed calls per stage")
+    parser.add_argument("--warmup", type=int, default=10, help="Untimed calls per stage")
+    parser.add_argument("--batch-sizes", default="1,8,32", help="Local model batch sizes")
+    parser.add_argument("--groq-latency-ms", type=float, default=200.0, help="Fake Groq mean latency")
+    parser.add_argument("--groq-jitter-ms", type=float, default=20.0, help="Fake Groq latency stddev")
+    parser.add_argument("--groq-token-ms", type=float, default=5.0, help="Fake Groq time per completion token")
+    parser.add_argument("--groq-error-rate", type=float, default=0.0, help="Fake Groq 500 rate")
+    parser.add_argument("--groq-rate-limit-rate", type=float, default=0.0, help="Fake Groq 429 rate")
+    parser.add_argument("--groq-iterations", type=int, default=50,
+                        help="Timed calls for the stages that may call Groq")
+    parser.add_argument("--seed", type=int, default=1234, help="Random seed")
+    parser.add_argument("--compare", help="Previous JSON result to compare against")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    random.seed(args.seed)
+
+    from fake_groq import start_fake_groq
+    groq = start_fake_groq(latency_ms=args.groq_latency_ms, jitter_ms=args.groq_jitter_ms,
+                           error_rate=args.groq_error_rate, rate_limit_rate=args.groq_rate_limit_rate,
+                           token_ms=args.groq_token_ms)
+
+    # Point the pipeline at the fake server before the modules read their config
+    os.environ["GROQ_API_URL"] = groq.url
+    os.environ["GROQ_API_KEY"] = "fake-benchmark-key"
+    os.environ["GROQ_SHADOW_SAMPLE_RATE"] = "0"
+
+    from api_client import keyword_fallback_classifier, get_detailed_classification
+    import api_client
+    import detector
+    from flood import flood_index
+    from normalize import normalize
+
+    results = {
+        "commit": _git_commit(),
+        "timestamp": datetime.utcnow().isoformat(),
+        "environment": _environment(),
+        "config": {
+            "iterations": args.iterations,
+            "groq_iterations": args.groq_iterations,
+            "warmup": args.warmup,
+            "groq_latency_ms": args.groq_latency_ms,
+            "groq_jitter_ms": args.groq_jitter_ms,
+            "groq_token_ms": args.groq_token_ms,
+            "groq_error_rate": args.groq_error_rate,
+            "groq_rate_limit_rate": args.groq_rate_limit_rate,
+            "model_loaded": detector.model is not None,
+            "seed": args.seed,
+        },
+        "stages": {},
+    }
+    stages = results["stages"]
+
+    def record(name, latencies, items_per_call=1):
+        stages[name] = summarize(latencies, items_per_call)
+        print(f"{name:<36}p50 {stages[name]['p50_ms']:8.2f} ms  p95 {stages[name]['p95_ms']:8.2f} ms  "
+              f"{stages[name]['items_per_s']:10.1f} items/s", file=sys.stderr)
+
+    record("keyword_fallback_classifier",
+           run_stage(keyword_fallback_classifier, CORPUS, args.iterations, args.warmup))
+
+    for batch_size in [int(b) for b in args.batch_sizes.split(",") if b.strip()]:
+        batches = [[CORPUS[(i + j) % len(CORPUS)] for j in range(batch_size)] for i in range(len(CORPUS))]
+        if batch_size == 1:
+            latencies = run_stage(detector._predict_local_label, CORPUS, args.iterations, args.warmup)
+        else:
+            latencies = run_stage(detector._predict_local_probs_batch, batches, args.iterations, args.warmup)
+        record(f"local_model[batch={batch_size}]", latencies, batch_size)
+
+    # Both Groq prompt variants, with the tokens each spends per call
+    default_prompt = api_client.GROQ_PROMPT
+    results["groq_prompts"] = {}
+    for variant in ("compact", "verbose"):
+        api_client.GROQ_PROMPT = variant
+        before = api_client.get_groq_usage()
+        record(f"classify_with_groq[prompt={variant}]",
+               run_stage(api_client.classify_with_groq, CORPUS, args.groq_iterations, args.warmup))
+        after = api_client.get_groq_usage()
+        calls = after["calls"] - before["calls"]
+        results["groq_prompts"][variant] = {
+            "calls": calls,
+            "avg_prompt_tokens": (after["prompt_tokens"] - before["prompt_tokens"]) / calls if calls else None,
+            "avg_completion_tokens": (after["completion_tokens"] - before["completion_tokens"]) / calls if calls else None,
+        }
+    api_client.GROQ_PROMPT = default_prompt
+
+    # Time to a category-only verdict (the comment path), whole reply vs streamed
+    default_stream = api_client.GROQ_STREAM
+    for mode in ("off", "background"):
+        api_client.GROQ_STREAM = mode
+        record(f"groq_category_only[stream={mode}]",
+               run_stage(lambda text: api_client.classify_with_groq(text, explanation=False),
+                         CORPUS, args.groq_iterations, args.warmup))
+    api_client.GROQ_STREAM = default_stream
+
+    # The corpus repeats, so with the flood index on every call after the
+    # first pass would be a near-duplicate hit; time the pipeline without it
+    # and the hit path as its own stage
+    flood_window = flood_index.window
+    flood_index.window = 0
+    detect_latencies = run_stage(detector.detect_cyberbullying, CORPUS, args.groq_iterations, args.warmup)
+    record("detect_cyberbullying", detect_latencies)
+
+    detailed_latencies = run_stage(get_detailed_classification, CORPUS, args.groq_iterations, args.warmup)
+    record("get_detailed_classification", detailed_latencies)
+
+    flood_index.window = flood_window
+    if flood_index.enabled:
+        flooded = [text for text in CORPUS if flood_index.signature(normalize(text)) is not None]
+        for text in flooded:
+            detector.detect_cyberbullying(text)
+        record("detect_cyberbullying[flood_hit]",
+               run_stage(detector.detect_cyberbullying, flooded, args.groq_iterations, args.warmup))
+
+    results["fake_groq_requests"] = groq.requests
+    groq.shutdown()
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Bulk classification of CSV/JSONL corpora.
+
+Streams an input file in chunks, runs the keyword and local-model stages for
+each chunk in a process pool (Groq is optional) and appends the results to
+CSV, JSONL or Parquet output as it goes. Progress is checkpointed after every
+chunk, so an interrupted run continues where it stopped with --resume.
+
+Usage:
+    python bulk_classify.py cyberbullying_tweets.csv -o scored.csv
+    python bulk_classify.py cb_multi_labeled_balanced.csv -o scored.jsonl --workers 4
+    python bulk_classify.py comments.jsonl -o scored.parquet --groq --resume
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional
+
+TEXT_COLUMN_CANDIDATES = ("text", "tweet_text", "comment", "content")
+
+RESULT_COLUMNS = [
+    "keyword_label", "local_label", "confidence", "groq_label",
+    "final_label", "is_bullying", "bullying_type"
+]
+
+
+# ============================================
+# Input
+# ============================================
+
+def _detect_format(path: str) -> str:
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".jsonl", ".ndjson"):
+        return "jsonl"
+    if ext == ".parquet":
+        return "parquet"
+    return "csv"
+
+
+def iter_rows(path: str) -> Iterator[dict]:
+    """Yield the input rows one at a time as dicts."""
+    if _detect_format(path) == "jsonl":
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+    else:
+        csv.field_size_limit(sys.maxsize)
+        with open(path, encoding="utf-8", newline="") as f:
+            yield from csv.DictReader(f)
+
+
+def iter_chunks(rows: Iterator[dict], chunk_size: int, skip: int = 0) -> Iterator[List[dict]]:
+    """Group rows into lists of `chunk_size`, skipping the first `skip` rows."""
+    chunk = []
+    for index, row in enumerate(rows):
+        if index < skip:
+            continue
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _pick_text_column(row: dict, requested: Optional[str]) -> str:
+    if requested:
+        if requested not in row:
+            raise SystemExit(f"Column '{requested}' not found in input (columns: {', '.join(row)})")
+        return requested
+    for column in TEXT_COLUMN_CANDIDATES:
+        if column in row:
+            return column
+    raise SystemExit(f"Could not find a text column (columns: {', '.join(row)}); use --text-column")
+
+
+# ============================================
+# Output
+# ============================================
+
+class _AppendWriter:
+    """Appends rows to a CSV or JSONL file; `tell()` is the checkpointed offset."""
+
+    def __init__(self, path: str, fmt: str, columns: List[str], offset: Optional[int]):
+        self.fmt = fmt
+        self.columns = columns
+        exists = os.path.exists(path)
+        self.file = open(path, "a+", encoding="utf-8", newline="")
+        if offset is not None and exists:
+            # Drop anything written after the last checkpoint
+            self.file.truncate(offset)
+            self.file.seek(offset)
+        if fmt == "csv":
+            self.writer = csv.DictWriter(self.file, fieldnames=columns, extrasaction="ignore")
+            if self.file.tell() == 0:
+                self.writer.writeheader()
+
+    def write(self, rows: List[dict]):
+        if self.fmt == "csv":
+            self.writer.writerows(rows)
+        else:
+            for row in rows:
+                self.file.write(json.dumps(row, ensure_ascii=False) + "\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def tell(self) -> int:
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+
+class _ParquetWriter:
+    """Writes one Parquet part file per chunk into an output directory."""
+
+    def __init__(self, path: str, columns: List[str], parts: int):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise SystemExit("Parquet output needs pyarrow: pip install pyarrow")
+        self.path = path
+        self.columns = columns
+        self.parts = parts
+        os.makedirs(path, exist_ok=True)
+
+    def write(self, rows: List[dict]):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        table = pa.Table.from_pylist([{c: row.get(c) for c in self.columns} for row in rows])
+        part_path = os.path.join(self.path, f"part-{self.parts:05d}.parquet")
+        pq.write_table(table, part_path + ".tmp")
+        os.replace(part_path + ".tmp", part_path)
+        self.parts += 1
+
+    def tell(self) -> int:
+        return self.parts
+
+    def close(self):
+        pass
+
+
+def _open_writer(path: str, columns: List[str], checkpoint: Optional[dict]):
+    fmt = _detect_format(path)
+    if fmt == "parquet":
+        return _ParquetWriter(path, columns, checkpoint["output_offset"] if checkpoint else 0)
+    return _AppendWriter(path, fmt, columns, checkpoint["output_offset"] if checkpoint else None)
+
+
+def _load_checkpoint(path: str) -> Optional[dict]:
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def _save_checkpoint(path: str, data: dict):
+    with open(path + ".tmp", "w") as f:
+        json.dump(data, f)
+    os.replace(path + ".tmp", path)
+
+
+# ============================================
+# Classification (runs in the worker processes)
+# ============================================
+
+def _init_worker(torch_threads: int):
+    try:
+        import torch
+        torch.set_num_threads(torch_threads)
+    except ImportError:
+        pass
+    # Load the model once per worker up front instead of on the first chunk
+    import detector  # noqa: F401
+
+
+def classify_chunk(texts: List[str], use_groq: bool = False, batch_size: int = 32) -> List[dict]:
+    """Run the keyword and local-model stages (and Groq if asked) over a list of texts."""
+    from api_client import keyword_fallback_classifier, needs_remote_check, classify_with_groq, combine_labels
+    from detector import _predict_local_probs_batch
+
+    probs = []
+    for start in range(0, len(texts), batch_size):
+        probs.extend(_predict_local_probs_batch(texts[start:start + batch_size]))
+
+    results = []
+    for text, text_probs in zip(texts, probs):
+        keyword_label, keyword_explanation = keyword_fallback_classifier(text)
+        if text_probs:
+            local_label = max(text_probs, key=text_probs.get)
+            confidence = text_probs[local_label]
+        else:
+            local_label, confidence = keyword_label, None
+
+        groq_label, groq_explanation, groq_called = None, None, False
+        if use_groq and needs_remote_check(local_label, confidence, keyword_label)[0]:
+            groq_called = True
+            groq_label, groq_explanation = classify_with_groq(text)
+
+        final_label, _ = combine_labels(local_label, keyword_label, keyword_explanation,
+                                        groq_label, groq_explanation, groq_called=groq_called)
+        is_bullying = final_label != "Not Cyberbullying"
+        results.append({
+            "keyword_label": keyword_label,
+            "local_label": local_label,
+            "confidence": round(confidence, 6) if confidence is not None else None,
+            "groq_label": groq_label,
+            "final_label": final_label,
+            "is_bullying": is_bullying,
+            "bullying_type": final_label.lower() if is_bullying else None,
+        })
+    return results
+
+
+# ============================================
+# Driver
+# ============================================
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Classify a CSV/JSONL corpus in bulk")
+    parser.add_argument("input", help="Input .csv or .jsonl file")
+    parser.add_argument("-o", "--output", required=True,
+                        help="Output file (.csv, .jsonl) or directory (.parquet)")
+    parser.add_argument("--text-column", help="Column holding the text (default: auto-detect)")
+    parser.add_argument("--chunk-size", type=int, default=512, help="Rows per chunk")
+    parser.add_argument("--batch-size", type=int, default=32, help="Texts per model forward pass")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="Worker processes (each loads its own model unless INFERENCE_SOCKET is set)")
+    parser.add_argument("--groq", action="store_true",
+                        help="Also call Groq for texts the local stages are not confident about")
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: <output>.checkpoint.json)")
+    parser.add_argument("--resume", action="store_true", help="Continue from the checkpoint")
+    parser.add_argument("--progress-every", type=float, default=5.0,
+                        help="Seconds between throughput reports")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    checkpoint_path = args.checkpoint or f"{args.output.rstrip('/')}.checkpoint.json"
+
+    checkpoint = _load_checkpoint(checkpoint_path) if args.resume else None
+    if checkpoint and checkpoint.get("input") != os.path.abspath(args.input):
+        raise SystemExit(f"Checkpoint {checkpoint_path} belongs to {checkpoint.get('input')}")
+    if not args.resume and os.path.exists(args.output):
+        raise SystemExit(f"{args.output} already exists; use --resume or pick another output")
+    if args.resume and checkpoint is None and os.path.exists(args.output):
+        raise SystemExit(f"No checkpoint at {checkpoint_path} to resume {args.output} from")
+
+    first_row = next(iter_rows(args.input), None)
+    if first_row is None:
+        print("Input is empty", file=sys.stderr)
+        return
+    text_column = _pick_text_column(first_row, args.text_column)
+    columns = list(first_row) + [c for c in RESULT_COLUMNS if c not in first_row]
+
+    rows_done = checkpoint["rows_done"] if checkpoint else 0
+    writer = _open_writer(args.output, columns, checkpoint)
+    if rows_done:
+        print(f"Resuming after {rows_done} rows", file=sys.stderr)
+
+    workers = max(1, args.workers)
+    torch_threads = max(1, (os.cpu_count() or 1) // workers)
+    started = time.monotonic()
+    last_report = started
+    processed = 0
+
+    def finish(chunk, results):
+        nonlocal rows_done, processed, last_report
+        writer.write([{**row, **result} for row, result in zip(chunk, results)])
+        rows_done += len(chunk)
+        processed += len(chunk)
+        _save_checkpoint(checkpoint_path, {
+            "input": os.path.abspath(args.input),
+            "rows_done": rows_done,
+            "output_offset": writer.tell(),
+        })
+        now = time.monotonic()
+        if now - last_report >= args.progress_every:
+            last_report = now
+            rate = processed / (now - started)
+            print(f"{rows_done} rows done, {rate:.1f} rows/s", file=sys.stderr)
+
+    chunks = iter_chunks(iter_rows(args.input), args.chunk_size, skip=rows_done)
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(torch_threads,)) as pool:
+            # Keep a bounded window of chunks in flight and finish them in input
+            # order, so the checkpoint always covers a contiguous prefix.
+            in_flight = deque()
+            for chunk in chunks:
+                texts = [str(row.get(text_column) or "") for row in chunk]
+                in_flight.append((chunk, pool.submit(classify_chunk, texts, args.groq, args.batch_size)))
+                if len(in_flight) >= workers * 2:
+                    done_chunk, future = in_flight.popleft()
+                    finish(done_chunk, future.result())
+            while in_flight:
+                done_chunk, future = in_flight.popleft()
+                finish(done_chunk, future.result())
+    except KeyboardInterrupt:
+        print(f"Interrupted after {rows_done} rows; rerun with --resume to continue", file=sys.stderr)
+        raise SystemExit(130)
+    finally:
+        writer.close()
+
+    elapsed = time.monotonic() - started
+    rate = processed / elapsed if elapsed > 0 else 0.0
+    print(f"Done: {rows_done} rows ({processed} this run) in {elapsed:.1f}s, {rate:.1f} rows/s",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
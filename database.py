@@ -1,22 +1,33 @@
-import pyrebase
 from datetime import datetime
 import uuid
-import ssl
-from auth import config
-
-# SSL workaround for Firebase connections
-try:
-    _create_unverified_https_context = ssl._create_unverified_context
-except AttributeError:
-    pass
-else:
-    ssl._create_default_https_context = _create_unverified_https_context
-
-firebase = pyrebase.initialize_app(config)
-db = firebase.database()
-storage = firebase.storage()
-
-def create_post(user_id, content, image=None):
+from storage import get_storage
+from events import publish
+from versions import bump_feed, bump_comments
+import images
+
+storage = get_storage()
+
+def post_image_url(post, variant="feed"):
+    """URL of one size of a post's image (see images.py), falling back to the plain image_url."""
+    variants = post.get('image_variants') or {}
+    return variants.get(variant) or post.get('image_url')
+
+def _image_ready(post_id, urls):
+    # Called from the image pipeline once the variants are stored (urls is None on failure)
+    if urls:
+        fields = {"image_url": urls["full"], "image_variants": urls, "image_status": "ready"}
+    else:
+        fields = {"image_status": "failed"}
+    storage.update_post(post_id, fields)
+    bump_feed()
+    publish("post_image_ready", {
+        "postId": post_id,
+        "imageUrl": urls["feed"] if urls else None,
+        "imageVariants": urls
+    })
+
+def create_post(user_id, content, image=None, username=None):
+    """Create a post; `username` is the author's name for the post_created event (the caller has it already)"""
     post_id = str(uuid.uuid4())
     timestamp = datetime.now().isoformat()
     
@@ -29,23 +40,34 @@ def create_post(user_id, content, image=None):
     }
     
     if image is not None:
-        # Upload image to Firebase Storage
-        image_path = f"posts/{post_id}/{image.name}"
-        storage.child(image_path).put(image)
-        # Get image URL
-        image_url = storage.child(image_path).get_url(None)
-        post_data["image_url"] = image_url
+        # Resizing and uploading happen in the background; the post shows
+        # its image once image_status becomes "ready"
+        post_data["image_status"] = "processing"
     
-    db.child("posts").child(post_id).set(post_data)
+    storage.create_post(post_id, post_data)
+    bump_feed()
+    publish("post_created", {
+        "id": post_id,
+        "userId": user_id,
+        "userName": username or 'Unknown',
+        "content": content,
+        "imageUrl": post_data["image_url"],
+        "timestamp": timestamp,
+        "likes": [],
+        "commentCount": 0,
+        "isBullying": False,
+        "bullyingType": None
+    })
+    if image is not None:
+        images.submit(post_id, image, storage.upload_file, _image_ready)
     return post_id
 
 def get_all_posts():
-    posts = db.child("posts").get()
-    if posts.each():
-        return [{**post.val(), "id": post.key()} for post in posts.each()]
-    return []
+    return storage.get_all_posts()
 
-def create_comment(user_id, post_id, content, is_bullying=False, bullying_type=None):
+def create_comment(user_id, post_id, content, is_bullying=False, bullying_type=None, moderation_tier=None,
+                   username=None):
+    """Create a comment; `username` is the author's name for the comment_added event"""
     comment_id = str(uuid.uuid4())
     timestamp = datetime.now().isoformat()
     
@@ -56,69 +78,96 @@ def create_comment(user_id, post_id, content, is_bullying=False, bullying_type=N
         "is_bullying": is_bullying,
         "bullying_type": bullying_type
     }
+    if moderation_tier:
+        # Admission tier the verdict came from; remoderate.py --degraded re-checks keyword/local ones
+        comment_data["moderation_tier"] = moderation_tier
     
-    db.child("comments").child(post_id).child(comment_id).set(comment_data)
+    storage.create_comment(post_id, comment_id, comment_data)
+    bump_feed()
+    bump_comments(post_id)
+    publish("comment_added", {
+        "postId": post_id,
+        "comment": {
+            "id": comment_id,
+            "userId": user_id,
+            "userName": username or 'Unknown',
+            "content": content,
+            "timestamp": timestamp,
+            "isBullying": is_bullying,
+            "bullyingType": bullying_type
+        }
+    })
     return comment_id
 
 def get_post_comments(post_id):
-    comments = db.child("comments").child(post_id).get()
-    if comments.each():
-        return [{**comment.val(), "id": comment.key()} for comment in comments.each()]
-    return []
+    return storage.get_post_comments(post_id)
+
+def count_post_comments(post_id):
+    """Number of comments on a post, without loading the comments where the backend allows it"""
+    return storage.count_comments(post_id)
+
+def update_comment_classification(post_id, comment_id, is_bullying, bullying_type):
+    """Store a new moderation verdict for an existing comment"""
+    update_comment_classifications([(post_id, comment_id, is_bullying, bullying_type)])
+
+def update_comment_classifications(changes):
+    """Store new verdicts for several comments in one write; changes are (post_id, comment_id, is_bullying, bullying_type)"""
+    storage.update_comments([
+        (post_id, comment_id, {"is_bullying": is_bullying, "bullying_type": bullying_type})
+        for post_id, comment_id, is_bullying, bullying_type in changes
+    ])
+    for post_id in {change[0] for change in changes}:
+        bump_comments(post_id)
+    for post_id, comment_id, is_bullying, bullying_type in changes:
+        publish("comment_reclassified", {
+            "postId": post_id,
+            "commentId": comment_id,
+            "isBullying": is_bullying,
+            "bullyingType": bullying_type
+        })
+
+def set_comment_tiers(comments, moderation_tier):
+    """Record the pipeline tier that last checked each (post_id, comment_id); the verdicts are unchanged"""
+    storage.update_comments([
+        (post_id, comment_id, {"moderation_tier": moderation_tier})
+        for post_id, comment_id in comments
+    ])
+
+def scan_comments(after=None, limit=500):
+    """Page through every comment in (post_id, id) order; see Storage.scan_comments"""
+    return storage.scan_comments(after, limit)
 
 def delete_comment(post_id, comment_id):
     """Delete a comment from a post"""
-    db.child("comments").child(post_id).child(comment_id).remove()
+    storage.delete_comment(post_id, comment_id)
+    bump_feed()
+    bump_comments(post_id)
+    publish("comment_deleted", {"postId": post_id, "commentId": comment_id})
     return True
 
 def search_users(query):
     """Search for users by username or email"""
-    query = query.lower()
-    users = db.child("users").get()
     results = []
+    for user_data in storage.search_users(query, limit=10):
+        results.append({
+            "uid": user_data.get('uid'),
+            "email": user_data.get('email'),
+            "displayName": user_data.get('username'),
+            "reputation": user_data.get('reputation_score', 100)
+        })
     
-    if users.each():
-        for user in users.each():
-            user_data = user.val()
-            username = user_data.get('username', '').lower()
-            email = user_data.get('email', '').lower()
-            
-            if query in username or query in email:
-                results.append({
-                    "uid": user.key(),
-                    "email": user_data.get('email'),
-                    "displayName": user_data.get('username'),
-                    "reputation": user_data.get('reputation_score', 100)
-                })
-    
-    return results[:10]  # Limit to 10 results
+    return results  # Limited to 10 results by the backend
 
 
 def toggle_like(post_id, user_id):
     """Toggle like on a post. Returns the updated likes array."""
-    post = db.child("posts").child(post_id).get()
-    if not post.val():
-        return None
-    
-    post_data = post.val()
-    likes = post_data.get('likes', [])
-    
-    # Handle legacy int format
-    if isinstance(likes, int):
-        likes = []
-    
-    if user_id in likes:
-        likes.remove(user_id)
-    else:
-        likes.append(user_id)
-    
-    db.child("posts").child(post_id).update({"likes": likes})
+    likes = storage.toggle_like(post_id, user_id)
+    if likes is not None:
+        bump_feed()
+        publish("likes_changed", {"postId": post_id, "likes": likes})
     return likes
 
 
 def get_post(post_id):
     """Get a single post by ID"""
-    post = db.child("posts").child(post_id).get()
-    if post.val():
-        return {**post.val(), "id": post_id}
-    return None
\ No newline at end of file
+    return storage.get_post(post_id)
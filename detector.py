@@ -1,17 +1,41 @@
 import re
 import os
 import ssl
+import json
+import mmap
+import time
+import struct
+import threading
+import contextlib
 import nltk
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
+from metrics import STAGE_LATENCY, BATCH_SIZE, FINAL_LABELS
+from logging_config import get_logger, text_fields, classification_sampler
+from normalize import NormalizedText, fold, normalize, skeleton
+from flood import flood_index
+
+logger = get_logger(__name__)
 
 # Import API client function
 try:
-    from api_client import classify_with_api
+    from api_client import classify_with_api, combine_labels, needs_remote_check, submit_shadow_check
 except ImportError:
     # Fallback if api_client is not available
     def classify_with_api(text: str) -> Optional[str]:
         return None
 
+    def needs_remote_check(local_label, confidence, keyword_label=None):
+        return False, False
+
+    def submit_shadow_check(text, local_label):
+        return None
+
+    def combine_labels(local_label, keyword_label, keyword_explanation, api_label, api_explanation,
+                       groq_called=True):
+        if keyword_label and keyword_label != "Not Cyberbullying":
+            return keyword_label, keyword_explanation
+        return local_label or "Not Cyberbullying", None
+
 # Simple keyword-based fallback classifier (duplicated to avoid circular imports)
 BULLYING_KEYWORDS = {
     "Ethnicity/Race": [
@@ -35,13 +59,18 @@ BULLYING_KEYWORDS = {
     ]
 }
 
-def _keyword_fallback_classifier(text):
+_FOLDED_KEYWORDS = [
+    (category, skeleton(fold(keyword)))
+    for category, keywords in BULLYING_KEYWORDS.items()
+    for keyword in keywords
+]
+
+def _keyword_fallback_classifier(text, normalized: Optional[NormalizedText] = None):
     """Simple keyword-based classifier as fallback."""
-    text_lower = text.lower()
-    for category, keywords in BULLYING_KEYWORDS.items():
-        for keyword in keywords:
-            if keyword.lower() in text_lower:
-                return category, f"Contains potentially harmful keyword"
+    norm = normalized or normalize(text)
+    for category, keyword in _FOLDED_KEYWORDS:
+        if keyword in norm.skeleton or keyword in norm.deobfuscated:
+            return category, f"Contains potentially harmful keyword"
     return "Not Cyberbullying", "No harmful content detected"
 
 # Try to import torch and transformers - they may fail due to version issues
@@ -50,7 +79,7 @@ try:
     from transformers import AutoModelForSequenceClassification, AutoTokenizer
     TORCH_AVAILABLE = True
 except ImportError as e:
-    print(f"PyTorch/Transformers not available: {e}")
+    logger.warning("PyTorch/Transformers not available", extra={"fields": {"error": str(e)}})
     TORCH_AVAILABLE = False
 
 # SSL workaround for NLTK downloads
@@ -67,7 +96,7 @@ try:
     nltk.download('punkt', quiet=True)
     nltk.download('punkt_tab', quiet=True)  # Additional required package
 except Exception as e:
-    print(f"NLTK download warning: {e}")
+    logger.warning("NLTK download failed", extra={"fields": {"error": str(e)}})
     # Will use fallback if needed
 
 # Alternative: Use a try-except block for the NLTK resources
@@ -90,92 +119,553 @@ except:
 MODEL_PATH = "boss2805/cyberbully"
 TOKENIZER_NAME = "distilbert-base-uncased"  # The base tokenizer for your model
 
+# Local snapshot written by snapshot_model.py. When it exists the model is
+# loaded from it offline, with memory-mapped weights, instead of from the Hub.
+MODEL_SNAPSHOT_DIR = os.getenv("MODEL_SNAPSHOT_DIR", os.path.join("models", "cyberbully"))
+SNAPSHOT_MANIFEST = "snapshot.json"
+# Model swaps through the admin API only load snapshot directories inside this folder
+MODEL_SNAPSHOT_ROOT = os.getenv("MODEL_SNAPSHOT_ROOT", os.path.dirname(MODEL_SNAPSHOT_DIR) or ".")
+
 # Define the class labels (from your confusion matrix)
 CLASS_LABELS = ['Ethnicity/Race', 'Gender/Sexual', 'Not Cyberbullying', 'Religion']
 
+# Temperature used to calibrate the local model's softmax. `evaluate.py` fits it
+# on a labeled held-out split and prints the value to set; 1.0 keeps the raw
+# (uncalibrated) probabilities.
+LOCAL_MODEL_TEMPERATURE = float(os.getenv("LOCAL_MODEL_TEMPERATURE", "1.0"))
+
+# Optional local inference daemon (see inference_daemon.py). When it is set,
+# this process does not load its own model copy unless the daemon is unreachable.
+INFERENCE_SOCKET = os.getenv("INFERENCE_SOCKET")
+INFERENCE_RETRY_SECONDS = 5.0
+
 # Load model and tokenizer only if torch is available
+class ModelHandle:
+    """One loaded model version.
+
+    Handles are never changed after loading: a batch takes the active handle
+    once and finishes on it even if another version is swapped in meanwhile.
+    """
+
+    def __init__(self, version: str, model, tokenizer, device, mappings=()):
+        self.version = version
+        self.model = model
+        self.tokenizer = tokenizer
+        self.device = device
+        self.mappings = list(mappings)  # mmaps backing the weights of a snapshot
+        self.loaded_at = time.time()
+
+
+# The active model; `model`, `tokenizer` and `device` mirror it for callers
+# that read them directly
 model = None
 tokenizer = None
 device = None
+_active: Optional[ModelHandle] = None
+_previous: Optional[ModelHandle] = None  # kept for rollback
+_swap_lock = threading.Lock()
+
+_model_lock = threading.Lock()
+_model_load_attempted = False
+_inference_client = None
+_inference_down_until = 0.0
+
+# Texts with known labels that a new model version has to classify well
+# enough before it replaces the active one. MODEL_CANARY_PATH can point to a
+# JSONL file of {"text": ..., "label": ...} rows to use instead.
+CANARY_SET = [
+    ("Go back to your country, nobody wants your kind here", "Ethnicity/Race"),
+    ("People of your race are all criminals and should be deported", "Ethnicity/Race"),
+    ("Women belong in the kitchen, stop pretending you can play", "Gender/Sexual"),
+    ("You throw like a girl, man up you sissy", "Gender/Sexual"),
+    ("All people of your religion are terrorists", "Religion"),
+    ("Your religion is a cult for brainwashed idiots", "Religion"),
+    ("Congratulations on your graduation, so proud of you!", "Not Cyberbullying"),
+    ("Had a lovely afternoon at the beach with the family", "Not Cyberbullying"),
+]
+MODEL_CANARY_PATH = os.getenv("MODEL_CANARY_PATH")
+MODEL_CANARY_MIN_ACCURACY = float(os.getenv("MODEL_CANARY_MIN_ACCURACY", "0.75"))
+
+
+def _is_snapshot(path: str) -> bool:
+    return os.path.isfile(os.path.join(path, SNAPSHOT_MANIFEST))
+
+
+def _mmap_safetensors(path: str):
+    """Map a .safetensors file and return (tensors, mapping); the tensors use the file's pages directly."""
+    dtypes = {
+        "F64": torch.float64, "F32": torch.float32, "F16": torch.float16, "BF16": torch.bfloat16,
+        "I64": torch.int64, "I32": torch.int32, "I16": torch.int16, "I8": torch.int8,
+        "U8": torch.uint8, "BOOL": torch.bool,
+    }
+    with open(path, "rb") as f:
+        header_size = int.from_bytes(f.read(8), "little")
+        header = json.loads(f.read(header_size))
+        # Copy-on-write mapping: pages stay shared in the page cache (and
+        # between processes) because nothing writes to inference weights
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    header.pop("__metadata__", None)
+
+    tensors = {}
+    for name, info in header.items():
+        dtype = dtypes[info["dtype"]]
+        start, end = info["data_offsets"]
+        if end == start:
+            tensors[name] = torch.empty(info["shape"], dtype=dtype)
+            continue
+        count = (end - start) // torch.empty(0, dtype=dtype).element_size()
+        tensors[name] = torch.frombuffer(mapping, dtype=dtype, count=count,
+                                         offset=8 + header_size + start).reshape(info["shape"])
+    return tensors, mapping
+
+
+@contextlib.contextmanager
+def _skip_weight_init():
+    """Build modules without filling their weights; every weight is replaced right after."""
+    names = ["uniform_", "normal_", "trunc_normal_", "constant_", "zeros_", "ones_",
+             "kaiming_uniform_", "kaiming_normal_", "xavier_uniform_", "xavier_normal_"]
+    saved = {name: getattr(torch.nn.init, name) for name in names}
+    for name in names:
+        setattr(torch.nn.init, name, lambda tensor, *args, **kwargs: tensor)
+    try:
+        from transformers.modeling_utils import no_init_weights
+    except ImportError:
+        no_init_weights = contextlib.nullcontext
+    try:
+        with no_init_weights():
+            yield
+    finally:
+        for name, function in saved.items():
+            setattr(torch.nn.init, name, function)
+
+
+def _load_snapshot(directory: str) -> ModelHandle:
+    """Load a snapshot directory offline, with the weights memory-mapped."""
+    from transformers import AutoConfig
+    with open(os.path.join(directory, SNAPSHOT_MANIFEST)) as f:
+        manifest = json.load(f)
+    config = AutoConfig.from_pretrained(directory, local_files_only=True)
+    with _skip_weight_init():
+        loaded = AutoModelForSequenceClassification.from_config(config)
+
+    index_path = os.path.join(directory, "model.safetensors.index.json")
+    if os.path.exists(index_path):
+        with open(index_path) as f:
+            files = sorted(set(json.load(f)["weight_map"].values()))
+    else:
+        files = ["model.safetensors"]
+    state, mappings = {}, []
+    for name in files:
+        tensors, mapping = _mmap_safetensors(os.path.join(directory, name))
+        state.update(tensors)
+        mappings.append(mapping)
+
+    # assign=True makes the parameters the mapped tensors instead of copying into them
+    missing, unexpected = loaded.load_state_dict(state, strict=False, assign=True)
+    loaded.tie_weights()
+    tied = getattr(loaded, "_tied_weights_keys", None) or []
+    missing = [key for key in missing if not any(re.search(pattern, key) for pattern in tied)]
+    if missing or unexpected:
+        raise ValueError(f"Snapshot does not match the model: missing {missing}, unexpected {unexpected}")
 
-if TORCH_AVAILABLE:
+    loaded_tokenizer = AutoTokenizer.from_pretrained(directory, local_files_only=True)
+    loaded.eval()
+    loaded_device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    loaded.to(loaded_device)
+    version = f"{manifest['model']}@{str(manifest['revision'])[:12]}"
+    return ModelHandle(version, loaded, loaded_tokenizer, loaded_device, mappings)
+
+
+def _load_handle(model_path: str) -> ModelHandle:
+    """Load a model version into memory without activating it.
+
+    `model_path` is a snapshot directory (see snapshot_model.py) or a Hub id.
+    """
+    if _is_snapshot(model_path):
+        return _load_snapshot(model_path)
+
+    loaded = AutoModelForSequenceClassification.from_pretrained(
+        model_path,
+        local_files_only=False,
+        trust_remote_code=False
+    )
+    loaded_tokenizer = AutoTokenizer.from_pretrained(TOKENIZER_NAME)
+    loaded.eval()  # Set model to evaluation mode
+    loaded_device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    loaded.to(loaded_device)
+    commit = getattr(loaded.config, "_commit_hash", None)
+    version = f"{model_path}@{commit[:12]}" if commit else model_path
+    return ModelHandle(version, loaded, loaded_tokenizer, loaded_device)
+
+
+def _activate(handle: ModelHandle):
+    global model, tokenizer, device, _active, _previous
+    with _swap_lock:
+        _previous, _active = _active, handle
+        model, tokenizer, device = handle.model, handle.tokenizer, handle.device
+
+
+def _load_model():
+    """Load the model and tokenizer into this process."""
+    global _model_load_attempted
+    _model_load_attempted = True
     try:
-        # Disable SSL verification for HuggingFace downloads
-        import os as _os
-        _os.environ['CURL_CA_BUNDLE'] = ''
-        _os.environ['REQUESTS_CA_BUNDLE'] = ''
-        
-        model = AutoModelForSequenceClassification.from_pretrained(
-            MODEL_PATH,
-            local_files_only=False,
-            trust_remote_code=True
-        )
-        tokenizer = AutoTokenizer.from_pretrained(TOKENIZER_NAME)
-        model.eval()  # Set model to evaluation mode
-        device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-        model.to(device)
-        print("Model loaded successfully")
+        if _is_snapshot(MODEL_SNAPSHOT_DIR):
+            handle = _load_handle(MODEL_SNAPSHOT_DIR)
+        else:
+            logger.warning("No model snapshot, loading from the Hugging Face Hub", extra={"fields": {
+                "model": MODEL_PATH, "snapshot_dir": MODEL_SNAPSHOT_DIR}})
+            handle = _load_handle(MODEL_PATH)
+        _activate(handle)
+        logger.info("Model loaded successfully", extra={"fields": {
+            "device": str(handle.device), "version": handle.version}})
     except Exception as e:
-        print(f"Error loading model: {e}")
-        model = None
-        tokenizer = None
+        logger.error("Error loading model", extra={"fields": {"error": str(e)}})
+
+
+if TORCH_AVAILABLE and not INFERENCE_SOCKET:
+    _load_model()
+
+_NON_LETTERS = re.compile(r'[^a-z\s]')
 
 def preprocess_text(text):
-    """Clean and preprocess text for model input."""
-    text = text.lower()
-    text = re.sub(r'[^a-zA-Z\s]', '', text)
-    text = re.sub(r'\s+', ' ', text).strip()
-    text = ' '.join([word for word in text.split() if word not in STOPWORDS])
-    return text
+    """Letters-only, stopword-free form of the normalized text (for analysis, not model input)."""
+    text = _NON_LETTERS.sub('', normalize(text).deobfuscated)
+    return ' '.join([word for word in text.split() if word not in STOPWORDS])
 
-def _predict_local_label(text: str) -> str:
-    """Return the local model's predicted label (string)."""
-    if not TORCH_AVAILABLE or model is None or tokenizer is None:
-        # Use keyword fallback when model is not available
-        label, _ = _keyword_fallback_classifier(text)
-        return label
+def _predict_via_daemon(texts: List[str]) -> Optional[List[Dict[str, float]]]:
+    """
+    Ask the inference daemon for probabilities; None if it is unavailable.
+
+    An error reply fails only this request (empty dicts, like having no
+    model): the daemon is up, so it is neither marked down nor replaced by a
+    local model load.
+    """
+    global _inference_client, _inference_down_until
+    if time.monotonic() < _inference_down_until:
+        return None
+    from inference_daemon import InferenceClient, InferenceError
+    try:
+        if _inference_client is None:
+            _inference_client = InferenceClient(INFERENCE_SOCKET)
+        rows = _inference_client.predict(texts)
+    except InferenceError as e:
+        logger.warning("Inference daemon could not classify the request",
+                       extra={"fields": {"socket": INFERENCE_SOCKET, "error": str(e), "texts": len(texts)}})
+        return [{} for _ in texts]
+    except (OSError, ValueError, struct.error) as e:
+        logger.warning("Inference daemon unavailable, using in-process model",
+                       extra={"fields": {"socket": INFERENCE_SOCKET, "error": str(e)}})
+        _inference_down_until = time.monotonic() + INFERENCE_RETRY_SECONDS
+        return None
+    return [dict(zip(CLASS_LABELS, row)) for row in rows]
+
+
+def _predict_local_probs_batch(texts: List[str]) -> List[Dict[str, float]]:
+    """Return calibrated per-class probabilities for a batch of texts.
+
+    Texts are normalized (see normalize.py) before they reach the model.
+    Uses the inference daemon when `INFERENCE_SOCKET` is configured and falls
+    back to the in-process model otherwise. Logits are divided by
+    `LOCAL_MODEL_TEMPERATURE` before the softmax. Each entry is an empty dict
+    when no model is available.
+    """
+    return _predict_folded_batch([normalize(text).folded for text in texts])
+
+
+def _predict_folded_batch(texts: List[str]) -> List[Dict[str, float]]:
+    """`_predict_local_probs_batch` for texts that are already folded."""
+    if not texts:
+        return []
+
+    if INFERENCE_SOCKET:
+        results = _predict_via_daemon(texts)
+        if results is not None:
+            return results
+        if TORCH_AVAILABLE and not _model_load_attempted:
+            with _model_lock:
+                if not _model_load_attempted:
+                    _load_model()
+
+    handle = _active
+    if not TORCH_AVAILABLE or handle is None:
+        return [{} for _ in texts]
 
+    BATCH_SIZE.observe(len(texts), "local_model")
+    with STAGE_LATENCY.time("local_model"):
+        return _run_model(handle, texts)
+
+
+def _run_model(handle: ModelHandle, texts: List[str]) -> List[Dict[str, float]]:
     import torch
-    inputs = tokenizer(text, return_tensors="pt", truncation=True, padding=True).to(device)
+    inputs = handle.tokenizer(texts, return_tensors="pt", truncation=True, padding=True).to(handle.device)
     with torch.no_grad():
-        outputs = model(**inputs)
-        predictions = torch.nn.functional.softmax(outputs.logits, dim=-1)
-        predicted_class_id = torch.argmax(predictions, dim=-1).item()
+        outputs = handle.model(**inputs)
+        logits = outputs.logits / LOCAL_MODEL_TEMPERATURE
+        probs = torch.nn.functional.softmax(logits, dim=-1).tolist()
+    return [dict(zip(CLASS_LABELS, row)) for row in probs]
+
+
+# ============================================
+# Model versions (hot swap and rollback)
+# ============================================
+
+def model_version() -> Optional[str]:
+    """Version of the model this process classifies with, or None when it has none."""
+    handle = _active
+    return handle.version if handle is not None else None
+
+
+def model_status() -> dict:
+    active, previous = _active, _previous
+    return {
+        "active": active.version if active else None,
+        "active_since": active.loaded_at if active else None,
+        "previous": previous.version if previous else None,
+    }
+
+
+def _load_canary() -> List[Tuple[str, str]]:
+    if not MODEL_CANARY_PATH:
+        return CANARY_SET
+    import json
+    with open(MODEL_CANARY_PATH, encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    return [(row["text"], row["label"]) for row in rows]
+
+
+def validate_model(handle: ModelHandle, min_accuracy: Optional[float] = None) -> dict:
+    """Run the canary set through a loaded model; `passed` says whether it may be activated."""
+    min_accuracy = MODEL_CANARY_MIN_ACCURACY if min_accuracy is None else min_accuracy
+    canary = _load_canary()
+    folded = [normalize(text).folded for text, _ in canary]
+    start = time.perf_counter()
+    probs = _run_model(handle, folded)
+    latency = time.perf_counter() - start
+
+    current = _active
+    current_probs = _run_model(current, folded) if current is not None else None
+    failures, correct, agree = [], 0, 0
+    for index, ((text, expected), row) in enumerate(zip(canary, probs)):
+        label = max(row, key=row.get)
+        if label == expected:
+            correct += 1
+        else:
+            failures.append({"text": text, "expected": expected, "got": label})
+        if current_probs is not None and label == max(current_probs[index], key=current_probs[index].get):
+            agree += 1
+
+    accuracy = correct / len(canary) if canary else 0.0
+    return {
+        "version": handle.version,
+        "canary_size": len(canary),
+        "accuracy": accuracy,
+        "min_accuracy": min_accuracy,
+        "agreement_with_active": agree / len(canary) if current_probs is not None and canary else None,
+        "latency_ms": latency * 1000,
+        "failures": failures,
+        "passed": bool(canary) and accuracy >= min_accuracy,
+    }
+
+
+def _swap_snapshot_dir(model_path: str) -> str:
+    """Resolve a swap target to a snapshot directory inside MODEL_SNAPSHOT_ROOT, or raise ValueError."""
+    root = os.path.realpath(MODEL_SNAPSHOT_ROOT)
+    path = os.path.realpath(os.path.join(root, model_path))
+    if os.path.commonpath([root, path]) != root or not _is_snapshot(path):
+        raise ValueError(f"{model_path} is not a model snapshot inside {MODEL_SNAPSHOT_ROOT}")
+    return path
+
+
+def swap_model(model_path: str, min_accuracy: Optional[float] = None) -> dict:
+    """
+    Load another model version, check it against the canary set and make it
+    the active one if it passes. Classification keeps running on the current
+    version the whole time; the version it replaces is kept for rollback_model().
+    Blocks while loading, so call it from a background thread.
+
+    `model_path` must be a snapshot directory (see snapshot_model.py) inside
+    MODEL_SNAPSHOT_ROOT; snapshots load offline and never run code from the
+    model repository.
+    """
+    if not TORCH_AVAILABLE:
+        return {"version": None, "passed": False, "error": "torch is not installed"}
+    if INFERENCE_SOCKET:
+        return {"version": None, "passed": False,
+                "error": "this process uses the inference daemon; restart the daemon to change models"}
+    try:
+        handle = _load_snapshot(_swap_snapshot_dir(model_path))
+    except Exception as e:
+        logger.error("Could not load model version", extra={"fields": {"model_path": model_path, "error": str(e)}})
+        return {"version": None, "passed": False, "error": str(e)}
+
+    report = validate_model(handle, min_accuracy)
+    if report["passed"]:
+        _activate(handle)
+        logger.info("Model version activated", extra={"fields": {
+            "version": handle.version, "accuracy": report["accuracy"]}})
+    else:
+        logger.warning("Model version rejected by canary", extra={"fields": {
+            "version": handle.version, "accuracy": report["accuracy"]}})
+    return report
+
+
+def rollback_model() -> Optional[str]:
+    """Swap back to the previous model version; returns the now active version, or None if there is none."""
+    global model, tokenizer, device, _active, _previous
+    with _swap_lock:
+        if _previous is None:
+            return None
+        _active, _previous = _previous, _active
+        model, tokenizer, device = _active.model, _active.tokenizer, _active.device
+        version = _active.version
+    logger.info("Model rolled back", extra={"fields": {"version": version}})
+    return version
+
+
+def _predict_local_probs(text: str, normalized: Optional[NormalizedText] = None) -> Dict[str, float]:
+    """Return calibrated per-class probabilities for a single text.
+
+    Returns an empty dict when the model is not available.
+    """
+    norm = normalized or normalize(text)
+    return _predict_folded_batch([norm.folded])[0]
 
-    return CLASS_LABELS[predicted_class_id]
 
+def _predict_local_with_confidence(text: str, normalized: Optional[NormalizedText] = None):
+    """Return (label, confidence) from the local model.
 
-def detect_cyberbullying(text: str):
+    Confidence is the calibrated probability of the predicted label, or None
+    when the keyword fallback had to stand in for the model.
+    """
+    norm = normalized or normalize(text)
+    probs = _predict_local_probs(text, norm)
+    if not probs:
+        # Use keyword fallback when model is not available
+        label, _ = _keyword_fallback_classifier(text, norm)
+        return label, None
+
+    label = max(probs, key=probs.get)
+    return label, probs[label]
+
+
+def _predict_local_label(text: str) -> str:
+    """Return the local model's predicted label (string)."""
+    label, _ = _predict_local_with_confidence(text)
+    return label
+
+
+def _gated_label(text: str, local_label: str, confidence: Optional[float], keyword_label: str,
+                 keyword_explanation: str, use_remote: bool, shadow: bool = False) -> Tuple[str, Optional[str]]:
+    """Apply the confidence gate to a local verdict; returns (final label, remote API label)."""
+    call_remote, sample_shadow = needs_remote_check(local_label, confidence, keyword_label)
+    if shadow and sample_shadow and use_remote:
+        submit_shadow_check(text, local_label)
+
+    # Try remote API classifier; it should return a category string or None
+    api_label = classify_with_api(text) if call_remote and use_remote else None
+
+    if call_remote and not use_remote:
+        final_label, _ = combine_labels(local_label, keyword_label, keyword_explanation,
+                                        None, None, groq_called=False)
+    else:
+        final_label = api_label if api_label is not None else local_label
+    return final_label, api_label
+
+
+def detect_cyberbullying(text: str, post_id: Optional[str] = None, use_remote: bool = True):
     """Detect cyberbullying by combining local model and external API.
 
     Flow:
-    - Run the local Hugging Face model to get an initial label.
-    - If a remote API is configured (env `CLASSIFIER_API_URL`), call it with the text.
+    - Run the local Hugging Face model to get an initial label and confidence.
+    - If the local model is not confident enough for that label (see
+      `needs_remote_check`), call the remote API with the text.
       If the API responds with a category, use that category as the final label.
-    - If the API is not configured or fails, fall back to the local model label.
+    - If the API is skipped, not configured or fails, fall back to the local model label.
+
+    Near-duplicates of a recently flagged comment (and exact repeats of a
+    benign one the keyword stage does not flag) reuse its label without
+    running the model or the remote API (see flood.py); pass `post_id` so
+    raids are reported per post.
+
+    With `use_remote=False` (the API's degraded "local" tier) a text the gate
+    would send to the remote API gets the keyword label when that flags
+    bullying, otherwise the local model label.
 
     Returns (is_bullying: bool, bullying_type: Optional[str]) preserving the
     original function signature used by `app.py`.
     """
+    norm = normalize(text)
+    keyword_label, keyword_explanation = _keyword_fallback_classifier(text, norm)
+    signature = flood_index.signature(norm)
+    flood_label = flood_index.lookup(signature, norm, post_id,
+                                     keyword_flagged=keyword_label != "Not Cyberbullying")
+    if flood_label is not None:
+        FINAL_LABELS.inc(flood_label)
+        is_bullying = flood_label != "Not Cyberbullying"
+        return is_bullying, flood_label.lower() if is_bullying else None
+
     try:
-        local_label = _predict_local_label(text)
+        local_label, confidence = _predict_local_with_confidence(text, norm)
     except Exception as e:
-        print(f"Local prediction failed: {e}")
-        local_label = "Not Cyberbullying"
+        logger.warning("Local prediction failed", extra={"fields": {"error": str(e)}})
+        local_label, confidence = "Not Cyberbullying", None
 
-    # Try remote API classifier; it should return a category string or None
-    api_label = classify_with_api(text)
-
-    final_label = api_label if api_label is not None else local_label
+    final_label, api_label = _gated_label(text, local_label, confidence, keyword_label,
+                                          keyword_explanation, use_remote, shadow=True)
+    flood_index.add(signature, norm, final_label, post_id)
 
     is_bullying = (final_label != "Not Cyberbullying")
+    FINAL_LABELS.inc(final_label)
     bullying_type = final_label.lower() if is_bullying else None
 
-    print(f"Text: '{text}'")
-    print(f"Local label: {local_label}; API label: {api_label}; Final: {final_label}")
+    if classification_sampler():
+        fields = text_fields(text)
+        fields.update(local=local_label, confidence=confidence, api=api_label, final=final_label)
+        logger.info("classification", extra={"fields": fields})
 
     return is_bullying, bullying_type
 
+
+def detect_cyberbullying_batch(texts: List[str], use_remote: bool = True,
+                               require_model: bool = False) -> List[Tuple[bool, Optional[str]]]:
+    """`detect_cyberbullying` for many texts at once, for re-scoring stored comments.
+
+    The local model sees the whole list in one batch; the confidence gate and
+    remote API are then applied per text exactly as in `detect_cyberbullying`
+    (with `use_remote=False`, gated texts get the keyword/local combination of
+    the degraded tier). The flood index is neither consulted nor updated, so
+    every text gets a fresh verdict.
+
+    With `require_model` set, raises RuntimeError instead of falling back to
+    keyword-only verdicts when the local model gives no probabilities.
+    """
+    norms = [normalize(text) for text in texts]
+    try:
+        batch_probs = _predict_folded_batch([norm.folded for norm in norms])
+    except Exception as e:
+        if require_model:
+            raise RuntimeError(f"Local batch prediction failed: {e}") from e
+        logger.warning("Local batch prediction failed", extra={"fields": {"error": str(e)}})
+        batch_probs = [{} for _ in texts]
+    if require_model and not all(batch_probs):
+        raise RuntimeError("Local model returned no probabilities")
+
+    results = []
+    for text, norm, probs in zip(texts, norms, batch_probs):
+        keyword_label, keyword_explanation = _keyword_fallback_classifier(text, norm)
+        if probs:
+            local_label = max(probs, key=probs.get)
+            confidence = probs[local_label]
+        else:
+            local_label, confidence = keyword_label, None
+
+        final_label, _ = _gated_label(text, local_label, confidence, keyword_label,
+                                      keyword_explanation, use_remote)
+        is_bullying = final_label != "Not Cyberbullying"
+        results.append((is_bullying, final_label.lower() if is_bullying else None))
+    return results
+
 # Test the detector directly if run as standalone script
 if __name__ == "__main__":
     test_texts = [
@@ -0,0 +1,465 @@
+#!/usr/bin/env python3
+"""
+Accuracy-versus-cost evaluation of the classifier tiers.
+
+Runs a labeled CSV/JSONL dataset through every tier the service can answer
+with and reports per-class precision and recall next to latency, throughput,
+the share of texts sent to Groq and the estimated Groq cost:
+
+    keyword                 keyword classifier only (the API's "keyword" tier)
+    local                   local model label only
+    local+keyword[t]        local model, keywords where the gate at confidence
+                            threshold t would call Groq (the API's "local" tier)
+    groq                    Groq for every text
+    cascade[t]              the comment pipeline (detector.detect_cyberbullying):
+                            the local label, or Groq's where the gate at
+                            threshold t calls it
+
+Groq answers are replayed from a fixture, so runs are free, fast and
+repeatable. --record-groq calls the real API (GROQ_API_KEY) once per text
+missing from the fixture and appends its category, token counts and latency.
+Fixture entries are keyed by a hash of the text, not the text itself.
+
+Dataset labels are mapped onto the app's categories (e.g. the tweets dataset's
+"ethnicity" becomes "Ethnicity/Race", "age" and "other_cyberbullying" become
+"Other"); rows with unknown labels are skipped and counted.
+
+Local-model latency is the batch time divided by the batch size. Cascade
+latency adds the recorded Groq latency for the texts that would call it.
+
+The report also fits the local model's softmax temperature (minimum
+negative log-likelihood over the texts whose label the model knows) and
+prints the LOCAL_MODEL_TEMPERATURE to set, with the expected calibration
+error before and after. Fit it on a held-out split, not the training data.
+
+Usage:
+    python evaluate.py cyberbullying_tweets.csv --limit 2000 --record-groq groq-fixture.jsonl
+    python evaluate.py cyberbullying_tweets.csv --limit 2000 --groq-fixture groq-fixture.jsonl -o eval.json
+    python evaluate.py labeled.jsonl --thresholds 0.8,0.9,0.95,0.99
+"""
+
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import math
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from bulk_classify import iter_rows, _pick_text_column
+
+LABEL_COLUMN_CANDIDATES = ("label", "cyberbullying_type", "category")
+
+CATEGORIES = ["Not Cyberbullying", "Ethnicity/Race", "Gender/Sexual", "Religion", "Other"]
+
+# Dataset labels (lowercased) -> app categories
+LABEL_ALIASES = {
+    "not_cyberbullying": "Not Cyberbullying",
+    "not cyberbullying": "Not Cyberbullying",
+    "ethnicity": "Ethnicity/Race",
+    "ethnicity/race": "Ethnicity/Race",
+    "race": "Ethnicity/Race",
+    "gender": "Gender/Sexual",
+    "gender/sexual": "Gender/Sexual",
+    "religion": "Religion",
+    "age": "Other",
+    "other_cyberbullying": "Other",
+    "other": "Other",
+}
+
+# USD per million tokens (Groq list price for llama-3.3-70b-versatile)
+DEFAULT_PRICE_INPUT = 0.59
+DEFAULT_PRICE_OUTPUT = 0.79
+
+
+def canonical_label(value) -> Optional[str]:
+    if value is None:
+        return None
+    return LABEL_ALIASES.get(str(value).strip().lower())
+
+
+def text_key(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:24]
+
+
+# ============================================
+# Dataset and Groq fixture
+# ============================================
+
+def load_dataset(path: str, text_column: Optional[str], label_column: Optional[str],
+                 limit: int, seed: int):
+    """Return (texts, labels, skipped rows by reason); a random sample of `limit` rows when set."""
+    first_row = next(iter_rows(path), None)
+    if first_row is None:
+        raise SystemExit("Input is empty")
+    text_column = _pick_text_column(first_row, text_column)
+    if label_column is None:
+        label_column = next((c for c in LABEL_COLUMN_CANDIDATES if c in first_row), None)
+    if label_column not in first_row:
+        raise SystemExit(f"Could not find a label column (columns: {', '.join(first_row)}); use --label-column")
+
+    rows, skipped = [], defaultdict(int)
+    for row in iter_rows(path):
+        text = str(row.get(text_column) or "").strip()
+        label = canonical_label(row.get(label_column))
+        if not text:
+            skipped["empty_text"] += 1
+        elif label is None:
+            skipped[f"unknown_label:{row.get(label_column)}"] += 1
+        else:
+            rows.append((text, label))
+    if limit and len(rows) > limit:
+        rows = random.Random(seed).sample(rows, limit)
+    return [text for text, _ in rows], [label for _, label in rows], dict(skipped)
+
+
+def load_fixture(path: Optional[str]) -> Dict[str, dict]:
+    fixture = {}
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    fixture[entry["key"]] = entry
+    return fixture
+
+
+def record_fixture(texts: List[str], path: str, fixture: Dict[str, dict]) -> int:
+    """Call Groq for texts missing from the fixture and append them; returns the number of failures."""
+    import api_client
+    if not os.getenv("GROQ_API_KEY"):
+        raise SystemExit("--record-groq needs GROQ_API_KEY")
+    # Whole replies, so every call reports its token usage
+    api_client.GROQ_STREAM = "off"
+
+    failures = 0
+    missing = [text for text in dict.fromkeys(texts) if text_key(text) not in fixture]
+    print(f"Recording {len(missing)} Groq answers to {path}", file=sys.stderr)
+    with open(path, "a", encoding="utf-8") as f:
+        for index, text in enumerate(missing, 1):
+            before = api_client.get_groq_usage()
+            start = time.perf_counter()
+            category, _ = api_client.classify_with_groq(text, explanation=False, fallback=False)
+            latency = time.perf_counter() - start
+            if category is None:
+                failures += 1
+                continue
+            after = api_client.get_groq_usage()
+            entry = {
+                "key": text_key(text),
+                "category": category,
+                "latency_ms": latency * 1000,
+                "prompt_tokens": after["prompt_tokens"] - before["prompt_tokens"],
+                "completion_tokens": after["completion_tokens"] - before["completion_tokens"],
+                "model": api_client.GROQ_MODEL,
+                "prompt": api_client.GROQ_PROMPT,
+            }
+            fixture[entry["key"]] = entry
+            f.write(json.dumps(entry) + "\n")
+            if index % 100 == 0:
+                f.flush()
+                print(f"  {index}/{len(missing)}", file=sys.stderr)
+    return failures
+
+
+# ============================================
+# Scoring
+# ============================================
+
+def class_report(expected: List[str], predicted: List[str]) -> dict:
+    """Accuracy, per-class and bullying-vs-not precision/recall, and the confusion matrix."""
+    confusion = {label: defaultdict(int) for label in CATEGORIES}
+    for truth, guess in zip(expected, predicted):
+        confusion[truth][guess] += 1
+
+    per_class = {}
+    for label in CATEGORIES:
+        true_positive = confusion[label].get(label, 0)
+        predicted_count = sum(confusion[truth].get(label, 0) for truth in CATEGORIES)
+        support = sum(confusion[label].values())
+        if not support and not predicted_count:
+            continue
+        per_class[label] = {
+            "precision": true_positive / predicted_count if predicted_count else None,
+            "recall": true_positive / support if support else None,
+            "support": support,
+        }
+
+    def bullying(label):
+        return label != "Not Cyberbullying"
+
+    flagged = sum(1 for guess in predicted if bullying(guess))
+    actual = sum(1 for truth in expected if bullying(truth))
+    caught = sum(1 for truth, guess in zip(expected, predicted) if bullying(truth) and bullying(guess))
+    correct = sum(1 for truth, guess in zip(expected, predicted) if truth == guess)
+    return {
+        "accuracy": correct / len(expected) if expected else None,
+        "per_class": per_class,
+        "bullying": {
+            "precision": caught / flagged if flagged else None,
+            "recall": caught / actual if actual else None,
+        },
+        "confusion": {truth: dict(row) for truth, row in confusion.items() if row},
+    }
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def summarize_tier(expected, predicted, latencies, groq_calls, cost_usd) -> dict:
+    total = sum(latencies)
+    return {
+        **class_report(expected, predicted),
+        "p50_ms": _percentile(latencies, 0.5) * 1000,
+        "p95_ms": _percentile(latencies, 0.95) * 1000,
+        "texts_per_s": len(latencies) / total if total > 0 else None,
+        "groq_call_rate": groq_calls / len(expected),
+        "est_cost_per_1k_usd": cost_usd / len(expected) * 1000 if cost_usd is not None else None,
+    }
+
+
+# ============================================
+# Calibration
+# ============================================
+
+def _scaled_nll(log_probs: List[List[float]], targets: List[int], scale: float) -> float:
+    total = 0.0
+    for row, target in zip(log_probs, targets):
+        scaled = [value * scale for value in row]
+        top = max(scaled)
+        total += top + math.log(sum(math.exp(value - top) for value in scaled)) - scaled[target]
+    return total / len(targets)
+
+
+def _scaled_ece(log_probs: List[List[float]], targets: List[int], scale: float, bins: int = 15) -> float:
+    """Expected calibration error of the top-label confidence."""
+    counts, confidence_sums, correct_sums = [0] * bins, [0.0] * bins, [0] * bins
+    for row, target in zip(log_probs, targets):
+        scaled = [value * scale for value in row]
+        top = max(scaled)
+        weights = [math.exp(value - top) for value in scaled]
+        predicted = scaled.index(top)
+        confidence = weights[predicted] / sum(weights)
+        index = min(bins - 1, int(confidence * bins))
+        counts[index] += 1
+        confidence_sums[index] += confidence
+        correct_sums[index] += predicted == target
+    return sum(abs(confidence_sums[i] - correct_sums[i]) for i in range(bins) if counts[i]) / len(targets)
+
+
+def fit_temperature(prob_rows: List[Dict[str, float]], expected: List[str], labels: List[str],
+                    current: float) -> Optional[dict]:
+    """
+    Fit the softmax temperature that minimizes the negative log-likelihood.
+
+    The probabilities were computed at temperature `current`; their logs are
+    the logits divided by it (up to a constant), so scaling them by s equals
+    temperature current / s. Only texts whose label is one of the model's
+    `labels` count. Returns None when there are none.
+    """
+    log_probs, targets = [], []
+    for row, truth in zip(prob_rows, expected):
+        if row and truth in labels:
+            log_probs.append([math.log(max(row[label], 1e-12)) for label in labels])
+            targets.append(labels.index(truth))
+    if not targets:
+        return None
+
+    # The NLL is convex in the scale; golden-section search over log(scale)
+    low, high = math.log(0.05), math.log(20.0)
+    ratio = (math.sqrt(5) - 1) / 2
+    for _ in range(60):
+        a = high - ratio * (high - low)
+        b = low + ratio * (high - low)
+        if _scaled_nll(log_probs, targets, math.exp(a)) < _scaled_nll(log_probs, targets, math.exp(b)):
+            high = b
+        else:
+            low = a
+    scale = math.exp((low + high) / 2)
+    return {
+        "texts": len(targets),
+        "temperature": current,
+        "fitted_temperature": current / scale,
+        "nll": _scaled_nll(log_probs, targets, 1.0),
+        "fitted_nll": _scaled_nll(log_probs, targets, scale),
+        "ece": _scaled_ece(log_probs, targets, 1.0),
+        "fitted_ece": _scaled_ece(log_probs, targets, scale),
+    }
+
+
+# ============================================
+# Driver
+# ============================================
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Compare accuracy, latency and cost of the classifier tiers")
+    parser.add_argument("input", help="Labeled .csv or .jsonl file")
+    parser.add_argument("-o", "--output", help="Write JSON results here (default: stdout)")
+    parser.add_argument("--text-column", help="Column holding the text (default: auto-detect)")
+    parser.add_argument("--label-column", help="Column holding the label (default: auto-detect)")
+    parser.add_argument("--limit", type=int, default=0, help="Evaluate a random sample of this many rows")
+    parser.add_argument("--seed", type=int, default=1234, help="Sampling seed")
+    parser.add_argument("--thresholds", default="0.7,0.8,0.9,0.95,0.99",
+                        help="Confidence thresholds for the local+keyword and cascade tiers")
+    parser.add_argument("--batch-size", type=int, default=32, help="Texts per model forward pass")
+    parser.add_argument("--groq-fixture", help="JSONL of recorded Groq answers to replay")
+    parser.add_argument("--record-groq", metavar="FIXTURE",
+                        help="Call Groq for texts missing from this fixture, append them, then evaluate")
+    parser.add_argument("--price-input", type=float, default=DEFAULT_PRICE_INPUT,
+                        help="Groq USD per million prompt tokens")
+    parser.add_argument("--price-output", type=float, default=DEFAULT_PRICE_OUTPUT,
+                        help="Groq USD per million completion tokens")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    thresholds = [float(t) for t in args.thresholds.split(",") if t.strip()]
+    texts, expected, skipped = load_dataset(args.input, args.text_column, args.label_column,
+                                            args.limit, args.seed)
+    if not texts:
+        raise SystemExit("No labeled rows to evaluate")
+    print(f"{len(texts)} labeled texts ({sum(skipped.values())} rows skipped)", file=sys.stderr)
+
+    fixture_path = args.record_groq or args.groq_fixture
+    fixture = load_fixture(fixture_path)
+    record_failures = record_fixture(texts, args.record_groq, fixture) if args.record_groq else 0
+
+    # Model loading chatter goes to stdout; keep it out of the report
+    with contextlib.redirect_stdout(io.StringIO()):
+        from api_client import keyword_fallback_classifier, gate_reason, combine_labels
+        import detector
+    from normalize import normalize
+
+    # Keyword stage, timed per text
+    keyword, keyword_latency = [], []
+    for text in texts:
+        start = time.perf_counter()
+        keyword.append(keyword_fallback_classifier(text))
+        keyword_latency.append(time.perf_counter() - start)
+
+    # Local model, timed per batch
+    local, local_latency, local_probs = [], [], []
+    for start_index in range(0, len(texts), args.batch_size):
+        batch = texts[start_index:start_index + args.batch_size]
+        start = time.perf_counter()
+        probs = detector._predict_folded_batch([normalize(text).folded for text in batch])
+        share = (time.perf_counter() - start) / len(batch)
+        local_probs.extend(probs)
+        for row in probs:
+            label = max(row, key=row.get) if row else None
+            local.append((label, row[label] if row else None))
+            local_latency.append(share)
+    local_available = any(label is not None for label, _ in local)
+    if not local_available:
+        print("Local model unavailable; skipping the local and cascade tiers", file=sys.stderr)
+
+    # Replayed Groq answers; a missing entry is treated like a failed call
+    groq, groq_latency, groq_cost = [], [], []
+    missing = 0
+    for text, (keyword_label, keyword_explanation) in zip(texts, keyword):
+        entry = fixture.get(text_key(text))
+        if entry is None:
+            missing += 1
+            groq.append((keyword_label, keyword_explanation))
+            groq_latency.append(0.0)
+            groq_cost.append(0.0)
+            continue
+        groq.append((entry["category"], ""))
+        groq_latency.append(entry.get("latency_ms", 0.0) / 1000)
+        groq_cost.append((entry.get("prompt_tokens", 0) * args.price_input
+                          + entry.get("completion_tokens", 0) * args.price_output) / 1e6)
+    groq_available = len(fixture) > 0
+    if not groq_available:
+        print("No Groq fixture; skipping the groq and cascade tiers (use --groq-fixture or --record-groq)",
+              file=sys.stderr)
+
+    tiers = {}
+    tiers["keyword"] = summarize_tier(expected, [label for label, _ in keyword], keyword_latency, 0, 0.0)
+    if local_available:
+        tiers["local"] = summarize_tier(expected, [label for label, _ in local], local_latency, 0, 0.0)
+    if groq_available:
+        tiers["groq"] = summarize_tier(expected, [label for label, _ in groq], groq_latency,
+                                       len(texts) - missing, sum(groq_cost))
+
+    if local_available:
+        base_latency = [k + l for k, l in zip(keyword_latency, local_latency)]
+        for threshold in thresholds:
+            degraded, cascade, cascade_latency = [], [], []
+            calls, cost = 0, 0.0
+            for i, ((local_label, confidence), (keyword_label, keyword_explanation)) in enumerate(zip(local, keyword)):
+                if gate_reason(local_label, confidence, keyword_label, threshold) is None:
+                    degraded.append(local_label)
+                    cascade.append(local_label)
+                    cascade_latency.append(base_latency[i])
+                    continue
+                degraded.append(combine_labels(local_label, keyword_label, keyword_explanation,
+                                               None, None, groq_called=False)[0])
+                # A missing fixture entry already holds the keyword label, as a failed call would
+                cascade.append(groq[i][0])
+                cascade_latency.append(base_latency[i] + groq_latency[i])
+                calls += 1
+                cost += groq_cost[i]
+            tiers[f"local+keyword[t={threshold}]"] = summarize_tier(expected, degraded, base_latency, 0, 0.0)
+            if groq_available:
+                tiers[f"cascade[t={threshold}]"] = summarize_tier(expected, cascade, cascade_latency, calls, cost)
+
+    results = {
+        "input": os.path.abspath(args.input),
+        "texts": len(texts),
+        "skipped_rows": skipped,
+        "model_version": detector.model_version(),
+        "groq_fixture": fixture_path,
+        "groq_fixture_missing": missing if groq_available else None,
+        "groq_record_failures": record_failures,
+        "prices_per_mtok": {"input": args.price_input, "output": args.price_output},
+        "tiers": tiers,
+        "calibration": (fit_temperature(local_probs, expected, detector.CLASS_LABELS,
+                                        detector.LOCAL_MODEL_TEMPERATURE) if local_available else None),
+    }
+
+    def fmt(value, pattern="{:.3f}"):
+        return pattern.format(value) if value is not None else "-"
+
+    print(f"\n{'tier':<26}{'acc':>7}{'bully P':>9}{'bully R':>9}{'groq %':>8}{'p50 ms':>9}"
+          f"{'p95 ms':>9}{'texts/s':>10}{'$/1k':>9}", file=sys.stderr)
+    for name, stats in tiers.items():
+        print(f"{name:<26}{fmt(stats['accuracy']):>7}{fmt(stats['bullying']['precision']):>9}"
+              f"{fmt(stats['bullying']['recall']):>9}{stats['groq_call_rate'] * 100:>7.1f}%"
+              f"{stats['p50_ms']:>9.2f}{stats['p95_ms']:>9.2f}{fmt(stats['texts_per_s'], '{:.0f}'):>10}"
+              f"{fmt(stats['est_cost_per_1k_usd'], '{:.4f}'):>9}", file=sys.stderr)
+    print(f"\nPer-class precision/recall:\n{'tier':<26}" + "".join(f"{c[:14]:>16}" for c in CATEGORIES),
+          file=sys.stderr)
+    for name, stats in tiers.items():
+        cells = []
+        for category in CATEGORIES:
+            row = stats["per_class"].get(category)
+            cells.append(f"{fmt(row['precision'], '{:.2f}')}/{fmt(row['recall'], '{:.2f}')}" if row else "-")
+        print(f"{name:<26}" + "".join(f"{cell:>16}" for cell in cells), file=sys.stderr)
+    calibration = results["calibration"]
+    if calibration:
+        print(f"\nLocal model calibration on {calibration['texts']} texts: set "
+              f"LOCAL_MODEL_TEMPERATURE={calibration['fitted_temperature']:.3f} "
+              f"(now {calibration['temperature']:g}; ECE {calibration['ece']:.3f} -> "
+              f"{calibration['fitted_ece']:.3f}, NLL {calibration['nll']:.3f} -> {calibration['fitted_nll']:.3f})",
+              file=sys.stderr)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+In-process event broadcaster for live feed updates.
+
+The write paths in `database.py` publish small events (post created, comment
+added, deleted or reclassified, likes changed). `/api/events` streams them to
+every connected browser as server-sent events.
+
+Each event is serialized once into a shared ring buffer; publishing appends it
+and wakes all subscribers with a single asyncio.Event swap, so the cost of a
+publish does not grow with the number of subscribers. Subscribers read
+whatever is new since the last id they saw. A client that reconnects with
+Last-Event-ID gets the events it missed, or a `reset` event telling it to
+refetch when they are no longer buffered.
+
+Event ids are "<epoch>.<n>", where the epoch is random per process. An id from
+another process (a restart, or another serve.py worker) cannot be compared
+with this one's counter, so such a client also gets `reset` and continues
+from this process's newest event.
+
+Events only reach subscribers of the process that made the write: run the
+API with a single worker, or accept that clients see only their worker's events.
+"""
+
+import asyncio
+import json
+import os
+import threading
+import uuid
+from collections import deque
+from typing import AsyncIterator, Optional
+
+EVENT_HISTORY = int(os.getenv("EVENT_HISTORY", "1000"))
+EVENT_KEEPALIVE_SECONDS = 15.0
+
+
+class EventBroadcaster:
+    def __init__(self, history: int = EVENT_HISTORY):
+        self._events = deque(maxlen=history)  # (id, encoded SSE frame)
+        self._last_id = 0
+        self.epoch = uuid.uuid4().hex[:8]
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._changed: Optional[asyncio.Event] = None
+        self.subscribers = 0
+
+    def publish(self, event: str, data: dict):
+        """Queue an event for all subscribers; safe to call from any thread."""
+        with self._lock:
+            self._last_id += 1
+            frame = f"id: {self.epoch}.{self._last_id}\nevent: {event}\ndata: {json.dumps(data, default=str)}\n\n".encode("utf-8")
+            self._events.append((self._last_id, frame))
+            loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self):
+        # Wake everyone waiting on the current event and hand out a fresh one
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def _since(self, last_id: int):
+        """(frames after last_id, id of the newest one); frames is None when some were already dropped."""
+        with self._lock:
+            if not self._events or last_id >= self._last_id:
+                return [], last_id
+            if last_id + 1 < self._events[0][0]:
+                return None, self._last_id
+            return [frame for event_id, frame in self._events if event_id > last_id], self._last_id
+
+    def _resume_from(self, last_event_id: str) -> Optional[int]:
+        """Counter value of a Last-Event-ID issued by this process, else None."""
+        epoch, _, number = last_event_id.partition(".")
+        if epoch != self.epoch or not number.isdigit():
+            return None
+        number = int(number)
+        with self._lock:
+            return number if number <= self._last_id else None
+
+    async def stream(self, last_event_id: Optional[str] = None) -> AsyncIterator[bytes]:
+        """Yield SSE frames for one subscriber until it disconnects."""
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+            self._changed = asyncio.Event()
+        self.subscribers += 1
+        try:
+            yield b"retry: 3000\n\n"
+            cursor = self._resume_from(last_event_id) if last_event_id else self._last_id
+            if cursor is None:
+                # Not our id: this process cannot tell what the client missed
+                cursor = self._last_id
+                yield b"event: reset\ndata: {}\n\n"
+            while True:
+                changed = self._changed
+                frames, cursor = self._since(cursor)
+                if frames is None:
+                    # Missed events are gone (long disconnect or a very slow
+                    # client): tell it to refetch, then carry on from here
+                    yield b"event: reset\ndata: {}\n\n"
+                elif frames:
+                    yield b"".join(frames)
+                else:
+                    try:
+                        await asyncio.wait_for(changed.wait(), EVENT_KEEPALIVE_SECONDS)
+                    except asyncio.TimeoutError:
+                        yield b": keepalive\n\n"
+        finally:
+            self.subscribers -= 1
+
+
+broadcaster = EventBroadcaster()
+
+
+def publish(event: str, data: dict):
+    broadcaster.publish(event, data)
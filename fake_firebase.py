@@ -0,0 +1,213 @@
+"""
+In-memory stand-in for the parts of pyrebase that CyberGuard uses.
+
+Selected with STORAGE_BACKEND=memory (see storage.py) so the API can run for
+load tests and local development without a Firebase project.
+All data lives in this process and is lost on exit.
+"""
+
+import copy
+import threading
+import uuid
+
+
+class _Item:
+    """Mimics pyrebase's Pyre items returned by `.each()`."""
+
+    def __init__(self, key, value):
+        self._key = key
+        self._value = value
+
+    def key(self):
+        return self._key
+
+    def val(self):
+        return self._value
+
+
+class _Response:
+    """Mimics pyrebase's PyreResponse returned by `.get()`."""
+
+    def __init__(self, key, value):
+        self._key = key
+        self._value = value
+
+    def key(self):
+        return self._key
+
+    def val(self):
+        return self._value
+
+    def each(self):
+        if isinstance(self._value, dict):
+            return [_Item(k, v) for k, v in self._value.items()]
+        return None
+
+
+def _clean(value):
+    """Firebase drops null values and empty containers when it stores data."""
+    if isinstance(value, dict):
+        cleaned = {k: _clean(v) for k, v in value.items()}
+        return {k: v for k, v in cleaned.items() if v is not None and v != {} and v != []}
+    if isinstance(value, (list, tuple)):
+        return [_clean(v) for v in value]
+    return value
+
+
+class _Reference:
+    def __init__(self, store, path=(), shallow=False):
+        self._store = store
+        self._path = path
+        self._shallow = shallow
+
+    def child(self, *names):
+        parts = list(self._path)
+        for name in names:
+            parts.extend(p for p in str(name).split("/") if p)
+        return _Reference(self._store, tuple(parts))
+
+    def shallow(self):
+        return _Reference(self._store, self._path, shallow=True)
+
+    def _lookup(self):
+        node = self._store.data
+        for part in self._path:
+            if not isinstance(node, dict) or part not in node:
+                return None
+            node = node[part]
+        return node
+
+    def _parent(self, create):
+        node = self._store.data
+        for part in self._path[:-1]:
+            if part not in node or not isinstance(node[part], dict):
+                if not create:
+                    return None
+                node[part] = {}
+            node = node[part]
+        return node
+
+    def get(self):
+        with self._store.lock:
+            value = self._lookup()
+            if self._shallow and isinstance(value, dict):
+                value = dict.fromkeys(value, True)
+            else:
+                value = copy.deepcopy(value)
+        return _Response(self._path[-1] if self._path else None, value)
+
+    def set(self, data):
+        data = _clean(copy.deepcopy(data))
+        with self._store.lock:
+            if not self._path:
+                self._store.data = data if isinstance(data, dict) else {}
+                return data
+            parent = self._parent(create=True)
+            if data is None or data == {} or data == []:
+                parent.pop(self._path[-1], None)
+            else:
+                parent[self._path[-1]] = data
+        return data
+
+    def update(self, data):
+        with self._store.lock:
+            for key, value in data.items():
+                # Multi-path updates ("a/b/c": value) write each path independently
+                ref = self.child(key)
+                parent = ref._parent(create=True)
+                value = _clean(copy.deepcopy(value))
+                if value is None or value == {} or value == []:
+                    parent.pop(ref._path[-1], None)
+                else:
+                    parent[ref._path[-1]] = value
+        return data
+
+    def push(self, data):
+        key = uuid.uuid4().hex
+        self.child(key).set(data)
+        return {"name": key}
+
+    def remove(self):
+        with self._store.lock:
+            parent = self._parent(create=False)
+            if parent is not None and self._path:
+                parent.pop(self._path[-1], None)
+
+
+class _Store:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.data = {}
+
+
+class _Auth:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._users = {}
+
+    def create_user_with_email_and_password(self, email, password):
+        with self._lock:
+            if email in self._users:
+                raise ValueError("EMAIL_EXISTS")
+            local_id = uuid.uuid4().hex[:28]
+            self._users[email] = {"localId": local_id, "password": password}
+        return {"localId": local_id, "email": email, "idToken": uuid.uuid4().hex}
+
+    def sign_in_with_email_and_password(self, email, password):
+        with self._lock:
+            user = self._users.get(email)
+        if not user or user["password"] != password:
+            raise ValueError("INVALID_LOGIN_CREDENTIALS")
+        return {"localId": user["localId"], "email": email, "idToken": uuid.uuid4().hex}
+
+
+class _StorageRef:
+    def __init__(self, storage, path):
+        self._storage = storage
+        self._path = path
+
+    def child(self, path):
+        return _StorageRef(self._storage, f"{self._path}/{path}".strip("/"))
+
+    def put(self, file):
+        data = file.read() if hasattr(file, "read") else bytes(file)
+        with self._storage.lock:
+            self._storage.blobs[self._path] = data
+        return {"name": self._path}
+
+    def get_url(self, token):
+        return f"memory://{self._path}"
+
+
+class _Storage:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.blobs = {}
+
+    def child(self, path):
+        return _StorageRef(self, path)
+
+
+class FakeFirebase:
+    def __init__(self):
+        self._store = _Store()
+        self._auth = _Auth()
+        self._storage = _Storage()
+
+    def database(self):
+        return _Reference(self._store)
+
+    def auth(self):
+        return self._auth
+
+    def storage(self):
+        return self._storage
+
+
+# One shared instance so every caller in the process sees the same data
+_app = FakeFirebase()
+
+
+def initialize_app(config):
+    """Same signature as pyrebase.initialize_app; the config is ignored."""
+    return _app
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for Groq's OpenAI-compatible chat completions endpoint.
+
+Used by the benchmark and load-test scripts so they run without a Groq key or
+network access. Latency, per-token generation time, error rate and rate
+limiting are configurable; the returned category comes from the keyword
+classifier so answers are deterministic. Requests with "stream": true are
+answered with server-sent event chunks like the real API.
+
+Usage:
+    python fake_groq.py --port 8765 --latency-ms 300 --error-rate 0.02
+    python fake_groq.py --latency-ms 150 --token-ms 8
+    GROQ_API_URL=http://127.0.0.1:8765/openai/v1/chat/completions GROQ_API_KEY=fake ...
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_TEXT_PATTERN = re.compile(r'Text to analyze: "(.*)"\s*$', re.MULTILINE)
+
+# Rough four-characters-per-token estimate
+CHARS_PER_TOKEN = 4
+
+
+def _extract_text(messages: list) -> str:
+    """Pull the text under test out of the last user message.
+
+    The compact prompt sends the bare text as the user message; the verbose
+    one embeds it after "Text to analyze:".
+    """
+    content = ""
+    for message in messages:
+        if message.get("role") == "user":
+            content = message.get("content", "")
+    match = _TEXT_PATTERN.search(content)
+    return match.group(1) if match else content
+
+
+def _classify(text: str) -> dict:
+    from api_client import keyword_fallback_classifier
+    category, _ = keyword_fallback_classifier(text)
+    return {"category": category, "explanation": f"Fake Groq verdict: {category}"}
+
+
+class FakeGroqHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body: dict, headers: dict = None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_stream(self, completion_id: str, model: str, content: str, finish_reason: str, usage: dict):
+        # No Content-Length: the stream ends when the connection closes
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def event(delta: dict, finish=None, extra=None) -> bytes:
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish}],
+                **(extra or {}),
+            }
+            return f"data: {json.dumps(chunk)}\n\n".encode("utf-8")
+
+        token_seconds = self.server.config["token_ms"] / 1000.0
+        try:
+            self.wfile.write(event({"role": "assistant", "content": ""}))
+            for i in range(0, len(content), CHARS_PER_TOKEN):
+                time.sleep(token_seconds)
+                self.wfile.write(event({"content": content[i:i + CHARS_PER_TOKEN]}))
+                self.wfile.flush()
+            # Groq reports usage on the last chunk under x_groq
+            self.wfile.write(event({}, finish_reason, {"x_groq": {"usage": usage}}))
+            self.wfile.write(b"data: [DONE]\n\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped reading once it had what it needed
+            pass
+
+    def do_POST(self):
+        config = self.server.config
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": {"message": "invalid JSON"}})
+            return
+
+        latency = max(0.0, random.gauss(config["latency_ms"], config["jitter_ms"])) / 1000.0
+        time.sleep(latency)
+
+        roll = random.random()
+        if roll < config["rate_limit_rate"]:
+            self._send_json(429, {"error": {"message": "rate limited"}}, {"retry-after": "1"})
+            return
+        if roll < config["rate_limit_rate"] + config["error_rate"]:
+            self._send_json(500, {"error": {"message": "injected failure"}})
+            return
+
+        messages = payload.get("messages", [])
+        verdict = _classify(_extract_text(messages))
+        content = json.dumps(verdict)
+        prompt_chars = sum(len(m.get("content", "")) for m in messages)
+        finish_reason = "stop"
+        max_tokens = payload.get("max_tokens")
+        if max_tokens and len(content) // CHARS_PER_TOKEN > max_tokens:
+            # Cut the reply off like the real API does when it hits max_tokens
+            content, finish_reason = content[:max_tokens * CHARS_PER_TOKEN], "length"
+        with self.server.lock:
+            self.server.requests += 1
+            completion_id = f"fake-{self.server.requests}"
+        usage = {
+            "prompt_tokens": prompt_chars // CHARS_PER_TOKEN,
+            "completion_tokens": len(content) // CHARS_PER_TOKEN,
+            "total_tokens": (prompt_chars + len(content)) // CHARS_PER_TOKEN,
+        }
+        model = payload.get("model", "fake")
+
+        if payload.get("stream"):
+            self._send_stream(completion_id, model, content, finish_reason, usage)
+            return
+        # Generation time is the same as streaming; the reply just arrives at once
+        time.sleep(usage["completion_tokens"] * config["token_ms"] / 1000.0)
+        self._send_json(200, {
+            "id": completion_id,
+            "object": "chat.completion",
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": finish_reason,
+            }],
+            "usage": usage,
+        })
+
+
+class FakeGroqServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency_ms=200.0, jitter_ms=0.0, error_rate=0.0, rate_limit_rate=0.0,
+                 token_ms=0.0):
+        super().__init__(address, FakeGroqHandler)
+        self.config = {
+            "latency_ms": latency_ms,
+            "jitter_ms": jitter_ms,
+            "token_ms": token_ms,
+            "error_rate": error_rate,
+            "rate_limit_rate": rate_limit_rate,
+        }
+        self.lock = threading.Lock()
+        self.requests = 0
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/openai/v1/chat/completions"
+
+
+def start_fake_groq(host: str = "127.0.0.1", port: int = 0, **config) -> FakeGroqServer:
+    """Start a fake Groq server on a background thread and return it."""
+    server = FakeGroqServer((host, port), **config)
+    threading.Thread(target=server.serve_forever, name="fake-groq", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Groq chat completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="Mean latency before the first token")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Latency standard deviation")
+    parser.add_argument("--token-ms", type=float, default=0.0, help="Generation time per completion token")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of 500 responses")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of 429 responses")
+    args = parser.parse_args()
+
+    server = FakeGroqServer((args.host, args.port), latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                            error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+                            token_ms=args.token_ms)
+    print(f"Fake Groq listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""
+Near-duplicate flood detection for comment raids.
+
+Raids post many lightly varied copies of the same insult. Each classified
+comment's 64-bit SimHash (over character 4-grams of the de-obfuscated text,
+see normalize.py) is kept in a time-windowed, size-bounded index. A new
+comment close to a recent bullying one reuses that verdict instead of going
+through the model and Groq again, and is counted in the original's flood
+cluster. The allowed Hamming distance grows with length: one bit per 16
+characters, up to FLOOD_MAX_DISTANCE.
+
+Benign verdicts are only reused for the exact same normalized text, and only
+when the keyword stage (run by the caller first) does not flag the new text,
+so a harmless comment with an insult appended is always classified. Entries
+expire FLOOD_WINDOW_SECONDS after they were first classified, however often
+they are matched.
+
+Lookups use four 16-bit bands of the signature: two signatures at most 3 bits
+apart always share at least one band, so only a handful of candidates are
+compared.
+
+Environment:
+    FLOOD_WINDOW_SECONDS   How long a verdict can be reused (default 600, 0 disables)
+    FLOOD_MAX_ENTRIES      Signatures kept in memory (default 10000)
+    FLOOD_MAX_DISTANCE     Maximum Hamming distance for a match (default 3)
+    FLOOD_MIN_CHARS        Shorter texts are always classified (default 16)
+"""
+
+import hashlib
+import itertools
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Optional
+
+from metrics import CACHE_REQUESTS
+from normalize import NormalizedText
+
+FLOOD_WINDOW_SECONDS = float(os.getenv("FLOOD_WINDOW_SECONDS", "600"))
+FLOOD_MAX_ENTRIES = int(os.getenv("FLOOD_MAX_ENTRIES", "10000"))
+FLOOD_MAX_DISTANCE = int(os.getenv("FLOOD_MAX_DISTANCE", "3"))
+FLOOD_MIN_CHARS = int(os.getenv("FLOOD_MIN_CHARS", "16"))
+
+SHINGLE_SIZE = 4
+BANDS = 4
+BAND_BITS = 64 // BANDS
+BAND_MASK = (1 << BAND_BITS) - 1
+
+
+def simhash(text: str) -> int:
+    """64-bit SimHash of the character shingles of text."""
+    if len(text) <= SHINGLE_SIZE:
+        shingles = [text]
+    else:
+        shingles = [text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)]
+    bits = [
+        format(int.from_bytes(hashlib.blake2b(s.encode("utf-8", "surrogatepass"), digest_size=8).digest(), "big"), "064b")
+        for s in shingles
+    ]
+    # Column-wise majority vote; zip and tuple.count keep the loop in C
+    half = len(bits) / 2
+    return int("".join("1" if column.count("1") > half else "0" for column in zip(*bits)), 2)
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class FloodEntry:
+    """A classified comment and the near-duplicates that reused its verdict."""
+
+    __slots__ = ("id", "signature", "key", "verdict", "first_seen", "last_seen", "size", "posts")
+
+    def __init__(self, entry_id, signature, key, verdict: str, post_id, now):
+        self.id = entry_id
+        self.signature = signature
+        self.key = key
+        self.verdict = verdict
+        self.first_seen = now
+        self.last_seen = now
+        self.size = 1
+        self.posts = Counter()
+        if post_id:
+            self.posts[post_id] += 1
+
+    def to_dict(self, post_id: Optional[str] = None) -> dict:
+        return {
+            "cluster_id": self.id,
+            "text_hash": self.key[:16],
+            "size": self.posts[post_id] if post_id else self.size,
+            "total_size": self.size,
+            "posts": len(self.posts),
+            "verdict": self.verdict,
+            "first_seen": self.first_seen,
+            "last_seen": self.last_seen,
+        }
+
+
+class FloodIndex:
+    """Time-windowed SimHash index of recent verdicts."""
+
+    def __init__(self, window_seconds: float = FLOOD_WINDOW_SECONDS, max_entries: int = FLOOD_MAX_ENTRIES,
+                 max_distance: int = FLOOD_MAX_DISTANCE, min_chars: int = FLOOD_MIN_CHARS):
+        self.window = window_seconds
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self.min_chars = min_chars
+        self._entries = OrderedDict()  # id -> FloodEntry, oldest first
+        self._bands = [dict() for _ in range(BANDS)]  # band value -> set of entry ids
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0 and self.max_entries > 0
+
+    def _band_keys(self, signature: int):
+        return [(signature >> (band * BAND_BITS)) & BAND_MASK for band in range(BANDS)]
+
+    def _remove(self, entry: FloodEntry):
+        del self._entries[entry.id]
+        for band, value in enumerate(self._band_keys(entry.signature)):
+            bucket = self._bands[band].get(value)
+            if bucket is not None:
+                bucket.discard(entry.id)
+                if not bucket:
+                    del self._bands[band][value]
+
+    def _expire(self, now: float):
+        while self._entries:
+            oldest = next(iter(self._entries.values()))
+            if now - oldest.first_seen <= self.window and len(self._entries) <= self.max_entries:
+                break
+            self._remove(oldest)
+
+    def signature(self, norm: NormalizedText) -> Optional[int]:
+        """SimHash for a text, or None when it is too short to compare safely."""
+        if not self.enabled or len(norm.deobfuscated) < self.min_chars:
+            return None
+        return simhash(norm.deobfuscated)
+
+    def max_distance_for(self, norm: NormalizedText) -> int:
+        """Hamming distance allowed for a text: one bit per 16 characters, up to max_distance."""
+        return min(self.max_distance, len(norm.deobfuscated) // 16)
+
+    def lookup(self, signature: Optional[int], norm: NormalizedText, post_id: Optional[str] = None,
+               keyword_flagged: bool = False):
+        """
+        Return the final label of a recent near-duplicate (and count this comment), or None.
+
+        Bullying verdicts match near-duplicates; "Not Cyberbullying" only
+        matches the identical normalized text, and never when the keyword
+        stage flagged the new text.
+        """
+        if signature is None:
+            return None
+        now = time.time()
+        max_distance = self.max_distance_for(norm)
+        with self._lock:
+            self._expire(now)
+            best, best_distance = None, max_distance + 1
+            for band, value in enumerate(self._band_keys(signature)):
+                for entry_id in self._bands[band].get(value, ()):
+                    entry = self._entries[entry_id]
+                    if entry.verdict == "Not Cyberbullying" and (keyword_flagged or entry.key != norm.key):
+                        continue
+                    distance = hamming(signature, entry.signature)
+                    if distance < best_distance:
+                        best, best_distance = entry, distance
+            if best is None:
+                CACHE_REQUESTS.inc("flood", "miss")
+                return None
+            best.size += 1
+            best.last_seen = now
+            if post_id:
+                best.posts[post_id] += 1
+        CACHE_REQUESTS.inc("flood", "hit")
+        return best.verdict
+
+    def add(self, signature: Optional[int], norm: NormalizedText, verdict: str, post_id: Optional[str] = None):
+        """Remember the final label of a freshly classified text."""
+        if signature is None:
+            return
+        now = time.time()
+        with self._lock:
+            entry = FloodEntry(next(self._ids), signature, norm.key, verdict, post_id, now)
+            self._entries[entry.id] = entry
+            for band, value in enumerate(self._band_keys(signature)):
+                self._bands[band].setdefault(value, set()).add(entry.id)
+            self._expire(now)
+
+    def clusters(self, post_id: Optional[str] = None, min_size: int = 2) -> list:
+        """Flood clusters seen in the window, largest first; limited to one post if given."""
+        with self._lock:
+            self._expire(time.time())
+            entries = [e for e in self._entries.values() if post_id is None or e.posts[post_id]]
+            clusters = [entry.to_dict(post_id) for entry in entries]
+        clusters = [c for c in clusters if c["size"] >= min_size]
+        clusters.sort(key=lambda c: c["size"], reverse=True)
+        return clusters
+
+
+flood_index = FloodIndex()
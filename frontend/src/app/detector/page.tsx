@@ -1,6 +1,6 @@
 'use client';
 
-import { useState } from 'react';
+import { useEffect, useRef, useState } from 'react';
 import { motion, AnimatePresence } from 'framer-motion';
 import { 
   Shield, Brain, Sparkles, AlertTriangle, CheckCircle, 
@@ -17,8 +17,22 @@ interface ClassificationResult {
   final_label: string;
   is_bullying: boolean;
   bullying_type: string | null;
+  confidence?: number | null;
 }
 
+// Provisional verdict streamed by /api/classify/live before the final result
+interface LiveVerdict {
+  rev: number;
+  stage: 'keyword' | 'local' | 'final' | 'error';
+  label?: string;
+  confidence?: number | null;
+  is_bullying?: boolean;
+  detail?: string;
+}
+
+const API_BASE = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000';
+const LIVE_URL = API_BASE.replace(/^http/, 'ws') + '/api/classify/live';
+
 const exampleTexts = [
   "Hello, how are you today?",
   "You're such an idiot, nobody likes you",
@@ -35,6 +49,59 @@ export default function DetectorPage() {
   const [error, setError] = useState('');
   const [copied, setCopied] = useState(false);
   const [showExamples, setShowExamples] = useState(false);
+  const [live, setLive] = useState<LiveVerdict | null>(null);
+  const wsRef = useRef<WebSocket | null>(null);
+  const revRef = useRef(0);
+
+  // Keep one WebSocket open for type-ahead checks; reconnect if it drops
+  useEffect(() => {
+    let closed = false;
+    let retry: ReturnType<typeof setTimeout>;
+
+    const connect = () => {
+      const ws = new WebSocket(LIVE_URL);
+      wsRef.current = ws;
+      ws.onmessage = (event) => {
+        const message = JSON.parse(event.data);
+        if (message.rev !== revRef.current) return; // answer for text that has since changed
+        if (message.stage === 'final') {
+          setResult(message);
+          setLive(null);
+        } else if (message.stage === 'error') {
+          setError(message.detail);
+          setLive(null);
+        } else {
+          setLive(message);
+        }
+      };
+      ws.onclose = () => {
+        wsRef.current = null;
+        if (!closed) retry = setTimeout(connect, 2000);
+      };
+    };
+
+    connect();
+    return () => {
+      closed = true;
+      clearTimeout(retry);
+      wsRef.current?.close();
+    };
+  }, []);
+
+  const sendRevision = (text: string) => {
+    const rev = ++revRef.current;
+    setLive(null);
+    const ws = wsRef.current;
+    if (text.trim() && ws && ws.readyState === WebSocket.OPEN) {
+      ws.send(JSON.stringify({ rev, text }));
+    }
+  };
+
+  const handleInputChange = (text: string) => {
+    setInputText(text);
+    setError('');
+    sendRevision(text);
+  };
 
   const handleAnalyze = async () => {
     if (!inputText.trim()) return;
@@ -64,11 +131,13 @@ export default function DetectorPage() {
     setInputText('');
     setResult(null);
     setError('');
+    sendRevision('');
   };
 
   const handleExampleClick = (text: string) => {
     setInputText(text);
     setShowExamples(false);
+    sendRevision(text);
   };
 
   return (
@@ -161,11 +230,22 @@ export default function DetectorPage() {
 
             <textarea
               value={inputText}
-              onChange={(e) => setInputText(e.target.value)}
+              onChange={(e) => handleInputChange(e.target.value)}
               placeholder="Enter or paste text here to analyze for cyberbullying content..."
               className="input-field h-40 resize-none mb-4"
             />
 
+            {live && (
+              <div className="mb-4 flex items-center gap-2 text-sm text-gray-400">
+                <div className="w-3 h-3 border-2 border-white/30 border-t-white rounded-full animate-spin" />
+                <span>
+                  {live.stage === 'keyword' ? 'Keyword check' : 'Local model'}:{' '}
+                  <span className={live.is_bullying ? 'text-red-400' : 'text-emerald-400'}>{live.label}</span>
+                  {live.confidence != null && ` (${Math.round(live.confidence * 100)}%)`}
+                </span>
+              </div>
+            )}
+
             <div className="flex gap-3">
               <button
                 onClick={handleAnalyze}
@@ -49,6 +49,8 @@ interface Post {
   confidence?: number;
   likes: string[];
   commentCount: number;
+  imageUrl?: string | null;
+  imageVariants?: { [size: string]: string } | null;
 }
 
 interface SearchResult {
@@ -127,6 +129,71 @@ export default function FeedPage() {
     }
   }, [user, fetchPosts]);
 
+  // Live updates: apply server-sent events instead of refetching the feed.
+  // EventSource reconnects by itself and resumes from the last event id; the
+  // server sends "reset" when events were missed and a full refetch is needed.
+  useEffect(() => {
+    if (!user) return;
+    const source = new EventSource(`${API_BASE}/api/events`);
+
+    source.addEventListener("post_created", (e) => {
+      const post: Post = JSON.parse((e as MessageEvent).data);
+      setPosts((prev) => (prev.some((p) => p.id === post.id) ? prev : [post, ...prev]));
+    });
+
+    source.addEventListener("comment_added", (e) => {
+      const { postId, comment } = JSON.parse((e as MessageEvent).data) as { postId: string; comment: Comment };
+      setPosts((prev) =>
+        prev.map((p) => (p.id === postId ? { ...p, commentCount: p.commentCount + 1 } : p))
+      );
+      setComments((prev) =>
+        prev[postId] && !prev[postId].some((c) => c.id === comment.id)
+          ? { ...prev, [postId]: [...prev[postId], comment] }
+          : prev
+      );
+    });
+
+    source.addEventListener("comment_deleted", (e) => {
+      const { postId, commentId } = JSON.parse((e as MessageEvent).data);
+      setPosts((prev) =>
+        prev.map((p) => (p.id === postId ? { ...p, commentCount: Math.max(0, p.commentCount - 1) } : p))
+      );
+      setComments((prev) =>
+        prev[postId] ? { ...prev, [postId]: prev[postId].filter((c) => c.id !== commentId) } : prev
+      );
+    });
+
+    source.addEventListener("comment_reclassified", (e) => {
+      const { postId, commentId, isBullying, bullyingType } = JSON.parse((e as MessageEvent).data);
+      setComments((prev) =>
+        prev[postId]
+          ? {
+              ...prev,
+              [postId]: prev[postId].map((c) =>
+                c.id === commentId ? { ...c, isBullying, bullyingType: bullyingType ?? undefined } : c
+              ),
+            }
+          : prev
+      );
+    });
+
+    source.addEventListener("likes_changed", (e) => {
+      const { postId, likes } = JSON.parse((e as MessageEvent).data);
+      setPosts((prev) => prev.map((p) => (p.id === postId ? { ...p, likes } : p)));
+    });
+
+    source.addEventListener("post_image_ready", (e) => {
+      const { postId, imageUrl, imageVariants } = JSON.parse((e as MessageEvent).data);
+      setPosts((prev) => prev.map((p) => (p.id === postId ? { ...p, imageUrl, imageVariants } : p)));
+    });
+
+    source.addEventListener("reset", () => {
+      fetchPosts();
+    });
+
+    return () => source.close();
+  }, [user, fetchPosts]);
+
   const fetchComments = async (postId: string) => {
     setLoadingComments((prev) => ({ ...prev, [postId]: true }));
     try {
@@ -155,6 +222,8 @@ export default function FeedPage() {
         { headers: { Authorization: `Bearer ${token}` } }
       );
       setNewPost("");
+      // Don't rely on the post_created event for our own post: the stream
+      // may be reconnecting or attached to another worker
       fetchPosts();
       // Refresh user data to get updated reputation
       fetchUserData();
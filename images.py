@@ -0,0 +1,121 @@
+"""
+Background image pipeline for post uploads.
+
+`database.create_post` copies the upload into a spooled temporary file and
+returns; a worker thread then decodes it once, applies the EXIF orientation,
+and encodes resized WebP variants:
+
+    thumb   IMAGE_THUMB_SIZE px   (default 320)  small previews
+    feed    IMAGE_FEED_SIZE px    (default 960)  what feeds show
+    full    IMAGE_FULL_SIZE px    (default 2048) opened on demand
+
+Sizes are the longest side; images are never upscaled. Variants are encoded
+from pixel data only, so EXIF (including GPS), XMP and comments are dropped;
+the ICC colour profile is kept. The original file is never stored.
+
+Each variant is streamed to file storage from memory and the callback given to
+submit() receives {variant: url}, or None when the upload is not a readable image.
+"""
+
+import io
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from PIL import Image, ImageOps
+
+from logging_config import get_logger
+from metrics import QUEUE_DEPTH, STAGE_LATENCY
+
+logger = get_logger(__name__)
+
+IMAGE_VARIANTS = {
+    "full": int(os.getenv("IMAGE_FULL_SIZE", "2048")),
+    "feed": int(os.getenv("IMAGE_FEED_SIZE", "960")),
+    "thumb": int(os.getenv("IMAGE_THUMB_SIZE", "320")),
+}
+IMAGE_WEBP_QUALITY = int(os.getenv("IMAGE_WEBP_QUALITY", "80"))
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+# Uploads larger than this are spooled to disk instead of kept in memory
+IMAGE_SPOOL_BYTES = 4 * 1024 * 1024
+
+# Refuse decompression bombs instead of only warning about them
+Image.MAX_IMAGE_PIXELS = int(os.getenv("IMAGE_MAX_PIXELS", "50000000"))
+
+_executor = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix="image-pipeline")
+
+
+def spool_upload(file) -> tempfile.SpooledTemporaryFile:
+    """Copy an upload (file object or bytes) so the caller can return before it is processed."""
+    spooled = tempfile.SpooledTemporaryFile(max_size=IMAGE_SPOOL_BYTES)
+    if hasattr(file, "read"):
+        if hasattr(file, "seek"):
+            file.seek(0)
+        shutil.copyfileobj(file, spooled, 1024 * 1024)
+    else:
+        spooled.write(bytes(file))
+    spooled.seek(0)
+    return spooled
+
+
+def _encode(image: Image.Image, icc_profile: Optional[bytes]) -> bytes:
+    out = io.BytesIO()
+    options = {"quality": IMAGE_WEBP_QUALITY, "method": 4}
+    if icc_profile:
+        options["icc_profile"] = icc_profile
+    image.save(out, "WEBP", **options)
+    return out.getvalue()
+
+
+def render_variants(source) -> Dict[str, bytes]:
+    """Decode an image once and return {variant: WebP bytes}, largest first."""
+    largest = max(IMAGE_VARIANTS.values())
+    with Image.open(source) as image:
+        # Let the JPEG decoder scale down while decoding when the image is huge
+        image.draft("RGB", (largest, largest))
+        icc_profile = image.info.get("icc_profile")
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info or image.mode in ("LA", "PA") else "RGB")
+
+        variants = {}
+        # Each variant is resized from the previous (larger) one, not the original
+        for name, size in sorted(IMAGE_VARIANTS.items(), key=lambda item: item[1], reverse=True):
+            if max(image.size) > size:
+                image = image.copy()
+                image.thumbnail((size, size), Image.Resampling.LANCZOS)
+            variants[name] = _encode(image, icc_profile)
+        return variants
+
+
+def _process(post_id: str, spooled, upload: Callable, on_ready: Callable):
+    QUEUE_DEPTH.dec("image_pipeline")
+    urls = None
+    start = time.perf_counter()
+    try:
+        with spooled:
+            variants = render_variants(spooled)
+        base = f"posts/{post_id}/{int(time.time())}"
+        urls = {name: upload(f"{base}-{name}.webp", io.BytesIO(data)) for name, data in variants.items()}
+        STAGE_LATENCY.observe(time.perf_counter() - start, "image_pipeline")
+    except Exception as e:
+        logger.warning("Image processing failed", extra={"fields": {"post_id": post_id, "error": str(e)}})
+    try:
+        on_ready(post_id, urls)
+    except Exception as e:
+        logger.error("Could not save image variants", extra={"fields": {"post_id": post_id, "error": str(e)}})
+
+
+def submit(post_id: str, file, upload: Callable, on_ready: Callable):
+    """
+    Queue an uploaded image for processing.
+
+    upload(path, fileobj) stores one variant and returns its URL;
+    on_ready(post_id, urls) is called from the worker thread when done.
+    """
+    spooled = spool_upload(file)
+    QUEUE_DEPTH.inc("image_pipeline")
+    _executor.submit(_process, post_id, spooled, upload, on_ready)
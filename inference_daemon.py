@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+Local inference daemon for the CyberGuard model.
+
+Owns a single copy of the model and serves it over a Unix domain socket, so
+the FastAPI backend and the Streamlit app on the same host share one model and
+one cold start. Requests from all clients are collected into batches before
+they run through the model.
+
+Start the daemon, then point the clients at it with `INFERENCE_SOCKET`:
+    python inference_daemon.py --socket /tmp/cyberguard-inference.sock
+    INFERENCE_SOCKET=/tmp/cyberguard-inference.sock python -m uvicorn api.main:app
+
+Protocol (all integers big-endian):
+    request:  u32 frame length | u16 text count | (u32 length, UTF-8 bytes) per text
+    response: u32 frame length | u8 status | status 0: u16 rows, u8 classes, f32 probabilities
+                                           | status 1: UTF-8 error message
+"""
+
+import argparse
+import os
+import queue
+import socket
+import socketserver
+import struct
+import threading
+import time
+from typing import List
+
+from metrics import BATCH_SIZE, QUEUE_DEPTH, start_metrics_server
+
+MAX_FRAME_BYTES = 4 * 1024 * 1024
+# The text count is a u16; InferenceClient splits larger lists into several requests
+MAX_REQUEST_TEXTS = 0xFFFF
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+_U32 = struct.Struct("!I")
+_U16 = struct.Struct("!H")
+
+
+class InferenceError(Exception):
+    """The daemon is up but could not classify this request (a status 1 reply)."""
+
+
+def _recv_exact(sock, size: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = sock.recv(size - len(buf))
+        if not chunk:
+            raise ConnectionError("Connection closed by peer")
+        buf += chunk
+    return bytes(buf)
+
+
+def _recv_frame(sock) -> bytes:
+    (length,) = _U32.unpack(_recv_exact(sock, 4))
+    if length > MAX_FRAME_BYTES:
+        raise ValueError(f"Frame too large ({length} bytes)")
+    return _recv_exact(sock, length)
+
+
+def _send_frame(sock, payload: bytes):
+    sock.sendall(_U32.pack(len(payload)) + payload)
+
+
+def encode_request(texts: List[str]) -> bytes:
+    parts = [_U16.pack(len(texts))]
+    for text in texts:
+        data = text.encode("utf-8")
+        parts.append(_U32.pack(len(data)))
+        parts.append(data)
+    return b"".join(parts)
+
+
+def split_request(texts: List[str]) -> List[List[str]]:
+    """Split texts into chunks that each fit one request (text count and frame size)."""
+    chunks, chunk, size = [], [], _U16.size
+    for text in texts:
+        length = _U32.size + len(text.encode("utf-8"))
+        if chunk and (len(chunk) == MAX_REQUEST_TEXTS or size + length > MAX_FRAME_BYTES):
+            chunks.append(chunk)
+            chunk, size = [], _U16.size
+        chunk.append(text)
+        size += length
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def decode_request(payload: bytes) -> List[str]:
+    (count,) = _U16.unpack_from(payload, 0)
+    offset = 2
+    texts = []
+    for _ in range(count):
+        (length,) = _U32.unpack_from(payload, offset)
+        offset += 4
+        texts.append(payload[offset:offset + length].decode("utf-8"))
+        offset += length
+    return texts
+
+
+def encode_response(rows: List[List[float]]) -> bytes:
+    classes = len(rows[0]) if rows else 0
+    values = [value for row in rows for value in row]
+    return (bytes([STATUS_OK]) + _U16.pack(len(rows)) + bytes([classes])
+            + struct.pack(f"!{len(values)}f", *values))
+
+
+def decode_response(payload: bytes) -> List[List[float]]:
+    if payload[0] != STATUS_OK:
+        raise InferenceError(f"Inference daemon error: {payload[1:].decode('utf-8', 'replace')}")
+    (rows,) = _U16.unpack_from(payload, 1)
+    classes = payload[3]
+    values = struct.unpack_from(f"!{rows * classes}f", payload, 4)
+    return [list(values[i * classes:(i + 1) * classes]) for i in range(rows)]
+
+
+class InferenceClient:
+    """Client used by `detector` to query the daemon.
+
+    Keeps one persistent connection per thread and reconnects once if the
+    daemon restarted in between calls.
+    """
+
+    def __init__(self, path: str, timeout: float = 10.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.path)
+        self._local.sock = sock
+        return sock
+
+    def _close(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+        self._local.sock = None
+
+    def predict(self, texts: List[str]) -> List[List[float]]:
+        """Return one probability row (in `CLASS_LABELS` order) per text."""
+        rows = []
+        for chunk in split_request(texts):
+            rows.extend(self._request(chunk))
+        return rows
+
+    def _request(self, texts: List[str]) -> List[List[float]]:
+        request = encode_request(texts)
+        for attempt in range(2):
+            sock = getattr(self._local, "sock", None) or self._connect()
+            try:
+                _send_frame(sock, request)
+                return decode_response(_recv_frame(sock))
+            except (ConnectionError, BrokenPipeError):
+                self._close()
+                if attempt:
+                    raise
+            except (OSError, ValueError, struct.error):
+                self._close()
+                raise
+            # InferenceError leaves the connection usable: the reply was read in full
+
+
+class _PendingRequest:
+    __slots__ = ("texts", "done", "rows", "error")
+
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.done = threading.Event()
+        self.rows = None
+        self.error = None
+
+
+class Batcher:
+    """Collects requests from all connections and runs them through the model together."""
+
+    def __init__(self, predict_batch, max_batch: int = 32, max_wait_ms: float = 5.0):
+        self.predict_batch = predict_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="inference-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, texts: List[str]) -> List[List[float]]:
+        pending = _PendingRequest(texts)
+        QUEUE_DEPTH.inc("inference_daemon", amount=len(texts))
+        self.queue.put(pending)
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.rows
+
+    def _collect(self) -> List[_PendingRequest]:
+        batch = [self.queue.get()]
+        size = len(batch[0].texts)
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                pending = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(pending)
+            size += len(pending.texts)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            texts = [text for pending in batch for text in pending.texts]
+            QUEUE_DEPTH.dec("inference_daemon", amount=len(texts))
+            BATCH_SIZE.observe(len(texts), "inference_daemon")
+            try:
+                rows = self.predict_batch(texts)
+            except Exception as e:
+                for pending in batch:
+                    pending.error = e
+                    pending.done.set()
+                continue
+            offset = 0
+            for pending in batch:
+                pending.rows = rows[offset:offset + len(pending.texts)]
+                offset += len(pending.texts)
+                pending.done.set()
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        while True:
+            try:
+                texts = decode_request(_recv_frame(self.request))
+            except (ConnectionError, OSError):
+                return
+            except (ValueError, struct.error, UnicodeDecodeError) as e:
+                _send_frame(self.request, bytes([STATUS_ERROR]) + str(e).encode("utf-8"))
+                return
+            try:
+                rows = self.server.batcher.submit(texts) if texts else []
+                payload = encode_response(rows)
+            except Exception as e:
+                payload = bytes([STATUS_ERROR]) + str(e).encode("utf-8")
+            try:
+                _send_frame(self.request, payload)
+            except OSError:
+                return
+
+
+class InferenceServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: str, batcher: Batcher):
+        self.batcher = batcher
+        super().__init__(path, _Handler)
+
+
+def _model_predict_batch(texts: List[str]) -> List[List[float]]:
+    import detector
+    if detector.model is None:
+        raise RuntimeError("Model is not loaded")
+    # Clients send texts that detector already folded
+    results = detector._predict_folded_batch(texts)
+    return [[probs[label] for label in detector.CLASS_LABELS] for probs in results]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CyberGuard local inference daemon")
+    parser.add_argument("--socket", default=os.getenv("INFERENCE_SOCKET") or "/tmp/cyberguard-inference.sock",
+                        help="Path of the Unix domain socket to serve on")
+    parser.add_argument("--max-batch", type=int, default=32, help="Maximum texts per model batch")
+    parser.add_argument("--max-wait-ms", type=float, default=5.0,
+                        help="How long to wait for more requests before running a batch")
+    parser.add_argument("--metrics-port", type=int, default=int(os.getenv("INFERENCE_METRICS_PORT", "0")),
+                        help="Serve Prometheus metrics on this localhost port (0 disables)")
+    args = parser.parse_args()
+
+    # The daemon always runs the model in-process. An empty value keeps
+    # load_dotenv from re-reading INFERENCE_SOCKET out of .env.
+    os.environ["INFERENCE_SOCKET"] = ""
+    import detector
+    if detector.model is None:
+        raise SystemExit("Model could not be loaded; the inference daemon needs the local model")
+
+    if os.path.exists(args.socket):
+        os.unlink(args.socket)
+
+    if args.metrics_port:
+        start_metrics_server(args.metrics_port)
+        print(f"Metrics on http://127.0.0.1:{args.metrics_port}/metrics")
+
+    batcher = Batcher(_model_predict_batch, max_batch=args.max_batch, max_wait_ms=args.max_wait_ms)
+    server = InferenceServer(args.socket, batcher)
+    os.chmod(args.socket, 0o660)
+    print(f"Inference daemon listening on {args.socket} (max batch {args.max_batch}, "
+          f"max wait {args.max_wait_ms}ms)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.unlink(args.socket)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+End-to-end HTTP load test for the CyberGuard API.
+
+Starts `api.main:app` under uvicorn against the in-memory Firebase stand-in
+(STORAGE_BACKEND=memory) or a throwaway SQLite database and the fake Groq server, seeds users and posts,
+then drives a realistic mix of feed reads, comment reads/posts, likes and
+user searches at each concurrency level. Reports latency percentiles, error
+rates and throughput per endpoint. Everything runs on localhost.
+
+Reads behave like a browser: each worker remembers the ETag of every path it
+fetched and revalidates with If-None-Match, and accepts gzip. `bytes` is what
+went over the wire (compressed size, 0 for a 304). When the script started the
+server itself it also reports the server's CPU time per request, and it lifts
+the per-client rate limits (every worker is 127.0.0.1). 429s are counted
+separately from errors.
+
+Usage:
+    python loadtest.py --concurrency 1,8,32 --duration 20 -o loadtest.json
+    python loadtest.py --storage sqlite --concurrency 8
+    python loadtest.py --url http://127.0.0.1:8000 --concurrency 16   # existing server
+    python loadtest.py --no-conditional --no-compression   # baseline without ETags or gzip
+"""
+
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+
+import requests
+
+from benchmark import CORPUS, percentile, _git_commit
+
+# Relative weight of each operation in the traffic mix
+DEFAULT_MIX = {
+    "feed": 50,
+    "comments": 20,
+    "comment_post": 12,
+    "like": 12,
+    "search": 6,
+}
+
+BENIGN_COMMENTS = [
+    "Love this!", "Great post, thanks for sharing", "Congrats!", "So true",
+    "Where was this taken?", "Haha nice one", "Can't wait for the next one",
+]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port: int, groq_url: str, extra_env: dict = None) -> subprocess.Popen:
+    """Start the API in a subprocess wired to the in-memory stand-ins."""
+    env = dict(os.environ)
+    env.update({
+        "STORAGE_BACKEND": "memory",
+        "GROQ_API_URL": groq_url,
+        "GROQ_API_KEY": "fake-loadtest-key",
+        "JWT_SECRET": "loadtest-secret",
+        # Never reach out to HuggingFace; use the cached model or the keyword fallback
+        "HF_HUB_OFFLINE": "1",
+        "TRANSFORMERS_OFFLINE": "1",
+        # All simulated users share 127.0.0.1, so the per-client limits would
+        # otherwise turn most writes into 429s and measure the limiter instead
+        "COMMENT_RATE_PER_MINUTE": "1000000000",
+        "COMMENT_BURST": "1000000000",
+        "CLASSIFY_RATE_PER_MINUTE": "1000000000",
+        "CLASSIFY_BURST": "1000000000",
+    })
+    env.update(extra_env or {})
+    root = os.path.dirname(os.path.abspath(__file__))
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api.main:app", "--host", "127.0.0.1",
+         "--port", str(port), "--log-level", "warning", "--no-access-log"],
+        cwd=root, env=env
+    )
+
+
+def process_cpu_seconds(pid: int):
+    """User + system CPU time of a local process from /proc, or None where unavailable."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            # The command name may contain spaces; the fields after it are fixed
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def wait_until_ready(base_url: str, timeout: float = 300.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f"{base_url}/api/health", timeout=2).ok:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    raise SystemExit(f"API at {base_url} did not become ready within {timeout:.0f}s")
+
+
+def seed(base_url: str, users: int, posts_per_user: int) -> dict:
+    """Create users and posts through the public API; returns tokens and ids."""
+    session = requests.Session()
+    state = {"users": [], "posts": []}
+    run_id = random.randint(0, 1_000_000)
+    for i in range(users):
+        username = f"loaduser{run_id}_{i}"
+        resp = session.post(f"{base_url}/api/auth/signup", json={
+            "email": f"{username}@example.com", "password": "loadtest-pass", "username": username
+        })
+        resp.raise_for_status()
+        data = resp.json()
+        state["users"].append({"token": data["access_token"], "id": data["user"]["id"], "username": username})
+
+    for user in state["users"]:
+        headers = {"Authorization": f"Bearer {user['token']}"}
+        for j in range(posts_per_user):
+            resp = session.post(f"{base_url}/api/posts", headers=headers,
+                                json={"content": f"Post {j} from {user['username']}"})
+            resp.raise_for_status()
+            state["posts"].append(resp.json()["id"])
+    return state
+
+
+class Worker(threading.Thread):
+    """Issues requests in a loop until the stop event is set."""
+
+    def __init__(self, base_url, state, mix, stop, bullying_rate, conditional=True, compression=True):
+        super().__init__(daemon=True)
+        self.base_url = base_url
+        self.state = state
+        self.ops = list(mix)
+        self.weights = [mix[op] for op in self.ops]
+        self.stop = stop
+        self.bullying_rate = bullying_rate
+        self.session = requests.Session()
+        if not compression:
+            self.session.headers["Accept-Encoding"] = "identity"
+        self.conditional = conditional
+        self.etags = {}  # path -> last ETag seen
+        self.samples = []  # (endpoint, status, latency_s, bytes)
+        self.rng = random.Random()
+
+    def _request(self, endpoint, method, path, **kwargs):
+        revalidate = self.conditional and method == "GET" and path in self.etags
+        if revalidate:
+            kwargs["headers"] = {**kwargs.get("headers", {}), "If-None-Match": self.etags[path]}
+        start = time.perf_counter()
+        try:
+            resp = self.session.request(method, f"{self.base_url}{path}", timeout=60, **kwargs)
+            latency = time.perf_counter() - start
+            if method == "GET" and resp.headers.get("ETag"):
+                self.etags[path] = resp.headers["ETag"]
+            # Content-Length is the size on the wire; resp.content is already decompressed
+            wire_bytes = int(resp.headers.get("Content-Length", len(resp.content)))
+            self.samples.append((endpoint, resp.status_code, latency, wire_bytes))
+        except requests.RequestException:
+            self.samples.append((endpoint, 0, time.perf_counter() - start, 0))
+
+    def run(self):
+        users, posts = self.state["users"], self.state["posts"]
+        while not self.stop.is_set():
+            op = self.rng.choices(self.ops, self.weights)[0]
+            user = self.rng.choice(users)
+            auth = {"Authorization": f"Bearer {user['token']}"}
+            post_id = self.rng.choice(posts)
+            if op == "feed":
+                self._request("GET /api/posts", "GET", "/api/posts")
+            elif op == "comments":
+                self._request("GET /api/posts/{id}/comments", "GET", f"/api/posts/{post_id}/comments")
+            elif op == "comment_post":
+                if self.rng.random() < self.bullying_rate:
+                    text = self.rng.choice(CORPUS)
+                else:
+                    text = self.rng.choice(BENIGN_COMMENTS)
+                self._request("POST /api/posts/{id}/comments", "POST", f"/api/posts/{post_id}/comments",
+                              headers=auth, json={"content": text})
+            elif op == "like":
+                self._request("POST /api/posts/{id}/like", "POST", f"/api/posts/{post_id}/like", headers=auth)
+            elif op == "search":
+                query = self.rng.choice(users)["username"][:10]
+                self._request("GET /api/users/search", "GET", "/api/users/search",
+                              headers=auth, params={"q": query})
+
+
+def summarize_samples(samples: list, elapsed: float) -> dict:
+    by_endpoint = defaultdict(list)
+    for sample in samples:
+        by_endpoint[sample[0]].append(sample)
+    by_endpoint["ALL"] = samples
+
+    report = {}
+    for endpoint, rows in sorted(by_endpoint.items()):
+        latencies = sorted(row[2] for row in rows)
+        statuses = defaultdict(int)
+        for row in rows:
+            statuses[str(row[1])] += 1
+        # 429s are the rate limiter doing its job (e.g. against a --url server), not failures
+        rate_limited = statuses.get("429", 0)
+        errors = sum(1 for row in rows if row[1] == 0 or row[1] >= 400) - rate_limited
+        transferred = sum(row[3] for row in rows)
+        report[endpoint] = {
+            "requests": len(rows),
+            "errors": errors,
+            "error_rate": errors / len(rows) if rows else 0.0,
+            "rate_limited": rate_limited,
+            "rate_limited_rate": rate_limited / len(rows) if rows else 0.0,
+            "throughput_rps": len(rows) / elapsed if elapsed else 0.0,
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p95_ms": percentile(latencies, 95) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+            "bytes": transferred,
+            "bytes_per_request": transferred / len(rows) if rows else 0.0,
+            "not_modified_rate": statuses.get("304", 0) / len(rows) if rows else 0.0,
+            "statuses": dict(statuses),
+        }
+    return report
+
+
+def run_level(base_url, state, concurrency, duration, mix, bullying_rate,
+              conditional=True, compression=True, server_pid=None) -> dict:
+    stop = threading.Event()
+    workers = [Worker(base_url, state, mix, stop, bullying_rate, conditional, compression)
+               for _ in range(concurrency)]
+    cpu_before = process_cpu_seconds(server_pid) if server_pid else None
+    started = time.monotonic()
+    for worker in workers:
+        worker.start()
+    time.sleep(duration)
+    stop.set()
+    for worker in workers:
+        worker.join()
+    elapsed = time.monotonic() - started
+    samples = [sample for worker in workers for sample in worker.samples]
+    report = summarize_samples(samples, elapsed)
+    cpu_after = process_cpu_seconds(server_pid) if server_pid else None
+    if cpu_before is not None and cpu_after is not None:
+        cpu = cpu_after - cpu_before
+        report["ALL"]["server_cpu_seconds"] = cpu
+        report["ALL"]["server_cpu_ms_per_request"] = cpu * 1000 / len(samples) if samples else 0.0
+    return report
+
+
+def print_level(concurrency: int, report: dict):
+    print(f"\nconcurrency={concurrency}", file=sys.stderr)
+    print(f"{'endpoint':<34}{'req':>7}{'err%':>7}{'429%':>7}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+          f"{'304%':>7}{'B/req':>9}", file=sys.stderr)
+    for endpoint, stats in report.items():
+        print(f"{endpoint:<34}{stats['requests']:>7}{stats['error_rate'] * 100:>6.1f}%"
+              f"{stats['rate_limited_rate'] * 100:>6.1f}%{stats['throughput_rps']:>9.1f}{stats['p50_ms']:>9.1f}{stats['p95_ms']:>9.1f}"
+              f"{stats['p99_ms']:>9.1f}{stats['not_modified_rate'] * 100:>6.1f}%"
+              f"{stats['bytes_per_request']:>9.0f}", file=sys.stderr)
+    if "server_cpu_seconds" in report.get("ALL", {}):
+        print(f"server CPU: {report['ALL']['server_cpu_seconds']:.2f}s "
+              f"({report['ALL']['server_cpu_ms_per_request']:.2f} ms/request)", file=sys.stderr)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the CyberGuard API")
+    parser.add_argument("--url", help="Test an already running API instead of starting one")
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma-separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per concurrency level")
+    parser.add_argument("--users", type=int, default=20, help="Users to seed")
+    parser.add_argument("--posts-per-user", type=int, default=3, help="Posts to seed per user")
+    parser.add_argument("--mix", default=",".join(f"{k}={v}" for k, v in DEFAULT_MIX.items()),
+                        help="Traffic mix as op=weight pairs")
+    parser.add_argument("--bullying-rate", type=float, default=0.1,
+                        help="Fraction of posted comments taken from the bullying corpus")
+    parser.add_argument("--storage", choices=["memory", "sqlite"], default="memory",
+                        help="Storage backend for the started API")
+    parser.add_argument("--groq-latency-ms", type=float, default=250.0, help="Fake Groq mean latency")
+    parser.add_argument("--groq-error-rate", type=float, default=0.0, help="Fake Groq 500 rate")
+    parser.add_argument("--no-conditional", action="store_true",
+                        help="Do not revalidate with If-None-Match (every read gets a full body)")
+    parser.add_argument("--no-compression", action="store_true",
+                        help="Send Accept-Encoding: identity")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed for seeding data")
+    parser.add_argument("-o", "--output", help="Write the JSON report here")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    random.seed(args.seed)
+    mix = {}
+    for item in args.mix.split(","):
+        op, weight = item.split("=")
+        if op not in DEFAULT_MIX:
+            raise SystemExit(f"Unknown operation '{op}' (choose from {', '.join(DEFAULT_MIX)})")
+        mix[op] = float(weight)
+
+    server = None
+    groq = None
+    if args.url:
+        base_url = args.url.rstrip("/")
+    else:
+        from fake_groq import start_fake_groq
+        groq = start_fake_groq(latency_ms=args.groq_latency_ms, jitter_ms=args.groq_latency_ms / 10,
+                               error_rate=args.groq_error_rate)
+        port = _free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        extra_env = {}
+        if args.storage == "sqlite":
+            tmp_dir = tempfile.mkdtemp(prefix="cyberguard-loadtest-")
+            extra_env = {
+                "STORAGE_BACKEND": "sqlite",
+                "SQLITE_PATH": os.path.join(tmp_dir, "loadtest.db"),
+                "MEDIA_ROOT": os.path.join(tmp_dir, "media"),
+            }
+        server = start_server(port, groq.url, extra_env)
+
+    try:
+        wait_until_ready(base_url)
+        state = seed(base_url, args.users, args.posts_per_user)
+        results = {
+            "commit": _git_commit(),
+            "timestamp": datetime.utcnow().isoformat(),
+            "config": {k: v for k, v in vars(args).items() if k != "output"},
+            "levels": {},
+        }
+        for level in [int(c) for c in args.concurrency.split(",") if c.strip()]:
+            report = run_level(base_url, state, level, args.duration, mix, args.bullying_rate,
+                               conditional=not args.no_conditional, compression=not args.no_compression,
+                               server_pid=server.pid if server is not None else None)
+            results["levels"][str(level)] = report
+            print_level(level, report)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+        if groq is not None:
+            groq.shutdown()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Structured, non-blocking logging for CyberGuard.
+
+Log calls only put a record on an in-memory queue; a background listener
+thread formats and writes it, so request handlers never wait on stdout.
+User text is never logged verbatim unless LOG_TEXT_MODE=full.
+
+    from logging_config import get_logger, text_fields, classification_sampler
+    logger = get_logger(__name__)
+    logger.warning("Groq API rate limited", extra={"fields": {"status": 429}})
+
+Environment:
+    LOG_LEVEL                          DEBUG, INFO (default), WARNING, ...
+    LOG_FORMAT                         text (default) or json
+    LOG_TEXT_MODE                      hash (default), redact or full
+    LOG_CLASSIFICATION_SAMPLE_RATE     Fraction of classifications logged (default 0.01)
+    LOG_CLASSIFICATION_MAX_PER_SECOND  Upper bound on classification lines (default 10)
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+
+from normalize import normalize
+
+load_dotenv()
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+LOG_TEXT_MODE = os.getenv("LOG_TEXT_MODE", "hash").lower()
+
+
+class StructuredFormatter(logging.Formatter):
+    """Formats records with the dict passed as `extra={"fields": {...}}`."""
+
+    def __init__(self, as_json: bool = False):
+        super().__init__()
+        self.as_json = as_json
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = getattr(record, "fields", None) or {}
+        if self.as_json:
+            entry = {
+                "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+                "level": record.levelname,
+                "logger": record.name,
+                "msg": record.getMessage(),
+            }
+            entry.update(fields)
+            if record.exc_info:
+                entry["exc"] = self.formatException(record.exc_info)
+            return json.dumps(entry, default=str)
+
+        line = f"{self.formatTime(record)} {record.levelname:<7} {record.name}: {record.getMessage()}"
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class _Pipeline:
+    """Queue handler on the logging side, listener thread on the output side."""
+
+    def __init__(self):
+        self.handler = logging.handlers.QueueHandler(queue.SimpleQueue())
+        self.listener = None
+
+    def start(self):
+        output = logging.StreamHandler(sys.stderr)
+        output.setFormatter(StructuredFormatter(as_json=LOG_FORMAT == "json"))
+        self.listener = logging.handlers.QueueListener(self.handler.queue, output, respect_handler_level=False)
+        self.listener.start()
+
+    def stop(self):
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+    def after_fork(self):
+        # The listener thread does not survive fork(); give the child its own
+        # queue and thread so records are not left piling up unread.
+        self.handler.queue = queue.SimpleQueue()
+        self.listener = None
+        self.start()
+
+
+_pipeline = None
+_configure_lock = threading.Lock()
+
+
+def configure_logging():
+    """Route the root logger through the background queue (idempotent)."""
+    global _pipeline
+    with _configure_lock:
+        if _pipeline is not None:
+            return
+        _pipeline = _Pipeline()
+        _pipeline.start()
+        root = logging.getLogger()
+        root.handlers[:] = [_pipeline.handler]
+        root.setLevel(LOG_LEVEL)
+        atexit.register(_pipeline.stop)
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=_pipeline.after_fork)
+
+
+def get_logger(name: str) -> logging.Logger:
+    configure_logging()
+    return logging.getLogger(name)
+
+
+def text_fields(text: str) -> dict:
+    """Describe user text for a log line without leaking it (see LOG_TEXT_MODE)."""
+    if text is None:
+        return {"text_len": 0}
+    if LOG_TEXT_MODE == "full":
+        return {"text": text, "text_len": len(text)}
+    if LOG_TEXT_MODE == "redact":
+        return {"text_len": len(text)}
+    # Same key the caches use, shortened; equal after normalization means equal hash
+    return {"text_hash": normalize(text).key[:16], "text_len": len(text)}
+
+
+class Sampler:
+    """Lets through a random fraction of events, capped at a rate per second."""
+
+    def __init__(self, rate: float, max_per_second: float):
+        self.rate = rate
+        self.max_per_second = max_per_second
+        self._tokens = max_per_second
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def __call__(self) -> bool:
+        if self.rate <= 0 or random.random() >= self.rate:
+            return False
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.max_per_second, self._tokens + (now - self._last) * self.max_per_second)
+            self._last = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+classification_sampler = Sampler(
+    float(os.getenv("LOG_CLASSIFICATION_SAMPLE_RATE", "0.01")),
+    float(os.getenv("LOG_CLASSIFICATION_MAX_PER_SECOND", "10")),
+)
@@ -0,0 +1,259 @@
+"""
+Prometheus metrics for CyberGuard.
+
+A small in-process registry that renders the Prometheus text exposition
+format, so the hot path does not need an extra dependency. Recording is one
+dict lookup, a bisect and a lock-protected add. Metrics are per process: with
+serve.py every worker reports its own series.
+
+    from metrics import STAGE_LATENCY
+    with STAGE_LATENCY.time("keyword"):
+        ...
+"""
+
+import bisect
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Latency buckets in seconds, from sub-millisecond keyword scans to slow Groq calls
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+TOKEN_BUCKETS = (8, 16, 32, 64, 128, 256, 512, 1024, 2048)
+
+_registry = []
+
+
+def _format_labels(names: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _header(self) -> list:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0.0)
+
+    def render(self) -> list:
+        lines = self._header()
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[tuple, float] = {}
+
+    def set(self, value: float, *labels):
+        self._values[labels] = value
+
+    def inc(self, *labels, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def dec(self, *labels, amount: float = 1.0):
+        self.inc(*labels, amount=-amount)
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0.0)
+
+    def render(self) -> list:
+        lines = self._header()
+        for labels, value in list(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+        return False
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [bucket counts..., +Inf count, sum]
+        self._values: Dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                series = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def time(self, *labels) -> _Timer:
+        """Context manager that observes the elapsed wall time."""
+        return _Timer(self, labels)
+
+    def render(self) -> list:
+        lines = self._header()
+        with self._lock:
+            items = [(labels, list(series)) for labels, series in self._values.items()]
+        for labels, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = f'le="{_format_value(bound) if bound != float("inf") else "+Inf"}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+def render() -> str:
+    """Render every registered metric in the Prometheus text format."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serve /metrics on a background thread (for processes without an HTTP app)."""
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
+
+
+# ============================================
+# CyberGuard metrics
+# ============================================
+
+STAGE_LATENCY = Histogram(
+    "cyberguard_stage_latency_seconds",
+    "Latency of each classification stage (keyword, local_model, groq, classifier_api)",
+    ["stage"],
+)
+FINAL_LABELS = Counter(
+    "cyberguard_final_labels_total",
+    "Final classification labels returned",
+    ["label"],
+)
+GROQ_FALLBACKS = Counter(
+    "cyberguard_groq_fallbacks_total",
+    "Failed Groq calls (answered by the keyword classifier or another provider), by reason",
+    ["reason"],
+)
+GROQ_TOKENS = Histogram(
+    "cyberguard_groq_tokens",
+    "Tokens per Groq call, by kind (prompt or completion)",
+    ["kind"],
+    buckets=TOKEN_BUCKETS,
+)
+ROUTER_DECISIONS = Counter(
+    "cyberguard_router_decisions_total",
+    "Remote provider routing decisions (primary, hedge, hedge_won, failover; provider \"local\" when none answered)",
+    ["provider", "decision"],
+)
+ADMISSION_DECISIONS = Counter(
+    "cyberguard_admission_total",
+    "Classification requests by route and admission decision (full, local, keyword, rate_limited)",
+    ["route", "decision"],
+)
+GROQ_GATE = Counter(
+    "cyberguard_groq_gate_total",
+    "Confidence gate decisions (called_* with the reason, skipped, skipped_shadow)",
+    ["decision"],
+)
+CACHE_REQUESTS = Counter(
+    "cyberguard_cache_requests_total",
+    "Cache lookups by cache and result (hit or miss)",
+    ["cache", "result"],
+)
+BATCH_SIZE = Histogram(
+    "cyberguard_batch_size",
+    "Number of texts per model batch",
+    ["component"],
+    buckets=SIZE_BUCKETS,
+)
+QUEUE_DEPTH = Gauge(
+    "cyberguard_queue_depth",
+    "Items waiting in internal work queues",
+    ["queue"],
+)
+STORAGE_LATENCY = Histogram(
+    "cyberguard_storage_latency_seconds",
+    "Latency of storage backend operations",
+    ["backend", "operation"],
+)
+HTTP_LATENCY = Histogram(
+    "cyberguard_http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+)
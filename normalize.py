@@ -0,0 +1,99 @@
+"""
+Canonical text normalization for CyberGuard.
+
+Every stage works from the same normalized view of a comment, computed once:
+
+    folded        NFKC-normalized, zero-width characters removed and
+                  whitespace collapsed. This is the model input; its own
+                  tokenizer handles case and accents, and Cyrillic or Greek
+                  text stays intact.
+    skeleton      folded, casefolded, with accents removed and look-alike
+                  letters and typographic punctuation mapped to ASCII.
+    deobfuscated  skeleton with leetspeak / symbol substitutions undone
+                  ("$tup1d" -> "stupid").
+    key           Stable hash of the folded text, for cache keys and logs.
+
+The keyword matcher checks skeleton and deobfuscated; keyword lists go
+through skeleton() so both sides use the same form.
+
+    from normalize import normalize
+    norm = normalize(text)
+    norm.folded, norm.skeleton, norm.deobfuscated, norm.key
+"""
+
+import hashlib
+import unicodedata
+from functools import lru_cache
+from typing import NamedTuple
+
+NORMALIZE_CACHE_SIZE = 4096
+
+# Characters that are invisible or only used to break up words: soft hyphen,
+# combining grapheme joiner, Arabic letter mark, Hangul fillers, Khmer vowel
+# inherents, Mongolian vowel separator, zero-width space/joiners, direction
+# marks, word joiner, invisible operators and the byte order mark
+_INVISIBLE = (
+    "\u00ad\u034f\u061c\u115f\u1160\u17b4\u17b5\u180e"
+    "\u200b\u200c\u200d\u200e\u200f\u2060\u2061\u2062\u2063\u2064\ufeff"
+)
+
+# Cyrillic and Greek letters that look like Latin ones, and typographic punctuation
+_CONFUSABLES = {
+    # Cyrillic a, ve, ie, ka, em, en, o, er, es, te, u, ha, i, je, dze, komi de
+    "\u0430": "a", "\u0432": "b", "\u0435": "e", "\u043a": "k", "\u043c": "m", "\u043d": "h",
+    "\u043e": "o", "\u0440": "p", "\u0441": "c", "\u0442": "t", "\u0443": "y", "\u0445": "x",
+    "\u0456": "i", "\u0458": "j", "\u0455": "s", "\u0501": "d",
+    # Greek alpha, epsilon, iota, kappa, omicron, rho, tau, upsilon, chi
+    "\u03b1": "a", "\u03b5": "e", "\u03b9": "i", "\u03ba": "k", "\u03bf": "o", "\u03c1": "p",
+    "\u03c4": "t", "\u03c5": "u", "\u03c7": "x",
+    # Curly quotes, primes and dashes
+    "\u2018": "'", "\u2019": "'", "\u201b": "'", "\u2032": "'", "\u02bc": "'",
+    "\u201c": '"', "\u201d": '"', "\u2013": "-", "\u2014": "-",
+}
+
+_INVISIBLE_TABLE = str.maketrans({ch: None for ch in _INVISIBLE})
+_CONFUSABLES_TABLE = str.maketrans(_CONFUSABLES)
+
+# Leetspeak and symbol substitutions; '*' is dropped ("f*ck" -> "fck")
+_DEOBFUSCATE_TABLE = str.maketrans({
+    "0": "o", "1": "i", "3": "e", "4": "a", "5": "s", "7": "t",
+    "@": "a", "$": "s", "!": "i", "|": "i", "*": None, "_": None,
+})
+
+
+class NormalizedText(NamedTuple):
+    folded: str
+    skeleton: str
+    deobfuscated: str
+    key: str
+
+
+def fold(text: str) -> str:
+    """NFKC-normalize text, drop invisible characters and collapse whitespace."""
+    if not text.isascii():
+        text = unicodedata.normalize("NFKC", text).translate(_INVISIBLE_TABLE)
+    return " ".join(text.split())
+
+
+def skeleton(folded: str) -> str:
+    """Matcher form of already-folded text: casefolded, accents removed, look-alikes mapped to ASCII."""
+    if folded.isascii():
+        return folded.lower()
+    text = folded.casefold().translate(_CONFUSABLES_TABLE)
+    decomposed = unicodedata.normalize("NFD", text)
+    if len(decomposed) != len(text):
+        text = unicodedata.normalize("NFC", "".join(ch for ch in decomposed if not unicodedata.combining(ch)))
+    return text
+
+
+def text_key(folded: str) -> str:
+    """Stable hash of already-folded text (same across processes and restarts)."""
+    return hashlib.blake2b(folded.encode("utf-8", "surrogatepass"), digest_size=16).hexdigest()
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def normalize(text: str) -> NormalizedText:
+    """Normalize text once; repeated calls for the same text are served from a cache."""
+    folded = fold(text or "")
+    matched = skeleton(folded)
+    return NormalizedText(folded, matched, matched.translate(_DEOBFUSCATE_TABLE), text_key(folded))
@@ -0,0 +1,211 @@
+"""
+Opt-in per-request profiling for the CyberGuard API.
+
+An admin sends a request with the header `X-Profile: <ADMIN_TOKEN>` (there is
+no query-parameter form, which would leave the token in access logs). That one
+request runs under a sampling profiler and tracemalloc; the results are
+written to PROFILE_DIR and the response carries an `X-Profile-Id` header. Fetch them from
+`/api/admin/profiles/{id}`.
+
+    <id>.folded   Collapsed stacks, one "frame;frame;frame count" per line.
+                  Feed it to flamegraph.pl, speedscope or inferno.
+    <id>.json     Timing, sample count and the top allocation sites.
+
+Requests without the header only pay for one header lookup.
+"""
+
+import hmac
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+
+from logging_config import get_logger
+
+logger = get_logger(__name__)
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "1"))
+PROFILE_TOP_ALLOCATIONS = 25
+
+_PROFILE_HEADER = b"x-profile"
+
+# Innermost frames of threads that are parked waiting for work; sampling them
+# would only add noise to the flame graph.
+_IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+    ("thread.py", "_worker"),
+    ("socketserver.py", "serve_forever"),
+    ("handlers.py", "dequeue"),
+}
+
+# tracemalloc is process-wide, so only one request is profiled at a time
+_profile_lock = threading.Lock()
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Samples the Python stacks of all busy threads at a fixed interval."""
+
+    def __init__(self, interval_ms: float = PROFILE_INTERVAL_MS):
+        self.interval = interval_ms / 1000.0
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        while not self._stop.wait(self.interval):
+            self.samples += 1
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                code = frame.f_code
+                if (os.path.basename(code.co_filename), code.co_name) in _IDLE_FRAMES:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, f"thread-{thread_id}"))
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class ProfileSession:
+    """Profiles the code that runs between start() and finish()."""
+
+    def __init__(self, method: str, path: str):
+        self.id = uuid.uuid4().hex[:16]
+        self.method = method
+        self.path = path
+        self.profiler = SamplingProfiler()
+        self._started_tracing = False
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        tracemalloc.reset_peak()
+        self._baseline = tracemalloc.take_snapshot()
+        self._start = time.perf_counter()
+        self.profiler.start()
+
+    def finish(self, status: int) -> dict:
+        self.profiler.stop()
+        duration = time.perf_counter() - self._start
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        if self._started_tracing:
+            tracemalloc.stop()
+
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+        diff = snapshot.filter_traces(filters).compare_to(self._baseline.filter_traces(filters), "lineno")
+        allocations = [
+            {
+                "location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                "size_diff_bytes": stat.size_diff,
+                "count_diff": stat.count_diff,
+                "size_bytes": stat.size,
+            }
+            for stat in diff[:PROFILE_TOP_ALLOCATIONS]
+        ]
+        summary = {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "status": status,
+            "duration_ms": duration * 1000,
+            "interval_ms": self.profiler.interval * 1000,
+            "samples": self.profiler.samples,
+            "peak_traced_bytes": peak,
+            "allocations": allocations,
+        }
+
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        with open(profile_path(self.id, "folded"), "w") as f:
+            f.write(self.profiler.folded())
+        with open(profile_path(self.id, "json"), "w") as f:
+            json.dump(summary, f, indent=2)
+        logger.info("Request profiled", extra={"fields": {
+            "profile_id": self.id, "path": self.path, "duration_ms": round(summary["duration_ms"], 1)}})
+        return summary
+
+
+def profile_path(profile_id: str, kind: str) -> str:
+    """Path of a stored profile file; kind is "folded" or "json"."""
+    if not profile_id.isalnum():
+        raise ValueError("Invalid profile id")
+    return os.path.join(PROFILE_DIR, f"{profile_id}.{kind}")
+
+
+def token_matches(expected: str, supplied) -> bool:
+    """Constant-time admin token check; always False when no token is configured."""
+    if not expected or not supplied:
+        return False
+    if isinstance(supplied, str):
+        supplied = supplied.encode("utf-8")
+    return hmac.compare_digest(expected.encode("utf-8"), supplied)
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that profiles requests carrying a valid admin token."""
+
+    def __init__(self, app, admin_token: str = None):
+        self.app = app
+        self.admin_token = admin_token
+
+    def _requested_token(self, scope):
+        for name, value in scope["headers"]:
+            if name == _PROFILE_HEADER:
+                return value
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.admin_token:
+            return await self.app(scope, receive, send)
+        supplied = self._requested_token(scope)
+        if supplied is None:
+            return await self.app(scope, receive, send)
+        if not token_matches(self.admin_token, supplied) or not _profile_lock.acquire(blocking=False):
+            # Bad token or another profile in progress: serve the request normally
+            return await self.app(scope, receive, send)
+
+        session = ProfileSession(scope["method"], scope["path"])
+        status = 500
+
+        async def send_with_profile_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", session.id.encode())]
+            await send(message)
+
+        try:
+            session.start()
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            try:
+                session.finish(status)
+            finally:
+                _profile_lock.release()
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Re-moderate stored comments after a model or keyword list change.
+
+Pages through every comment in storage, classifies them in batches with the
+same pipeline as new comments (see detector.detect_cyberbullying_batch) and
+writes back only the verdicts that changed, one batched update per page.
+Authors' bad-comment counts and reputation scores are adjusted by the net
+change (reputation.adjust_bad_comments).
+
+Every change is appended to a JSONL report. With --dry-run nothing is written
+to storage and the report is the diff to review. Progress is checkpointed
+after each page; an interrupted run continues with --resume. Before a page
+touches storage its changes and per-author reputation deltas are saved in the
+checkpoint as pending; each delta leaves the checkpoint as soon as it is
+applied, and --resume finishes a pending page before scanning on. A crash
+therefore never loses a reputation change, and can repeat at most the one
+delta applied right before it.
+
+The run aborts, without writing anything for the page, when no local model
+is loaded or it returns no probabilities: keyword-only fallback verdicts
+would otherwise overwrite the model's.
+
+--degraded only re-checks comments that were moderated while the API was
+overloaded (moderation_tier "keyword", or "local" when --remote is given; see
+admission.py) and records the tier of the new check on each of them, so they
+are not picked up again.
+
+--max-rate caps comments per second so a run on the production database does
+not take CPU and storage capacity from live traffic.
+
+Usage:
+    python remoderate.py --dry-run -o remoderation-diff.jsonl
+    python remoderate.py -o remoderation.jsonl --max-rate 20
+    python remoderate.py -o remoderation.jsonl --resume
+    python remoderate.py -o degraded.jsonl --degraded --remote
+"""
+
+import argparse
+import os
+import sys
+import time
+from collections import Counter, defaultdict
+
+from bulk_classify import _AppendWriter, _load_checkpoint, _save_checkpoint
+
+# Admission tiers from most to least thorough (see admission.py)
+TIERS = ("full", "local", "keyword")
+
+
+def _verdict(is_bullying, bullying_type) -> str:
+    return (bullying_type or "bullying").lower() if is_bullying else "not cyberbullying"
+
+
+def diff_page(comments, verdicts):
+    """Return the report rows for comments whose stored verdict differs from the new one."""
+    changes = []
+    for comment, (is_bullying, bullying_type) in zip(comments, verdicts):
+        old_bullying = bool(comment.get("is_bullying", False))
+        old_verdict = _verdict(old_bullying, comment.get("bullying_type"))
+        new_verdict = _verdict(is_bullying, bullying_type)
+        if old_verdict == new_verdict:
+            continue
+        changes.append({
+            "post_id": comment["post_id"],
+            "comment_id": comment["id"],
+            "user_id": comment.get("user_id"),
+            "content": comment.get("content", ""),
+            "old_is_bullying": old_bullying,
+            "old_bullying_type": comment.get("bullying_type"),
+            "new_is_bullying": is_bullying,
+            "new_bullying_type": bullying_type,
+        })
+    return changes
+
+
+def is_degraded(comment, run_tier: str) -> bool:
+    """Whether a comment was moderated by a cheaper tier than `run_tier`; comments without a tier count as full."""
+    tier = comment.get("moderation_tier") or "full"
+    return tier in TIERS and TIERS.index(tier) > TIERS.index(run_tier)
+
+
+def reputation_deltas(changes) -> dict:
+    """Net change in bad comments per author for a list of report rows."""
+    deltas = defaultdict(int)
+    for change in changes:
+        if change["user_id"] and change["old_is_bullying"] != change["new_is_bullying"]:
+            deltas[change["user_id"]] += 1 if change["new_is_bullying"] else -1
+    return {user_id: delta for user_id, delta in deltas.items() if delta}
+
+
+def _finish_page(state: dict, writer, checkpoint_path: str, dry_run: bool):
+    """Apply the checkpoint's pending page and move the cursor past it.
+
+    Comment updates are idempotent and so are repeated after a crash; an
+    author's delta is removed from the checkpoint right after it is applied.
+    """
+    from database import set_comment_tiers, update_comment_classifications
+    from reputation import adjust_bad_comments
+
+    pending = state["pending"]
+    changes = pending["changes"]
+    if changes and not dry_run:
+        update_comment_classifications([
+            (c["post_id"], c["comment_id"], c["new_is_bullying"], c["new_bullying_type"])
+            for c in changes
+        ])
+        deltas = pending["deltas"]
+        for user_id in list(deltas):
+            adjust_bad_comments(user_id, deltas.pop(user_id))
+            _save_checkpoint(checkpoint_path, state)
+    if pending.get("tier") and pending["rechecked"] and not dry_run:
+        set_comment_tiers([tuple(comment) for comment in pending["rechecked"]], pending["tier"])
+    writer.write([{**change, "applied": not dry_run} for change in changes])
+
+    transitions = Counter(state["transitions"])
+    for change in changes:
+        old = _verdict(change["old_is_bullying"], change["old_bullying_type"])
+        new = _verdict(change["new_is_bullying"], change["new_bullying_type"])
+        transitions[f"{old} -> {new}"] += 1
+    state.update(
+        cursor=pending["cursor"],
+        scanned=state["scanned"] + pending["scanned"],
+        transitions=dict(transitions),
+        output_offset=writer.tell(),
+        pending=None,
+    )
+    _save_checkpoint(checkpoint_path, state)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Re-classify stored comments and apply changed verdicts")
+    parser.add_argument("-o", "--output", default="remoderation.jsonl", help="JSONL report of changed verdicts")
+    parser.add_argument("--dry-run", action="store_true", help="Only write the report; change nothing in storage")
+    parser.add_argument("--batch-size", type=int, default=64, help="Comments per page and model batch")
+    parser.add_argument("--max-rate", type=float, default=50.0,
+                        help="Maximum comments per second (0 for no limit)")
+    parser.add_argument("--remote", action="store_true",
+                        help="Also ask the remote API about comments the local model is unsure of")
+    parser.add_argument("--degraded", action="store_true",
+                        help="Only re-check comments moderated by a degraded tier under load")
+    parser.add_argument("--torch-threads", type=int, default=1,
+                        help="CPU threads for the local model (keep low next to a live server)")
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: <output>.checkpoint.json)")
+    parser.add_argument("--resume", action="store_true", help="Continue from the checkpoint")
+    parser.add_argument("--progress-every", type=float, default=5.0, help="Seconds between progress reports")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    checkpoint_path = args.checkpoint or f"{args.output}.checkpoint.json"
+
+    checkpoint = _load_checkpoint(checkpoint_path) if args.resume else None
+    if checkpoint and checkpoint.get("dry_run") != args.dry_run:
+        mode = "a dry run" if checkpoint.get("dry_run") else "a real run"
+        raise SystemExit(f"Checkpoint {checkpoint_path} belongs to {mode}; pass the same --dry-run setting")
+    if not args.resume and os.path.exists(args.output):
+        raise SystemExit(f"{args.output} already exists; use --resume or pick another output")
+    if args.resume and checkpoint is None and os.path.exists(args.output):
+        raise SystemExit(f"No checkpoint at {checkpoint_path} to resume {args.output} from")
+
+    try:
+        import torch
+        torch.set_num_threads(max(1, args.torch_threads))
+    except ImportError:
+        pass
+    import detector
+    from database import scan_comments
+
+    run_tier = "full" if args.remote else "local"
+
+    if detector.model_version() is None and not detector.INFERENCE_SOCKET:
+        raise SystemExit("No local model is loaded; refusing to re-moderate with keyword-only verdicts")
+
+    state = checkpoint or {
+        "cursor": None,
+        "scanned": 0,
+        "transitions": {},
+        "output_offset": 0,
+        "dry_run": args.dry_run,
+    }
+    state.setdefault("pending", None)
+    writer = _AppendWriter(args.output, "jsonl", [], checkpoint["output_offset"] if checkpoint else None)
+    if state["cursor"]:
+        print(f"Resuming after {state['scanned']} comments", file=sys.stderr)
+    if state["pending"]:
+        print("Finishing the page that was interrupted", file=sys.stderr)
+        _finish_page(state, writer, checkpoint_path, args.dry_run)
+
+    started = time.monotonic()
+    last_report = started
+    processed = 0
+    try:
+        while True:
+            cursor = tuple(state["cursor"]) if state["cursor"] else None
+            page = scan_comments(cursor, args.batch_size)
+            if not page:
+                break
+            comments = [c for c in page if is_degraded(c, run_tier)] if args.degraded else page
+            try:
+                verdicts = detector.detect_cyberbullying_batch([c.get("content", "") for c in comments],
+                                                               use_remote=args.remote,
+                                                               require_model=True) if comments else []
+            except RuntimeError as e:
+                raise SystemExit(f"Aborting after {state['scanned']} comments: {e}; rerun with --resume "
+                                 f"once the model is available")
+            changes = diff_page(comments, verdicts)
+
+            state["pending"] = {
+                "cursor": [page[-1]["post_id"], page[-1]["id"]],
+                "scanned": len(page),
+                "changes": changes,
+                "deltas": reputation_deltas(changes),
+                "tier": run_tier if args.degraded else None,
+                "rechecked": [[c["post_id"], c["id"]] for c in comments] if args.degraded else [],
+            }
+            _save_checkpoint(checkpoint_path, state)
+            _finish_page(state, writer, checkpoint_path, args.dry_run)
+            processed += len(page)
+
+            now = time.monotonic()
+            if now - last_report >= args.progress_every:
+                last_report = now
+                print(f"{state['scanned']} comments scanned, {sum(state['transitions'].values())} changed, "
+                      f"{processed / (now - started):.1f} comments/s", file=sys.stderr)
+            if args.max_rate > 0:
+                # Pace the run: sleep until this many comments are due
+                delay = started + processed / args.max_rate - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+    except KeyboardInterrupt:
+        print(f"Interrupted after {state['scanned']} comments; rerun with --resume to continue", file=sys.stderr)
+        raise SystemExit(130)
+    finally:
+        writer.close()
+
+    elapsed = time.monotonic() - started
+    action = "would change" if args.dry_run else "changed"
+    transitions = Counter(state["transitions"])
+    print(f"Done: {state['scanned']} comments scanned, {sum(transitions.values())} {action} in {elapsed:.1f}s",
+          file=sys.stderr)
+    for transition, count in transitions.most_common():
+        print(f"  {transition}: {count}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
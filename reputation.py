@@ -2,7 +2,10 @@
 Reputation management functions for CyberGuard
 """
 
-from auth import get_user_data, db
+from auth import get_user_data, update_user_data
+from logging_config import get_logger
+
+logger = get_logger(__name__)
 
 
 def decrease_reputation(user_id: str):
@@ -14,33 +17,66 @@ def decrease_reputation(user_id: str):
     """
     user_data = get_user_data(user_id)
     if not user_data:
-        print(f"Could not retrieve user data for {user_id}")
+        logger.warning("Could not retrieve user data", extra={"fields": {"user_id": user_id}})
         return
         
     current_score = user_data.get('reputation_score', 10)
     bad_comments_count = user_data.get('bad_comments_count', 0) + 1
     
-    print(f"User {user_id}: current score={current_score}, bad comments={bad_comments_count}")
+    logger.debug("Bad comment recorded", extra={"fields": {
+        "user_id": user_id, "score": current_score, "bad_comments": bad_comments_count}})
     
     # For every 2 bad comments, decrease score by 1
     if bad_comments_count % 2 == 0:
         new_score = max(0, current_score - 1)
         
-        # Update user data in Firebase
-        db.child("users").child(user_id).update({
+        # Update user data in storage
+        update_user_data(user_id, {
             "reputation_score": new_score,
             "bad_comments_count": bad_comments_count
         })
         
-        print(f"User {user_id} reputation decreased to {new_score}/10")
+        logger.info("Reputation decreased", extra={"fields": {"user_id": user_id, "score": new_score}})
         
         # Check if user needs to be banned (5 or below)
         if new_score <= 5:
-            db.child("users").child(user_id).update({"is_banned": True})
-            print(f"User {user_id} has been banned due to low reputation score (score: {new_score}).")
+            update_user_data(user_id, {"is_banned": True})
+            logger.warning("User banned due to low reputation score",
+                           extra={"fields": {"user_id": user_id, "score": new_score}})
         
         return new_score
     else:
         # Just update the bad comments count
-        db.child("users").child(user_id).update({"bad_comments_count": bad_comments_count})
+        update_user_data(user_id, {"bad_comments_count": bad_comments_count})
         return current_score
+
+
+def adjust_bad_comments(user_id: str, delta: int):
+    """
+    Apply a change in a user's number of bullying comments after re-moderation.
+    
+    Uses the same rule as decrease_reputation (one point per two bad comments,
+    ban at 5 or below), so the score ends up as if the comments had been
+    classified this way when they were written. Comments cleared by
+    re-moderation give the points back; lifting a ban is left to admins.
+    """
+    if not delta:
+        return None
+    user_data = get_user_data(user_id)
+    if not user_data:
+        logger.warning("Could not retrieve user data", extra={"fields": {"user_id": user_id}})
+        return None
+    
+    old_count = user_data.get('bad_comments_count', 0)
+    new_count = max(0, old_count + delta)
+    current_score = user_data.get('reputation_score', 10)
+    new_score = min(10, max(0, current_score - (new_count // 2 - old_count // 2)))
+    
+    fields = {"bad_comments_count": new_count, "reputation_score": new_score}
+    if delta > 0 and new_score <= 5:
+        fields["is_banned"] = True
+    update_user_data(user_id, fields)
+    
+    logger.info("Reputation adjusted after re-moderation", extra={"fields": {
+        "user_id": user_id, "bad_comments_delta": delta, "score": new_score}})
+    return new_score
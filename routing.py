@@ -0,0 +1,335 @@
+"""
+Latency-aware routing across the remote classifiers.
+
+`api_client.classify_with_api` hands each text to the router with the remote
+providers that are configured (Groq, the custom classifier API). Every
+provider keeps a rolling window of its recent calls plus the quota headroom
+from its last rate-limit headers, and route():
+
+    1. drops providers that are rate limited (429 with retry-after), low on
+       quota, or failing more than ROUTER_MAX_ERROR_RATE of recent calls; a
+       provider dropped for errors gets one probe call every
+       ROUTER_PROBE_SECONDS, and a successful probe clears its error history
+    2. tries the rest in order of expected time to a good answer (median
+       latency / success rate, plus ROUTER_ERROR_PENALTY per failure, since a
+       fast failure still costs a failover); new providers go first so they
+       get measured
+    3. hedges: the first provider is called on the caller's thread; when it
+       has not answered by its own ROUTER_HEDGE_PERCENTILE latency, the same
+       text also goes to the next one on a small pool. The backup's answer is
+       used when the first call fails, so a hang that ends in a timeout costs
+       the hedge delay instead of a full sequential failover. Hedges are
+       capped at ROUTER_HEDGE_BUDGET per routed request.
+    4. on a failure, moves on to the next provider
+
+When no provider is usable or all fail, the caller falls back to the local
+stages. Stats are per process.
+"""
+
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from logging_config import get_logger
+from metrics import ROUTER_DECISIONS
+
+logger = get_logger(__name__)
+
+ROUTER_WINDOW_SECONDS = float(os.getenv("ROUTER_WINDOW_SECONDS", "300"))
+ROUTER_WINDOW_CALLS = 200
+# Error rate is only judged once a provider has this many calls in the window
+ROUTER_MIN_SAMPLES = int(os.getenv("ROUTER_MIN_SAMPLES", "20"))
+ROUTER_MAX_ERROR_RATE = float(os.getenv("ROUTER_MAX_ERROR_RATE", "0.5"))
+# Seconds a failed call is assumed to cost the caller when ranking providers
+ROUTER_ERROR_PENALTY = 1.0
+# Skip a provider whose remaining request or token quota is below this fraction
+ROUTER_MIN_QUOTA = float(os.getenv("ROUTER_MIN_QUOTA", "0.05"))
+# Rate-limit headers older than this are ignored (the quota has likely reset)
+ROUTER_QUOTA_MAX_AGE = 60.0
+# Hedge after this latency percentile of the first provider; 0 disables hedging
+ROUTER_HEDGE_PERCENTILE = float(os.getenv("ROUTER_HEDGE_PERCENTILE", "0.95"))
+# Hedges allowed per routed request, and how many unused ones can accumulate
+ROUTER_HEDGE_BUDGET = float(os.getenv("ROUTER_HEDGE_BUDGET", "0.1"))
+ROUTER_HEDGE_BURST = 10.0
+# Seconds between probe calls to a provider that is skipped for its error rate
+ROUTER_PROBE_SECONDS = float(os.getenv("ROUTER_PROBE_SECONDS", "30"))
+
+# Runs only backup calls; primaries run on the caller's thread
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="router")
+
+
+class _Timer:
+    """One thread running delayed callbacks, instead of a thread per hedged call."""
+
+    def __init__(self):
+        self._heap = []  # [due at, sequence, callback or None when cancelled]
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def schedule(self, delay: float, callback: Callable[[], None]) -> list:
+        entry = [time.monotonic() + delay, next(self._sequence), callback]
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="router-timer", daemon=True)
+                self._thread.start()
+            heapq.heappush(self._heap, entry)
+            self._cond.notify()
+        return entry
+
+    @staticmethod
+    def cancel(entry: list):
+        entry[2] = None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._heap or self._heap[0][0] > time.monotonic():
+                    self._cond.wait(self._heap[0][0] - time.monotonic() if self._heap else None)
+                callback = heapq.heappop(self._heap)[2]
+            if callback is not None:
+                try:
+                    callback()
+                except Exception as e:
+                    logger.warning("Router timer callback failed", extra={"fields": {"error": str(e)}})
+
+
+_timer = _Timer()
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class ProviderHealth:
+    """Rolling latency, error rate and quota headroom of one provider."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls = deque(maxlen=ROUTER_WINDOW_CALLS)  # (finished at, latency, ok)
+        self._quota: Optional[Tuple[float, float]] = None  # (fraction left, seen at)
+        self._blocked_until = 0.0
+        self._errors_cleared_at = 0.0
+        self._probed_at = 0.0
+        self._failed_at = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, latency: float, ok: bool, probe: bool = False):
+        now = time.monotonic()
+        with self._lock:
+            if probe and ok:
+                # Half-open probe succeeded: judge the provider on new calls only
+                self._errors_cleared_at = now
+            if not ok:
+                self._failed_at = now
+            self._calls.append((now, latency, ok))
+
+    def claim_probe(self) -> bool:
+        """True for at most one caller every ROUTER_PROBE_SECONDS, counted from the last failure or probe."""
+        now = time.monotonic()
+        with self._lock:
+            if now - max(self._probed_at, self._failed_at) < ROUTER_PROBE_SECONDS:
+                return False
+            self._probed_at = now
+            return True
+
+    def note_limits(self, headers, status: Optional[int] = None):
+        """Read x-ratelimit-* and retry-after headers from a provider response."""
+        fractions = []
+        for kind in ("requests", "tokens"):
+            try:
+                remaining = float(headers[f"x-ratelimit-remaining-{kind}"])
+                limit = float(headers[f"x-ratelimit-limit-{kind}"])
+            except (KeyError, TypeError, ValueError):
+                continue
+            if limit > 0:
+                fractions.append(remaining / limit)
+        now = time.monotonic()
+        with self._lock:
+            if fractions:
+                self._quota = (min(fractions), now)
+            if status == 429:
+                try:
+                    retry_after = float(headers.get("retry-after", 1))
+                except (TypeError, ValueError):
+                    retry_after = 1.0
+                self._blocked_until = now + retry_after
+
+    def snapshot(self, quantile: float = 0.95) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            calls = [call for call in self._calls
+                     if now - call[0] <= ROUTER_WINDOW_SECONDS and call[0] >= self._errors_cleared_at]
+            quota = self._quota if self._quota and now - self._quota[1] <= ROUTER_QUOTA_MAX_AGE else None
+            blocked_for = max(0.0, self._blocked_until - now)
+        latencies = [latency for _, latency, ok in calls if ok]
+        errors = sum(1 for _, _, ok in calls if not ok)
+        error_rate = errors / len(calls) if calls else 0.0
+        quota_left = quota[0] if quota else None
+
+        if blocked_for > 0:
+            unhealthy = "rate_limited"
+        elif quota_left is not None and quota_left < ROUTER_MIN_QUOTA:
+            unhealthy = "low_quota"
+        elif len(calls) >= ROUTER_MIN_SAMPLES and error_rate > ROUTER_MAX_ERROR_RATE:
+            unhealthy = "errors"
+        else:
+            unhealthy = None
+
+        p50 = _percentile(latencies, 0.5)
+        return {
+            "calls": len(calls),
+            "error_rate": error_rate,
+            "p50_ms": p50 * 1000 if p50 is not None else None,
+            "hedge_after_ms": (_percentile(latencies, quantile) * 1000
+                               if len(latencies) >= ROUTER_MIN_SAMPLES else None),
+            "quota_left": quota_left,
+            "blocked_for_s": blocked_for,
+            "healthy": unhealthy is None,
+            "unhealthy_reason": unhealthy,
+            # Expected seconds per good answer; unmeasured providers sort first
+            "score": (p50 / max(1.0 - error_rate, 0.01) + error_rate * ROUTER_ERROR_PENALTY
+                      if p50 is not None else 0.0),
+        }
+
+
+class Router:
+    def __init__(self):
+        self._providers: Dict[str, ProviderHealth] = {}
+        self._hedge_credit = ROUTER_HEDGE_BURST
+        self._lock = threading.Lock()
+
+    def provider(self, name: str) -> ProviderHealth:
+        with self._lock:
+            if name not in self._providers:
+                self._providers[name] = ProviderHealth(name)
+            return self._providers[name]
+
+    def note_limits(self, name: str, headers, status: Optional[int] = None):
+        self.provider(name).note_limits(headers, status)
+
+    def rank(self, names: List[str]) -> List[Tuple[str, dict]]:
+        """
+        Healthy providers best-first, with their snapshots. A provider skipped
+        for its error rate whose probe is due is put first, with "probe" set
+        in its snapshot; this claims the probe.
+        """
+        snapshots = [(name, self.provider(name).snapshot(ROUTER_HEDGE_PERCENTILE or 0.95)) for name in names]
+        # sorted() is stable, so ties keep the configured order
+        ranked = sorted([item for item in snapshots if item[1]["healthy"]], key=lambda item: item[1]["score"])
+        for name, snapshot in snapshots:
+            if snapshot["unhealthy_reason"] == "errors" and self.provider(name).claim_probe():
+                return [(name, {**snapshot, "probe": True})] + ranked
+        return ranked
+
+    def _call(self, name: str, fn: Callable[[str], Optional[str]], text: str, probe: bool = False) -> Optional[str]:
+        start = time.perf_counter()
+        try:
+            label = fn(text)
+        except Exception as e:
+            logger.warning("Provider call failed", extra={"fields": {"provider": name, "error": str(e)}})
+            label = None
+        self.provider(name).record(time.perf_counter() - start, label is not None, probe)
+        return label
+
+    def _take_hedge(self) -> bool:
+        with self._lock:
+            if self._hedge_credit < 1:
+                return False
+            self._hedge_credit -= 1
+            return True
+
+    def _hedged(self, text: str, providers: Dict[str, Callable], primary: str, backup: str,
+                hedge_after: float) -> Tuple[Optional[str], Optional[str], bool]:
+        """(label, provider that answered, whether the backup was started)."""
+        lock = threading.Lock()
+        state = {"primary_done": False, "backup": None}
+
+        def start_backup():
+            with lock:
+                if state["primary_done"]:
+                    return
+                if not self._take_hedge():
+                    ROUTER_DECISIONS.inc(backup, "hedge_over_budget")
+                    return
+                ROUTER_DECISIONS.inc(backup, "hedge")
+                state["backup"] = _executor.submit(self._call, backup, providers[backup], text)
+
+        entry = _timer.schedule(hedge_after, start_backup)
+        label = self._call(primary, providers[primary], text)
+        _Timer.cancel(entry)
+        with lock:
+            state["primary_done"] = True
+            backup_call = state["backup"]
+
+        if label is not None:
+            # A started backup keeps running and still updates its stats
+            return label, primary, backup_call is not None
+        if backup_call is None:
+            return None, None, False
+        label = backup_call.result()
+        if label is not None:
+            ROUTER_DECISIONS.inc(backup, "hedge_won")
+        return label, backup if label is not None else None, True
+
+    def route(self, text: str, providers: Dict[str, Callable[[str], Optional[str]]]) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Classify text with the best available provider.
+
+        providers maps a name to a callable returning a label, or None on
+        failure. Returns (label, provider name), or (None, None) when no
+        provider is usable or all of them failed.
+        """
+        if not providers:
+            ROUTER_DECISIONS.inc("local", "not_configured")
+            return None, None
+        ranked = self.rank(list(providers))
+        if not ranked:
+            ROUTER_DECISIONS.inc("local", "no_healthy_provider")
+            return None, None
+
+        with self._lock:
+            self._hedge_credit = min(ROUTER_HEDGE_BURST, self._hedge_credit + ROUTER_HEDGE_BUDGET)
+
+        primary, stats = ranked[0]
+        probe = stats.get("probe", False)
+        ROUTER_DECISIONS.inc(primary, "probe" if probe else "primary")
+        remaining = [name for name, _ in ranked[1:]]
+        hedge_after = stats["hedge_after_ms"]
+        if probe:
+            label = self._call(primary, providers[primary], text, probe=True)
+            answered_by = primary if label is not None else None
+        elif ROUTER_HEDGE_PERCENTILE > 0 and hedge_after is not None and remaining:
+            label, answered_by, hedged = self._hedged(text, providers, primary, remaining[0], hedge_after / 1000)
+            if hedged:
+                remaining = remaining[1:]
+        else:
+            label = self._call(primary, providers[primary], text)
+            answered_by = primary if label is not None else None
+
+        for name in remaining:
+            if label is not None:
+                break
+            ROUTER_DECISIONS.inc(name, "failover")
+            label = self._call(name, providers[name], text)
+            answered_by = name if label is not None else None
+
+        if label is None:
+            ROUTER_DECISIONS.inc("local", "all_failed")
+        return label, answered_by
+
+    def stats(self) -> dict:
+        with self._lock:
+            names = list(self._providers)
+        return {name: self.provider(name).snapshot(ROUTER_HEDGE_PERCENTILE or 0.95) for name in names}
+
+
+router = Router()
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Pre-forked multi-worker server for the CyberGuard API.
+
+Running `uvicorn api.main:app --workers N` imports `detector` in every worker,
+so every worker loads its own copy of the model. This script loads and freezes
+the model once in a parent process and then forks the workers, which share
+the weight pages copy-on-write. Each worker pins its torch intra-op thread
+count so the workers do not oversubscribe the CPU cores.
+
+Only the model is shared. Everything else the API keeps in memory is per
+worker, and a request reaches whichever worker accepted its connection:
+    - /metrics shows the counters of one worker per scrape
+    - rate-limit buckets; admission.py divides the comment and classify
+      limits by the worker count (SERVER_WORKERS, set here) to compensate
+    - the admission queue and ADMISSION_MAX_CONCURRENCY apply per worker
+    - /api/events only carries changes made through the same worker; a client
+      reconnecting to another one gets a reset and refetches
+    - admin model swaps are refused, since they would change one worker
+
+Usage:
+    python serve.py --workers 4 --port 8000
+    python serve.py --workers 4 --threads-per-worker 2 --report-memory
+"""
+
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Pre-forked CyberGuard API server")
+    parser.add_argument("--host", default="0.0.0.0", help="Address to bind")
+    parser.add_argument("--port", type=int, default=8000, help="Port to bind")
+    parser.add_argument("--workers", type=int, default=2, help="Number of worker processes")
+    parser.add_argument("--threads-per-worker", type=int, default=None,
+                        help="torch intra-op threads per worker (default: cores / workers)")
+    parser.add_argument("--log-level", default="info", help="uvicorn log level")
+    parser.add_argument("--report-memory", action="store_true",
+                        help="Print RSS/PSS per process once the workers are up")
+    return parser.parse_args()
+
+
+def freeze_model(model):
+    """Put the model into read-only inference mode before forking.
+
+    Nothing below writes to the weight tensors, so their pages stay shared
+    between the parent and every worker.
+    """
+    if model is None:
+        return
+    model.eval()
+    for param in model.parameters():
+        param.requires_grad_(False)
+
+
+def memory_usage(pid: int) -> dict:
+    """Return the memory summary of a process from /proc/<pid>/smaps_rollup (in KiB)."""
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == "kB":
+                    fields[parts[0].rstrip(":")] = int(parts[1])
+    except OSError:
+        pass
+    return fields
+
+
+def report_memory(parent_pid: int, worker_pids: list):
+    """Print RSS, PSS and private memory of the parent and each worker."""
+    print(f"{'process':<16}{'pid':>8}{'RSS MiB':>10}{'PSS MiB':>10}{'Private MiB':>13}")
+    rows = [("parent", parent_pid)] + [(f"worker-{i}", pid) for i, pid in enumerate(worker_pids)]
+    for name, pid in rows:
+        usage = memory_usage(pid)
+        if not usage:
+            print(f"{name:<16}{pid:>8}  (smaps_rollup not available)")
+            continue
+        private = usage.get("Private_Clean", 0) + usage.get("Private_Dirty", 0)
+        print(f"{name:<16}{pid:>8}{usage.get('Rss', 0) / 1024:>10.1f}"
+              f"{usage.get('Pss', 0) / 1024:>10.1f}{private / 1024:>13.1f}")
+    sys.stdout.flush()
+
+
+def run_worker(sock, app, threads: int, log_level: str):
+    """Body of a forked worker: pin torch threads and serve on the shared socket."""
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    gc.enable()
+
+    try:
+        import torch
+        torch.set_num_threads(threads)
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            # Already fixed once inter-op work has started; intra-op pinning is what matters
+            pass
+    except ImportError:
+        pass
+
+    import uvicorn
+    config = uvicorn.Config(app, log_level=log_level)
+    server = uvicorn.Server(config)
+    server.run(sockets=[sock])
+    os._exit(0)
+
+
+def main():
+    args = parse_args()
+    workers = max(1, args.workers)
+    threads = args.threads_per_worker or max(1, (os.cpu_count() or 1) // workers)
+
+    # Keep the parent single-threaded so no OpenMP pool exists at fork time;
+    # each worker sets its own thread count after the fork.
+    os.environ.setdefault("OMP_NUM_THREADS", "1")
+    os.environ.setdefault("MKL_NUM_THREADS", "1")
+
+    # Avoid collections dirtying shared pages while the model loads, then move
+    # everything allocated so far to the permanent generation before forking.
+    gc.disable()
+
+    # The API refuses per-process model swaps when it knows several workers serve
+    os.environ["SERVER_WORKERS"] = str(workers)
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import detector
+    freeze_model(detector.model)
+    from api.main import app
+
+    gc.collect()
+    gc.freeze()
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    print(f"Serving on http://{args.host}:{args.port} with {workers} workers x {threads} torch threads")
+
+    children = {}
+
+    def spawn(slot: int):
+        pid = os.fork()
+        if pid == 0:
+            run_worker(sock, app, threads, args.log_level)
+        children[pid] = slot
+
+    for slot in range(workers):
+        spawn(slot)
+
+    shutting_down = False
+
+    def shutdown(signum, frame):
+        nonlocal shutting_down
+        shutting_down = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+
+    if args.report_memory:
+        # Give the workers time to start and serve their first requests
+        time.sleep(5)
+        report_memory(os.getpid(), sorted(children))
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        slot = children.pop(pid, None)
+        if slot is not None and not shutting_down:
+            print(f"Worker {pid} exited with status {status}, restarting")
+            spawn(slot)
+
+    sock.close()
+
+
+if __name__ == "__main__":
+    main()
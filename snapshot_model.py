@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Pin a model revision and its tokenizer into a local directory.
+
+Downloads the classifier once, saves the weights as safetensors next to the
+config and tokenizer files, and writes snapshot.json recording the exact
+revision and file hashes. Point MODEL_SNAPSHOT_DIR at the directory (the
+default is models/cyberbully) and detector.py loads it offline, with the
+weights memory-mapped instead of copied into each process.
+
+Usage:
+    python snapshot_model.py
+    python snapshot_model.py --model boss2805/cyberbully --revision <commit> -o models/cyberbully
+    python snapshot_model.py --verify models/cyberbully
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+from datetime import datetime
+
+SNAPSHOT_MANIFEST = "snapshot.json"
+DEFAULT_MODEL = "boss2805/cyberbully"
+DEFAULT_TOKENIZER = "distilbert-base-uncased"
+DEFAULT_OUTPUT = os.path.join("models", "cyberbully")
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _file_hashes(directory: str) -> dict:
+    return {
+        name: _sha256(os.path.join(directory, name))
+        for name in sorted(os.listdir(directory))
+        if name != SNAPSHOT_MANIFEST and os.path.isfile(os.path.join(directory, name))
+    }
+
+
+def create_snapshot(model_name: str, revision: str, tokenizer_name: str, output: str) -> dict:
+    """Download and save a snapshot into `output` (replaced atomically); returns the manifest."""
+    import transformers
+    from transformers import AutoConfig, AutoModelForSequenceClassification, AutoTokenizer
+
+    config = AutoConfig.from_pretrained(model_name, revision=revision)
+    if getattr(config, "auto_map", None):
+        raise SystemExit(f"{model_name} needs custom model code; snapshots only support built-in architectures")
+
+    model = AutoModelForSequenceClassification.from_pretrained(model_name, revision=revision)
+    tokenizer = AutoTokenizer.from_pretrained(tokenizer_name)
+    resolved = getattr(model.config, "_commit_hash", None) or revision
+
+    parent = os.path.dirname(os.path.abspath(output))
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=".snapshot-", dir=parent)
+    try:
+        model.save_pretrained(staging, safe_serialization=True)
+        tokenizer.save_pretrained(staging)
+        manifest = {
+            "model": model_name,
+            "revision": resolved,
+            "tokenizer": tokenizer_name,
+            "transformers_version": transformers.__version__,
+            "created": datetime.utcnow().isoformat(),
+            "files": _file_hashes(staging),
+        }
+        with open(os.path.join(staging, SNAPSHOT_MANIFEST), "w") as f:
+            json.dump(manifest, f, indent=2)
+        if os.path.exists(output):
+            shutil.rmtree(output)
+        os.replace(staging, output)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    return manifest
+
+
+def verify_snapshot(directory: str) -> list:
+    """Return the files whose contents no longer match the manifest."""
+    with open(os.path.join(directory, SNAPSHOT_MANIFEST)) as f:
+        manifest = json.load(f)
+    actual = _file_hashes(directory)
+    return sorted(name for name, digest in manifest["files"].items() if actual.get(name) != digest)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pin the classifier into a local safetensors snapshot")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="Hugging Face model id")
+    parser.add_argument("--revision", default="main", help="Branch, tag or commit to pin")
+    parser.add_argument("--tokenizer", default=DEFAULT_TOKENIZER, help="Tokenizer to save with it")
+    parser.add_argument("-o", "--output", default=DEFAULT_OUTPUT, help="Snapshot directory")
+    parser.add_argument("--verify", metavar="DIR", help="Check an existing snapshot against its manifest")
+    args = parser.parse_args(argv)
+
+    if args.verify:
+        changed = verify_snapshot(args.verify)
+        if changed:
+            raise SystemExit(f"Snapshot files changed: {', '.join(changed)}")
+        print(f"{args.verify} matches its manifest", file=sys.stderr)
+        return
+
+    manifest = create_snapshot(args.model, args.revision, args.tokenizer, args.output)
+    print(f"Saved {manifest['model']}@{manifest['revision']} to {args.output}", file=sys.stderr)
+    if os.path.normpath(args.output) != DEFAULT_OUTPUT:
+        print(f"Add MODEL_SNAPSHOT_DIR={args.output} to .env to load it", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
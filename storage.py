@@ -0,0 +1,597 @@
+"""
+Storage backends for CyberGuard.
+
+`database.py`, `auth.py` and `reputation.py` go through the `Storage`
+interface instead of calling pyrebase directly. Pick the backend with
+STORAGE_BACKEND:
+
+    firebase  Firebase Realtime Database + Storage via pyrebase (default)
+    sqlite    Local SQLite file (SQLITE_PATH) with indexed tables, images in MEDIA_ROOT
+    memory    In-process Firebase stand-in (fake_firebase.py); data is lost on exit
+"""
+
+import hashlib
+import json
+import os
+import secrets
+import sqlite3
+import ssl
+import threading
+import uuid
+from typing import List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from metrics import STORAGE_LATENCY
+
+load_dotenv()
+
+
+def firebase_config() -> dict:
+    """Firebase Configuration from environment variables"""
+    return {
+        "apiKey": os.getenv("FIREBASE_API_KEY"),
+        "authDomain": os.getenv("FIREBASE_AUTH_DOMAIN"),
+        "databaseURL": os.getenv("FIREBASE_DATABASE_URL"),
+        "projectId": os.getenv("FIREBASE_PROJECT_ID"),
+        "storageBucket": os.getenv("FIREBASE_STORAGE_BUCKET"),
+        "messagingSenderId": os.getenv("FIREBASE_MESSAGING_SENDER_ID"),
+        "appId": os.getenv("FIREBASE_APP_ID")
+    }
+
+
+class Storage:
+    """Interface shared by all backends.
+
+    Posts, comments and users are plain dicts in the same shape Firebase
+    stores them; list results carry their key under "id" ("uid" for users).
+    """
+
+    name = "base"
+
+    # Auth
+    def sign_in(self, email: str, password: str) -> Optional[dict]:
+        """Return {"localId": ..., "email": ...} or None for bad credentials."""
+        raise NotImplementedError
+
+    def sign_up(self, email: str, password: str) -> dict:
+        """Create an account and return {"localId": ..., "email": ...}; raises on failure."""
+        raise NotImplementedError
+
+    # Users and reputation
+    def get_user(self, user_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def set_user(self, user_id: str, data: dict):
+        raise NotImplementedError
+
+    def update_user(self, user_id: str, fields: dict):
+        raise NotImplementedError
+
+    def search_users(self, query: str, limit: int = 10) -> List[dict]:
+        raise NotImplementedError
+
+    # Posts and likes
+    def create_post(self, post_id: str, data: dict):
+        raise NotImplementedError
+
+    def get_post(self, post_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def get_all_posts(self) -> List[dict]:
+        raise NotImplementedError
+
+    def update_post(self, post_id: str, fields: dict):
+        raise NotImplementedError
+
+    def toggle_like(self, post_id: str, user_id: str) -> Optional[list]:
+        raise NotImplementedError
+
+    # Comments
+    def create_comment(self, post_id: str, comment_id: str, data: dict):
+        raise NotImplementedError
+
+    def get_post_comments(self, post_id: str) -> List[dict]:
+        raise NotImplementedError
+
+    def count_comments(self, post_id: str) -> int:
+        return len(self.get_post_comments(post_id))
+
+    def update_comment(self, post_id: str, comment_id: str, fields: dict):
+        raise NotImplementedError
+
+    def update_comments(self, updates: List[Tuple[str, str, dict]]):
+        """Apply several (post_id, comment_id, fields) updates at once."""
+        for post_id, comment_id, fields in updates:
+            self.update_comment(post_id, comment_id, fields)
+
+    def scan_comments(self, after: Optional[Tuple[str, str]] = None, limit: int = 500) -> List[dict]:
+        """
+        Up to `limit` comments of all posts in (post_id, id) order, starting
+        after the (post_id, id) pair `after`. Each comment carries "post_id".
+        """
+        raise NotImplementedError
+
+    def delete_comment(self, post_id: str, comment_id: str):
+        raise NotImplementedError
+
+    # Files
+    def upload_file(self, path: str, file) -> str:
+        """Store an uploaded file and return its public URL."""
+        raise NotImplementedError
+
+
+# ============================================
+# Firebase (pyrebase) backend
+# ============================================
+
+class FirebaseStorage(Storage):
+    name = "firebase"
+
+    def __init__(self, pyrebase_module=None):
+        if pyrebase_module is None:
+            # SSL workaround for Firebase connections
+            try:
+                _create_unverified_https_context = ssl._create_unverified_context
+            except AttributeError:
+                pass
+            else:
+                ssl._create_default_https_context = _create_unverified_https_context
+            import pyrebase as pyrebase_module
+
+        self.firebase = pyrebase_module.initialize_app(firebase_config())
+        self.auth = self.firebase.auth()
+        self.db = self.firebase.database()
+        self.storage = self.firebase.storage()
+
+    def sign_in(self, email, password):
+        try:
+            return self.auth.sign_in_with_email_and_password(email, password)
+        except Exception:
+            return None
+
+    def sign_up(self, email, password):
+        return self.auth.create_user_with_email_and_password(email, password)
+
+    def get_user(self, user_id):
+        return self.db.child("users").child(user_id).get().val()
+
+    def set_user(self, user_id, data):
+        self.db.child("users").child(user_id).set(data)
+
+    def update_user(self, user_id, fields):
+        self.db.child("users").child(user_id).update(fields)
+
+    def search_users(self, query, limit=10):
+        query = query.lower()
+        users = self.db.child("users").get()
+        results = []
+        for user in users.each() or []:
+            user_data = user.val()
+            username = user_data.get('username', '').lower()
+            email = user_data.get('email', '').lower()
+            if query in username or query in email:
+                results.append({**user_data, "uid": user.key()})
+                if len(results) >= limit:
+                    break
+        return results
+
+    def create_post(self, post_id, data):
+        self.db.child("posts").child(post_id).set(data)
+
+    def get_post(self, post_id):
+        post = self.db.child("posts").child(post_id).get()
+        if post.val():
+            return {**post.val(), "id": post_id}
+        return None
+
+    def get_all_posts(self):
+        posts = self.db.child("posts").get()
+        return [{**post.val(), "id": post.key()} for post in posts.each() or []]
+
+    def update_post(self, post_id, fields):
+        self.db.child("posts").child(post_id).update(fields)
+
+    def toggle_like(self, post_id, user_id):
+        post = self.get_post(post_id)
+        if not post:
+            return None
+        likes = post.get('likes', [])
+        # Handle legacy int format
+        if isinstance(likes, int):
+            likes = []
+        if user_id in likes:
+            likes.remove(user_id)
+        else:
+            likes.append(user_id)
+        self.db.child("posts").child(post_id).update({"likes": likes})
+        return likes
+
+    def create_comment(self, post_id, comment_id, data):
+        self.db.child("comments").child(post_id).child(comment_id).set(data)
+
+    def get_post_comments(self, post_id):
+        comments = self.db.child("comments").child(post_id).get()
+        return [{**comment.val(), "id": comment.key()} for comment in comments.each() or []]
+
+    def count_comments(self, post_id):
+        # Shallow reads return only the keys, not every comment body
+        try:
+            comments = self.db.child("comments").child(post_id).shallow().get().val()
+        except AttributeError:
+            # pyrebase fails on shallow reads of paths that do not exist
+            return 0
+        return len(comments) if comments else 0
+
+    def update_comment(self, post_id, comment_id, fields):
+        self.db.child("comments").child(post_id).child(comment_id).update(fields)
+
+    def update_comments(self, updates):
+        # One multi-path update instead of a request per comment
+        data = {}
+        for post_id, comment_id, fields in updates:
+            for key, value in fields.items():
+                data[f"comments/{post_id}/{comment_id}/{key}"] = value
+        if data:
+            self.db.update(data)
+
+    def scan_comments(self, after=None, limit=500):
+        try:
+            post_ids = self.db.child("comments").shallow().get().val()
+        except AttributeError:
+            return []
+        after_post, after_comment = after or ("", "")
+        batch = []
+        for post_id in sorted(post_ids or []):
+            if post_id < after_post:
+                continue
+            for comment in sorted(self.get_post_comments(post_id), key=lambda c: c["id"]):
+                if (post_id, comment["id"]) > (after_post, after_comment):
+                    batch.append({**comment, "post_id": post_id})
+            if len(batch) >= limit:
+                break
+        return batch[:limit]
+
+    def delete_comment(self, post_id, comment_id):
+        self.db.child("comments").child(post_id).child(comment_id).remove()
+
+    def upload_file(self, path, file):
+        self.storage.child(path).put(file)
+        return self.storage.child(path).get_url(None)
+
+
+# ============================================
+# SQLite backend
+# ============================================
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS accounts (
+    email TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL UNIQUE,
+    password_hash TEXT NOT NULL,
+    salt TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    username TEXT,
+    email TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_users_username ON users (username COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_users_email ON users (email COLLATE NOCASE);
+CREATE TABLE IF NOT EXISTS posts (
+    id TEXT PRIMARY KEY,
+    user_id TEXT,
+    timestamp TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_posts_timestamp ON posts (timestamp);
+CREATE TABLE IF NOT EXISTS comments (
+    id TEXT PRIMARY KEY,
+    post_id TEXT NOT NULL,
+    user_id TEXT,
+    timestamp TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_comments_post_id ON comments (post_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_comments_scan ON comments (post_id, id);
+CREATE TABLE IF NOT EXISTS likes (
+    post_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    PRIMARY KEY (post_id, user_id)
+);
+"""
+
+
+def _hash_password(password: str, salt: str) -> str:
+    return hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), bytes.fromhex(salt), 200_000).hex()
+
+
+# Maximum ids per IN (...) query
+_SQLITE_IN_CHUNK = 500
+
+
+class SQLiteStorage(Storage):
+    """Local SQLite storage with one connection per thread (WAL mode)."""
+
+    name = "sqlite"
+
+    def __init__(self, path: str, media_root: str = "media", media_url: str = "/media"):
+        self.path = path
+        self.media_root = media_root
+        self.media_url = media_url.rstrip("/")
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    # Auth
+    def sign_in(self, email, password):
+        row = self._conn().execute(
+            "SELECT user_id, password_hash, salt FROM accounts WHERE email = ?", (email,)
+        ).fetchone()
+        if row is None:
+            return None
+        expected = _hash_password(password, row["salt"])
+        if not secrets.compare_digest(expected, row["password_hash"]):
+            return None
+        return {"localId": row["user_id"], "email": email}
+
+    def sign_up(self, email, password):
+        user_id = uuid.uuid4().hex[:28]
+        salt = secrets.token_hex(16)
+        try:
+            self._conn().execute(
+                "INSERT INTO accounts (email, user_id, password_hash, salt) VALUES (?, ?, ?, ?)",
+                (email, user_id, _hash_password(password, salt), salt)
+            )
+        except sqlite3.IntegrityError:
+            raise ValueError("EMAIL_EXISTS")
+        return {"localId": user_id, "email": email}
+
+    # Users and reputation
+    def get_user(self, user_id):
+        row = self._conn().execute("SELECT data FROM users WHERE id = ?", (user_id,)).fetchone()
+        return json.loads(row["data"]) if row else None
+
+    def set_user(self, user_id, data):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO users (id, username, email, data) VALUES (?, ?, ?, ?)",
+            (user_id, data.get("username"), data.get("email"), json.dumps(data))
+        )
+
+    def update_user(self, user_id, fields):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            data = self.get_user(user_id) or {}
+            data.update(fields)
+            self.set_user(user_id, data)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def search_users(self, query, limit=10):
+        # Case-insensitive substring match, like the other backends; the query's
+        # own % and _ are escaped so they match literally
+        escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        rows = self._conn().execute(
+            "SELECT id, data FROM users WHERE username LIKE '%' || ? || '%' ESCAPE '\\' "
+            "OR email LIKE '%' || ? || '%' ESCAPE '\\' LIMIT ?",
+            (escaped, escaped, limit)
+        ).fetchall()
+        return [{**json.loads(row["data"]), "uid": row["id"]} for row in rows]
+
+    # Posts and likes
+    def _likes(self, post_ids: List[str]) -> dict:
+        likes = {post_id: [] for post_id in post_ids}
+        # Chunked to stay well below SQLite's bound-parameter limit
+        for start in range(0, len(post_ids), _SQLITE_IN_CHUNK):
+            chunk = post_ids[start:start + _SQLITE_IN_CHUNK]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self._conn().execute(
+                f"SELECT post_id, user_id FROM likes WHERE post_id IN ({placeholders}) ORDER BY rowid", chunk
+            ).fetchall()
+            for row in rows:
+                likes[row["post_id"]].append(row["user_id"])
+        return likes
+
+    def create_post(self, post_id, data):
+        data = {k: v for k, v in data.items() if k != "likes"}
+        self._conn().execute(
+            "INSERT OR REPLACE INTO posts (id, user_id, timestamp, data) VALUES (?, ?, ?, ?)",
+            (post_id, data.get("user_id"), data.get("timestamp"), json.dumps(data))
+        )
+
+    def get_post(self, post_id):
+        row = self._conn().execute("SELECT data FROM posts WHERE id = ?", (post_id,)).fetchone()
+        if row is None:
+            return None
+        return {**json.loads(row["data"]), "likes": self._likes([post_id])[post_id], "id": post_id}
+
+    def get_all_posts(self):
+        rows = self._conn().execute("SELECT id, data FROM posts ORDER BY timestamp DESC").fetchall()
+        likes = self._likes([row["id"] for row in rows])
+        return [{**json.loads(row["data"]), "likes": likes[row["id"]], "id": row["id"]} for row in rows]
+
+    def update_post(self, post_id, fields):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT data FROM posts WHERE id = ?", (post_id,)).fetchone()
+            if row is not None:
+                data = json.loads(row["data"])
+                data.update({k: v for k, v in fields.items() if k != "likes"})
+                conn.execute("UPDATE posts SET data = ?, timestamp = ? WHERE id = ?",
+                             (json.dumps(data), data.get("timestamp"), post_id))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def toggle_like(self, post_id, user_id):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("SELECT 1 FROM posts WHERE id = ?", (post_id,)).fetchone() is None:
+                conn.execute("ROLLBACK")
+                return None
+            deleted = conn.execute("DELETE FROM likes WHERE post_id = ? AND user_id = ?",
+                                   (post_id, user_id)).rowcount
+            if not deleted:
+                conn.execute("INSERT INTO likes (post_id, user_id) VALUES (?, ?)", (post_id, user_id))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return self._likes([post_id])[post_id]
+
+    # Comments
+    def create_comment(self, post_id, comment_id, data):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO comments (id, post_id, user_id, timestamp, data) VALUES (?, ?, ?, ?, ?)",
+            (comment_id, post_id, data.get("user_id"), data.get("timestamp"), json.dumps(data))
+        )
+
+    def get_post_comments(self, post_id):
+        rows = self._conn().execute(
+            "SELECT id, data FROM comments WHERE post_id = ? ORDER BY timestamp", (post_id,)
+        ).fetchall()
+        return [{**json.loads(row["data"]), "id": row["id"]} for row in rows]
+
+    def count_comments(self, post_id):
+        return self._conn().execute("SELECT COUNT(*) FROM comments WHERE post_id = ?", (post_id,)).fetchone()[0]
+
+    def update_comment(self, post_id, comment_id, fields):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT data FROM comments WHERE post_id = ? AND id = ?",
+                               (post_id, comment_id)).fetchone()
+            if row is not None:
+                data = json.loads(row["data"])
+                data.update(fields)
+                conn.execute("UPDATE comments SET data = ? WHERE id = ?", (json.dumps(data), comment_id))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def update_comments(self, updates):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for post_id, comment_id, fields in updates:
+                row = conn.execute("SELECT data FROM comments WHERE post_id = ? AND id = ?",
+                                   (post_id, comment_id)).fetchone()
+                if row is not None:
+                    data = json.loads(row["data"])
+                    data.update(fields)
+                    conn.execute("UPDATE comments SET data = ? WHERE id = ?", (json.dumps(data), comment_id))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def scan_comments(self, after=None, limit=500):
+        after_post, after_comment = after or ("", "")
+        rows = self._conn().execute(
+            "SELECT post_id, id, data FROM comments WHERE post_id > ? OR (post_id = ? AND id > ?) "
+            "ORDER BY post_id, id LIMIT ?",
+            (after_post, after_post, after_comment, limit)
+        ).fetchall()
+        return [{**json.loads(row["data"]), "id": row["id"], "post_id": row["post_id"]} for row in rows]
+
+    def delete_comment(self, post_id, comment_id):
+        self._conn().execute("DELETE FROM comments WHERE post_id = ? AND id = ?", (post_id, comment_id))
+
+    # Files
+    def upload_file(self, path, file):
+        root = os.path.realpath(self.media_root)
+        target = os.path.realpath(os.path.join(root, *path.split("/")))
+        if os.path.commonpath([root, target]) != root or target == root:
+            raise ValueError(f"Upload path {path!r} is outside the media root")
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, "wb") as out:
+            if hasattr(file, "read"):
+                while True:
+                    chunk = file.read(1024 * 1024)
+                    if not chunk:
+                        break
+                    out.write(chunk)
+            else:
+                out.write(bytes(file))
+        return f"{self.media_url}/{path}"
+
+
+# ============================================
+# Backend selection
+# ============================================
+
+class _TimedStorage:
+    """Wraps a backend and records the latency of every interface call."""
+
+    def __init__(self, backend: Storage, name: str):
+        self._backend = backend
+        self._name = name
+
+    def __getattr__(self, attr):
+        value = getattr(self._backend, attr)
+        if not callable(value) or attr.startswith("_") or not hasattr(Storage, attr):
+            return value
+
+        def timed(*args, **kwargs):
+            with STORAGE_LATENCY.time(self._name, attr):
+                return value(*args, **kwargs)
+
+        # Cache on the instance so later lookups skip __getattr__
+        self.__dict__[attr] = timed
+        return timed
+
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def storage_backend_name() -> str:
+    backend = os.getenv("STORAGE_BACKEND")
+    if backend:
+        return backend.lower()
+    # FIREBASE_BACKEND=memory predates STORAGE_BACKEND and means the same thing
+    if os.getenv("FIREBASE_BACKEND") == "memory":
+        return "memory"
+    return "firebase"
+
+
+def get_storage() -> Storage:
+    """Return the process-wide storage backend, creating it on first use."""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                backend = storage_backend_name()
+                if backend == "sqlite":
+                    _storage = SQLiteStorage(
+                        os.getenv("SQLITE_PATH", "cyberguard.db"),
+                        media_root=os.getenv("MEDIA_ROOT", "media"),
+                        media_url=os.getenv("MEDIA_URL", "/media"),
+                    )
+                elif backend == "memory":
+                    import fake_firebase
+                    _storage = FirebaseStorage(fake_firebase)
+                elif backend == "firebase":
+                    _storage = FirebaseStorage()
+                else:
+                    raise ValueError(f"Unknown STORAGE_BACKEND '{backend}' (use firebase, sqlite or memory)")
+                _storage = _TimedStorage(_storage, backend)
+    return _storage
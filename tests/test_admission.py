@@ -0,0 +1,43 @@
+import types
+
+import pytest
+
+import admission
+from admission import TokenBuckets
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(admission, "time", types.SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+def test_burst_then_wait_for_refill(clock):
+    buckets = TokenBuckets(rate_per_minute=60, burst=2)
+    assert buckets.take("a") == 0
+    assert buckets.take("a") == 0
+    assert buckets.take("a") == pytest.approx(1.0)
+
+    clock[0] += 1.0
+    assert buckets.take("a") == 0
+
+
+def test_keys_are_independent(clock):
+    buckets = TokenBuckets(rate_per_minute=60, burst=1)
+    assert buckets.take("a") == 0
+    assert buckets.take("b") == 0
+    assert buckets.take("a") > 0
+
+
+def test_least_recently_used_key_is_forgotten(clock):
+    buckets = TokenBuckets(rate_per_minute=60, burst=1, max_keys=1)
+    buckets.take("a")
+    buckets.take("b")
+    # "a" starts again from a full bucket
+    assert buckets.take("a") == 0
+
+
+def test_zero_rate_disables_the_limit(clock):
+    buckets = TokenBuckets(rate_per_minute=0, burst=0)
+    assert all(buckets.take("a") == 0 for _ in range(100))
@@ -0,0 +1,65 @@
+import asyncio
+
+from events import EventBroadcaster
+
+
+def _frames(broadcaster, last_event_id, count):
+    """The first `count` frames a subscriber gets, or fewer if nothing more arrives."""
+    async def collect():
+        frames = []
+
+        async def read():
+            async for frame in broadcaster.stream(last_event_id):
+                frames.append(frame.decode())
+                if len(frames) == count:
+                    return
+
+        try:
+            await asyncio.wait_for(read(), 0.2)
+        except asyncio.TimeoutError:
+            pass
+        return frames
+
+    return asyncio.run(collect())
+
+
+def _published(count):
+    broadcaster = EventBroadcaster()
+    for i in range(count):
+        broadcaster.publish("comment_added", {"i": i})
+    return broadcaster
+
+
+def test_new_subscriber_gets_only_new_events():
+    assert _frames(_published(3), None, 2) == ["retry: 3000\n\n"]
+
+
+def test_replay_after_last_event_id():
+    broadcaster = _published(3)
+    frames = _frames(broadcaster, f"{broadcaster.epoch}.1", 2)
+    assert frames[1].startswith(f"id: {broadcaster.epoch}.2\n")
+    assert f"id: {broadcaster.epoch}.3\n" in frames[1]
+    assert f"id: {broadcaster.epoch}.1\n" not in frames[1]
+
+
+def test_up_to_date_client_gets_nothing_to_replay():
+    broadcaster = _published(3)
+    assert _frames(broadcaster, f"{broadcaster.epoch}.3", 2) == ["retry: 3000\n\n"]
+
+
+def test_id_from_another_process_gets_reset():
+    broadcaster = _published(3)
+    assert _frames(broadcaster, "0000000.2", 2)[1].startswith("event: reset")
+    assert _frames(broadcaster, "17", 2)[1].startswith("event: reset")
+
+
+def test_id_ahead_of_this_process_gets_reset():
+    broadcaster = _published(3)
+    assert _frames(broadcaster, f"{broadcaster.epoch}.99", 2)[1].startswith("event: reset")
+
+
+def test_dropped_events_get_reset():
+    broadcaster = EventBroadcaster(history=2)
+    for i in range(5):
+        broadcaster.publish("comment_added", {"i": i})
+    assert _frames(broadcaster, f"{broadcaster.epoch}.1", 2)[1].startswith("event: reset")
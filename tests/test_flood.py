@@ -0,0 +1,45 @@
+from flood import FloodIndex, hamming, simhash
+from normalize import normalize
+
+RAID = "nobody likes you, just go away and never come back"
+
+
+def test_simhash_is_stable_and_close_for_small_edits():
+    assert simhash(RAID) == simhash(RAID)
+    assert hamming(simhash(RAID), simhash(RAID + "!!")) <= 3
+    assert hamming(simhash(RAID), simhash("what a beautiful picture of the mountains")) > 10
+
+
+def test_near_duplicate_of_bullying_reuses_verdict_and_counts_cluster():
+    index = FloodIndex(window_seconds=600)
+    norm = normalize(RAID)
+    index.add(index.signature(norm), norm, "Other", post_id="p1")
+
+    copy = normalize(RAID + "!!")
+    assert index.lookup(index.signature(copy), copy, post_id="p1") == "Other"
+    assert index.clusters(post_id="p1")[0]["size"] == 2
+
+
+def test_benign_verdict_needs_exact_text_without_keyword_flag():
+    index = FloodIndex(window_seconds=600)
+    text = "see you at practice tomorrow, bring the ball"
+    norm = normalize(text)
+    index.add(index.signature(norm), norm, "Not Cyberbullying")
+
+    variant = normalize(text + ".")
+    assert index.lookup(index.signature(variant), variant) is None
+    assert index.lookup(index.signature(norm), norm, keyword_flagged=True) is None
+    assert index.lookup(index.signature(norm), norm) == "Not Cyberbullying"
+
+
+def test_short_texts_and_disabled_index_are_never_matched():
+    assert FloodIndex(window_seconds=600).signature(normalize("you idiot")) is None
+    assert FloodIndex(window_seconds=0).signature(normalize(RAID)) is None
+
+
+def test_entries_beyond_max_entries_are_evicted():
+    index = FloodIndex(window_seconds=600, max_entries=1)
+    first, second = normalize(RAID), normalize("I hate people from your country, go back")
+    index.add(index.signature(first), first, "Other")
+    index.add(index.signature(second), second, "Ethnicity/Race")
+    assert index.lookup(index.signature(first), first) is None
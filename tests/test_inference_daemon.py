@@ -0,0 +1,44 @@
+import pytest
+
+import inference_daemon
+from inference_daemon import (
+    STATUS_ERROR, InferenceError, decode_request, decode_response, encode_request,
+    encode_response, split_request,
+)
+
+
+def test_request_round_trip():
+    texts = ["you are stupid", "", "café — \U0001f600"]
+    assert decode_request(encode_request(texts)) == texts
+
+
+def test_response_round_trip():
+    rows = [[0.5, 0.25, 0.25], [1.0, 0.0, 0.0]]
+    assert decode_response(encode_response(rows)) == rows
+    assert decode_response(encode_response([])) == []
+
+
+def test_error_response_raises_inference_error():
+    with pytest.raises(InferenceError, match="boom"):
+        decode_response(bytes([STATUS_ERROR]) + b"boom")
+
+
+def test_split_request_respects_text_count(monkeypatch):
+    monkeypatch.setattr(inference_daemon, "MAX_REQUEST_TEXTS", 3)
+    chunks = split_request([str(i) for i in range(7)])
+    assert [len(chunk) for chunk in chunks] == [3, 3, 1]
+    assert sum(chunks, []) == [str(i) for i in range(7)]
+
+
+def test_split_request_respects_frame_size(monkeypatch):
+    monkeypatch.setattr(inference_daemon, "MAX_FRAME_BYTES", 30)
+    texts = ["a" * 10] * 5
+    chunks = split_request(texts)
+    assert sum(chunks, []) == texts
+    assert all(len(encode_request(chunk)) <= 30 for chunk in chunks)
+
+
+def test_split_request_keeps_oversized_text_alone(monkeypatch):
+    monkeypatch.setattr(inference_daemon, "MAX_FRAME_BYTES", 30)
+    assert split_request(["a" * 100, "b"]) == [["a" * 100], ["b"]]
+    assert split_request([]) == []
@@ -0,0 +1,36 @@
+from normalize import fold, normalize, skeleton
+
+
+def test_fold_removes_invisible_characters_and_collapses_whitespace():
+    assert fold("you​  are­\n stupid") == "you are stupid"
+
+
+def test_fold_applies_nfkc():
+    assert fold("ＳＴＵＰＩＤ") == "STUPID"
+
+
+def test_fold_keeps_case_and_accents_for_the_model():
+    assert fold("Café Idiot") == "Café Idiot"
+
+
+def test_skeleton_maps_lookalikes_and_strips_accents():
+    # Cyrillic "у" and "о" in place of Latin letters
+    assert skeleton("уоu idiоt") == "you idiot"
+    assert skeleton("Café") == "cafe"
+    assert skeleton("don’t") == "don't"
+
+
+def test_normalize_undoes_leetspeak_only_in_deobfuscated():
+    norm = normalize("You are $tup1d")
+    assert norm.folded == "You are $tup1d"
+    assert norm.skeleton == "you are $tup1d"
+    assert norm.deobfuscated == "you are stupid"
+
+
+def test_key_depends_on_folded_text_only():
+    assert normalize("hello  world").key == normalize("hello​ world").key
+    assert normalize("hello world").key != normalize("Hello world").key
+
+
+def test_normalize_accepts_empty_text():
+    assert normalize("").folded == ""
@@ -0,0 +1,33 @@
+from remoderate import diff_page, is_degraded, reputation_deltas
+
+
+def _comment(comment_id, is_bullying, bullying_type=None, user_id="u1", **extra):
+    return {"id": comment_id, "post_id": "p1", "user_id": user_id, "content": "text",
+            "is_bullying": is_bullying, "bullying_type": bullying_type, **extra}
+
+
+def test_diff_page_reports_only_changed_verdicts():
+    comments = [
+        _comment("same", True, "Religion"),
+        _comment("cleared", True, "Other"),
+        _comment("flagged", False),
+        _comment("retyped", True, "Other"),
+    ]
+    verdicts = [(True, "religion"), (False, None), (True, "Gender/Sexual"), (True, "Religion")]
+    changes = diff_page(comments, verdicts)
+    assert [change["comment_id"] for change in changes] == ["cleared", "flagged", "retyped"]
+    assert changes[0]["old_is_bullying"] is True and changes[0]["new_is_bullying"] is False
+
+
+def test_reputation_deltas_net_out_per_author():
+    comments = [_comment("a", True, "Other"), _comment("b", False), _comment("c", False, user_id="u2"),
+                _comment("d", True, "Other", user_id=None)]
+    verdicts = [(False, None), (True, "Other"), (True, "Other"), (False, None)]
+    assert reputation_deltas(diff_page(comments, verdicts)) == {"u2": 1}
+
+
+def test_is_degraded_compares_tiers():
+    assert is_degraded(_comment("a", False, moderation_tier="keyword"), "full")
+    assert is_degraded(_comment("a", False, moderation_tier="local"), "full")
+    assert not is_degraded(_comment("a", False, moderation_tier="local"), "local")
+    assert not is_degraded(_comment("a", False), "full")
@@ -0,0 +1,64 @@
+import time
+
+import routing
+from routing import Router
+
+
+def _measured(router, name, latency=0.01, ok=True, calls=routing.ROUTER_MIN_SAMPLES):
+    for _ in range(calls):
+        router.provider(name).record(latency, ok)
+
+
+def test_unmeasured_providers_go_first_then_fastest():
+    router = Router()
+    _measured(router, "slow", latency=0.5)
+    _measured(router, "fast", latency=0.05)
+    assert [name for name, _ in router.rank(["slow", "fast", "new"])] == ["new", "fast", "slow"]
+
+
+def test_failing_and_rate_limited_providers_are_skipped():
+    router = Router()
+    _measured(router, "broken", ok=False)
+    router.note_limits("limited", {"retry-after": "30"}, 429)
+    assert [name for name, _ in router.rank(["broken", "limited", "ok"])] == ["ok"]
+
+
+def test_route_fails_over_to_the_next_provider():
+    router = Router()
+    _measured(router, "first", latency=0.01)
+    _measured(router, "second", latency=0.02)
+    label, provider = router.route("text", {"first": lambda text: None, "second": lambda text: "Other"})
+    assert (label, provider) == ("Other", "second")
+
+
+def test_hedge_answers_when_a_slow_primary_fails():
+    router = Router()
+    _measured(router, "primary", latency=0.01)
+    _measured(router, "backup", latency=0.02)
+
+    def hanging(text):
+        time.sleep(0.5)
+        return None
+
+    started = time.monotonic()
+    label, provider = router.route("text", {"primary": hanging, "backup": lambda text: "Religion"})
+    assert (label, provider) == ("Religion", "backup")
+    # The backup was started at the hedge delay, not after the primary gave up
+    assert router.provider("backup").snapshot()["calls"] == routing.ROUTER_MIN_SAMPLES + 1
+    assert time.monotonic() - started < 1.0
+
+
+def test_primary_answer_wins_over_hedge():
+    router = Router()
+    _measured(router, "primary", latency=0.01)
+    _measured(router, "backup", latency=0.02)
+
+    def slow(text):
+        time.sleep(0.1)
+        return "Other"
+
+    assert router.route("text", {"primary": slow, "backup": lambda text: "Religion"}) == ("Other", "primary")
+
+
+def test_no_providers_means_local_fallback():
+    assert Router().route("text", {}) == (None, None)
@@ -0,0 +1,71 @@
+"""
+Change counters behind the feed and comment-thread ETags.
+
+The write paths in `database.py` bump a counter; `api/main.py` turns the
+current counter into an ETag before doing any work, so an unchanged feed or
+comment thread is answered with 304 without touching storage.
+
+The counters live in shared memory created at import time, so every worker
+that `serve.py` forks after importing the app sees the others' bumps. Each
+post hashes to one of COMMENT_SLOTS counters; a collision only costs an extra
+refetch. Writes from other processes (the Streamlit app, scripts, other hosts)
+are not counted, so ETags also roll over every ETAG_MAX_STALENESS_SECONDS to
+bound how long such a change can go unnoticed.
+"""
+
+import multiprocessing
+import os
+import time
+import uuid
+import zlib
+
+COMMENT_SLOTS = 4096
+ETAG_MAX_STALENESS_SECONDS = float(os.getenv("ETAG_MAX_STALENESS_SECONDS", "60"))
+
+# Slot 0 is the feed, slots 1.. are comment threads
+_counters = multiprocessing.RawArray("Q", COMMENT_SLOTS + 1)
+_lock = multiprocessing.Lock()
+
+# Distinguishes counters of this server run from a previous one
+_BOOT_ID = uuid.uuid4().hex[:8]
+
+
+def _slot(post_id: str) -> int:
+    return 1 + zlib.crc32(post_id.encode("utf-8")) % COMMENT_SLOTS
+
+
+def _bump(slot: int):
+    with _lock:
+        _counters[slot] += 1
+
+
+def bump_feed():
+    _bump(0)
+
+
+def bump_comments(post_id: str):
+    _bump(_slot(post_id))
+
+
+def _etag(scope: str, slot: int) -> str:
+    bucket = int(time.time() // ETAG_MAX_STALENESS_SECONDS) if ETAG_MAX_STALENESS_SECONDS > 0 else 0
+    return f'W/"{scope}-{_BOOT_ID}-{_counters[slot]}-{bucket}"'
+
+
+def feed_etag() -> str:
+    return _etag("feed", 0)
+
+
+def comments_etag(post_id: str) -> str:
+    return _etag(f"c{_slot(post_id)}", _slot(post_id))
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """True when an If-None-Match header covers the given ETag."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison: W/ prefixes are ignored on both sides
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag.removeprefix("W/") in candidates